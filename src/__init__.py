@@ -2,32 +2,59 @@
 """
 A graphical version of the tts_devserver that combines the various scripts'
 functionalities into one application.
+
+The listen server is bound before qt is even imported, and whatever TTS sends
+while the window is being built is shown once it is up.
 """
 
 # standard library
-import sys
-import socket
-import selectors
-import atexit
-import threading
-import json
-# qt6
-from PySide6.QtWidgets import QApplication, QMainWindow
-from ui_gui_mainwindow import Ui_MainWindow
+import time
+# as early as possible, so startup is timed from the very start. the imports
+# below come after it on purpose, their time counts towards startup
+STARTED = time.perf_counter()
+import sys  # noqa: E402
+import threading  # noqa: E402
+from collections import deque  # noqa: E402
+from functools import partial  # noqa: E402
 # custom
-import tcp_actions.listen as Listen
-import tcp_actions.send as Send
-from generate_specfile import generate_specfile_from_folder
+from settings_store import SETTINGS_FIELDS, SettingsStore  # noqa: E402
+from tcp_actions.client import parse_table  # noqa: E402
+from tcp_actions.engine import Engine  # noqa: E402
 
 
 HOST = "localhost"
 LISTEN_PORT = 39998
 SEND_PORT = 39999
 USER_SETTINGS_FILE = "user_devserver_settings.json"
+# the console only keeps this many lines, dropping the oldest first
+CONSOLE_MAX_LINES = 5000
+# milliseconds output is gathered for before it is drawn, about one frame
+CONSOLE_FLUSH_INTERVAL = 16
+# milliseconds between refreshes of the stats panel while it is shown
+STATS_REFRESH_INTERVAL = 1000
+# milliseconds the settings widgets have to sit idle before they are saved
+SETTINGS_SAVE_DELAY = 500
+# setting -> the widget it is edited in
+SETTINGS_WIDGETS = {
+    "specfile": "spec_file_entry",
+    "editor": "editor_command_entry",
+    "up_folder": "script_upload_folder_entry",
+    "down_folder": "script_download_folder_entry",
+    "send_message": "send_message_entry",
+    "code": "exec_code_entry",
+    "guid": "guid_entry",
+}
 
-selector = selectors.DefaultSelector()
+engine = Engine(HOST, SEND_PORT, LISTEN_PORT)
+# output received before the console exists, shown as soon as it does
+startup_output = deque(maxlen=CONSOLE_MAX_LINES)
+console_lock = threading.Lock()
+settings_store = SettingsStore(USER_SETTINGS_FILE)
+# settings edited since they were last saved
+dirty_settings = set()
 global_vars = {
-    "keep_server_alive": True,
+    "console": None,
+    "settings_timer": None,
     "main_window": None,
     "specfile": None,
     "editor": None,
@@ -39,45 +66,30 @@ global_vars = {
 }
 
 
-class MainWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.ui = Ui_MainWindow()
-        self.ui.setupUi(self)
-
-    def closeEvent(self, event):
-        event.accept()
-        global_vars["keep_server_alive"] = False
+def mark_setting_dirty(field):
+    """
+    note that a settings widget was edited, and restart the idle timer that
+    saves it
+    """
+    dirty_settings.add(field)
+    global_vars["settings_timer"].start()
 
 
 def save_user_settings():
     """
     save the user's settings in a json file stored next to the
     executable. This is stuff like the up / dump folder locations,
-    specfile locations, and editor command
+    specfile locations, and editor command. only the widgets edited since
+    the last save are read, and the file is written on a background thread
     """
-    # first we ensure entries are up-to-date
-    update_specfile_path()
-    update_editor_cmd()
-    update_current_script_folder()
-    update_code_entry()
-    update_send_message_table()
-    # then we construct our dictionary
-    settings_dict = {
-        "specfile": global_vars["specfile"],
-        "editor": global_vars["editor"],
-        "up_folder": global_vars["up_folder"],
-        "down_folder": global_vars["down_folder"],
-        "send_message": global_vars["send_message"],
-        "code": global_vars["code"],
-        "guid": global_vars["guid"]
+    ui = global_vars["main_window"].ui
+    changes = {
+        field: getattr(ui, SETTINGS_WIDGETS[field]).toPlainText()
+        for field in dirty_settings
     }
-    settings_data = json.dumps(settings_dict)
-    try:
-        with open(USER_SETTINGS_FILE, mode="w", encoding="utf-8") as save_file:
-            save_file.write(settings_data)
-    except OSError as err:
-        print("Error saving user settings: ", err)
+    dirty_settings.clear()
+    global_vars.update(changes)
+    settings_store.update(changes)
 
 
 def load_user_settings() -> bool:
@@ -85,28 +97,10 @@ def load_user_settings() -> bool:
     load previously saved user settings
     return True if successful or False if not
     """
-    try:
-        with open(USER_SETTINGS_FILE, mode="r", encoding="utf-8") as save_file:
-            loaded_data = save_file.read()
-            if loaded_data is not None:
-                parsed_data = json.loads(loaded_data)
-                if "specfile" in parsed_data:
-                    global_vars["specfile"] = parsed_data["specfile"]
-                if "editor" in parsed_data:
-                    global_vars["editor"] = parsed_data["editor"]
-                if "up_folder" in parsed_data:
-                    global_vars["up_folder"] = parsed_data["up_folder"]
-                if "down_folder" in parsed_data:
-                    global_vars["down_folder"] = parsed_data["down_folder"]
-                if "send_message" in parsed_data:
-                    global_vars["send_message"] = parsed_data["send_message"]
-                if "code" in parsed_data:
-                    global_vars["code"] = parsed_data["code"]
-                if "guid" in parsed_data:
-                    global_vars["guid"] = parsed_data["guid"]
-    except OSError as err:
-        print("Error loading user settings: ", err)
+    if not settings_store.load():
         return False
+    for field in SETTINGS_FIELDS:
+        global_vars[field] = settings_store.values[field]
     return True
 
 
@@ -148,75 +142,143 @@ def update_send_message_table():
     global_vars["send_message"] = raw_input
 
 
+def show_response(response):
+    """
+    print what an engine operation had to say, if anything
+    """
+    if response.get("output"):
+        print_to_console(response["output"])
+    elif not response.get("ok"):
+        print_to_console("<font color='#FF0000'>Error: "
+                         + str(response.get("error")))
+
+
 def save_and_play():
     update_specfile_path()
-    generate_specfile_from_folder(
-        global_vars["up_folder"],
-        global_vars["specfile"]
-    )
-    definitions = Send.gather_files(global_vars["specfile"])
-    Send.send_save_and_play_signal(definitions, HOST, SEND_PORT)
+    # only push the objects that changed since the last successful push.
+    # includes and requires are looked up in the upload folder
+    show_response(engine.save_and_play(
+        global_vars["specfile"],
+        incremental=True,
+        folder=global_vars["up_folder"],
+        include_path=[global_vars["up_folder"]]
+    ))
 
 
 def get_new_scripts():
-    Send.send_get_scripts_signal(HOST, SEND_PORT)
+    show_response(engine.get_scripts())
 
 
 def execute_lua_code():
     update_code_entry()
-    guid = global_vars["guid"]
-    code = global_vars["code"]
-    Send.send_execute_code_signal(guid, code, HOST, SEND_PORT)
+    show_response(engine.execute(global_vars["guid"], global_vars["code"]))
 
 
 def send_message():
     update_send_message_table()
-    raw_input = global_vars["send_message"]
-    # process data, separate tables entries by newline (\n)
-    keys = []
-    values = []
-    processed_input = raw_input.split("\n")
-    if len(processed_input) > 0:
-        for pair in processed_input:
-            processed_pair = pair.split("=")
-            if len(processed_pair) > 1:
-                keys.append(processed_pair[0])
-                values.append(processed_pair[1])
-    to_send = dict(zip(keys, values))
-    Send.send_message_signal(to_send, HOST, SEND_PORT)
-
-
-def receive_loop():
-    while global_vars["keep_server_alive"]:
-        update_current_script_folder()
-        update_editor_cmd()
-        events = selector.select(timeout=1)
-        for key, mask in events:
-            if key.data is None:
-                Listen.accept_wrapper(key.fileobj, selector)
-            else:
-                toprint = Listen.service_connection(
-                    key, mask,
-                    global_vars["down_folder"], global_vars["editor"],
-                    selector
-                )
-                if global_vars["main_window"] and len(toprint) > 0:
-                    new_console_output = ""
-                    # new_console_output = "<font color='#00FF00'>"
-                    for entry in toprint:
-                        new_console_output += str(entry)
-                    console = global_vars["main_window"].ui.console_output
-                    console.append(new_console_output)
-                    scrollbar = console.verticalScrollBar()
-                    scrollbar.setValue(scrollbar.maximum())
+    # table entries are separated by newlines
+    table = parse_table(global_vars["send_message"].split("\n"))
+    show_response(engine.send_message(table))
+
+
+def update_listen_server():
+    """
+    hand the current download folder and editor command to the listen server
+    """
+    update_current_script_folder()
+    update_editor_cmd()
+    server = engine.server
+    if server is not None:
+        server.folder = global_vars["down_folder"]
+        server.editor = global_vars["editor"]
+
+
+def describe_stats() -> str:
+    return engine.stats()["output"]
+
+
+def print_to_console(toprint):
+    """
+    called from the listen server's thread, so only ever goes through the
+    console bridge. until the window is up, output is kept in startup_output
+    """
+    with console_lock:
+        console = global_vars["console"]
+        if console is None:
+            startup_output.append(toprint)
+            return
+    console.write(toprint)
+
+
+def attach_console(console):
+    """
+    send everything printed so far to the console, and everything from now
+    on straight to it
+    """
+    with console_lock:
+        for toprint in startup_output:
+            console.write(toprint)
+        startup_output.clear()
+        global_vars["console"] = console
+
+
+def close_app():
+    # save anything still waiting on the idle timer
+    global_vars["settings_timer"].stop()
+    save_user_settings()
+    settings_store.close()
+    engine.close()
+
+
+def start_listen_server() -> float | None:
+    """
+    bind the listen server with the saved download folder and editor, so
+    nothing TTS sends while the window is still being built is lost.
+    returns the seconds since startup at which it was listening
+    """
+    # dumps reconcile the manifest of the last push, if there was one
+    if global_vars["specfile"]:
+        engine.track_manifest(global_vars["specfile"])
+    try:
+        engine.listen(
+            global_vars["down_folder"], global_vars["editor"],
+            on_output=print_to_console
+        ).start_in_thread()
+    except OSError as err:
+        engine.server = None
+        print("Socket error ", err)
+        print_to_console("<font color='#FF0000'> SOCK ERR, please reboot.")
+        return None
+    listening = time.perf_counter() - STARTED
+    print("TTS DevServer listening on port", LISTEN_PORT)
+    print_to_console("<font color='#009900'>Listening on " + str(LISTEN_PORT))
+    return listening
+
+
+def report_ready(listening):
+    ready = time.perf_counter() - STARTED
+    rd = ["TTS DevServer GUI ready after ", round(ready * 1000, 1), " ms"]
+    if listening is not None:
+        rd.extend([", listening after ", round(listening * 1000, 1), " ms"])
+    print("".join(str(entry) for entry in rd), flush=True)
 
 
 if __name__ == "__main__":
+    # load user data, which the listen server needs to save scripts
+    settings_loaded = load_user_settings()
+    listening = start_listen_server()
+
+    # only now pull in qt and build the window
+    from PySide6.QtWidgets import QApplication
+    from gui_window import (MainWindow, ConsoleBridge, StatsPanel,
+                            idle_timer, when_idle)
     app = QApplication(sys.argv)
 
-    window = MainWindow()
+    window = MainWindow(close_app)
     global_vars["main_window"] = window
-    window.show()
+    attach_console(ConsoleBridge(window.ui.console_output,
+                                 CONSOLE_MAX_LINES, CONSOLE_FLUSH_INTERVAL))
+    StatsPanel(window, STATS_REFRESH_INTERVAL, describe_stats)
 
     # connect some signals to our buttons
     # create a short macro for the ui
@@ -227,8 +289,7 @@ if __name__ == "__main__":
     ui.exec_code_button.clicked.connect(execute_lua_code)
     ui.send_message_button.clicked.connect(send_message)
 
-    # load user data
-    if load_user_settings():
+    if settings_loaded:
         # create an even shorter macro name for window.ui
         u = ui
 
@@ -240,36 +301,21 @@ if __name__ == "__main__":
         u.exec_code_entry.setPlainText(global_vars["code"])
         u.guid_entry.setPlainText(global_vars["guid"])
 
-    # for saving user text boxes for next time
-    # we do this *after* loading to prevent redudantly saving the newly loaded
-    # settings all over again
-    ui.spec_file_entry.textChanged.connect(save_user_settings)
-    ui.editor_command_entry.textChanged.connect(save_user_settings)
-    ui.script_upload_folder_entry.textChanged.connect(save_user_settings)
-    ui.script_download_folder_entry.textChanged.connect(save_user_settings)
-    ui.send_message_entry.textChanged.connect(save_user_settings)
-    ui.exec_code_entry.textChanged.connect(save_user_settings)
-    ui.guid_entry.textChanged.connect(save_user_settings)
-
-    # spin up our persistent listen server
-    try:
-        tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        tcp_socket.bind((HOST, LISTEN_PORT))
-        tcp_socket.listen()
-        tcp_socket.setblocking(False)
-
-        print("TTS DevServer listening on port", LISTEN_PORT)
-        error_output = "<font color='#009900'>Listening on " + str(LISTEN_PORT)
-        window.ui.console_output.append(error_output)
-
-        atexit.register(Listen.terminate_socket, tcp_socket, selector)
-        selector.register(tcp_socket, selectors.EVENT_READ, data=None)
-
-        receive_thread = threading.Thread(target=receive_loop)
-        receive_thread.start()
-    except socket.error as err:
-        print("Socket error ", err)
-        error_output = "<font color='#FF0000'> SOCK ERR, please reboot."
-        window.ui.console_output.append(error_output)
+    # for saving user text boxes for next time, once they have been left
+    # alone for a moment. we do this *after* loading to prevent redudantly
+    # saving the newly loaded settings all over again
+    global_vars["settings_timer"] = idle_timer(window, SETTINGS_SAVE_DELAY,
+                                               save_user_settings)
+    for field, widget in SETTINGS_WIDGETS.items():
+        getattr(ui, widget).textChanged.connect(
+            partial(mark_setting_dirty, field)
+        )
+
+    # keep the listen server's folder and editor in sync with the ui
+    ui.script_download_folder_entry.textChanged.connect(update_listen_server)
+    ui.editor_command_entry.textChanged.connect(update_listen_server)
+    update_listen_server()
 
+    window.show()
+    when_idle(partial(report_ready, listening))
     sys.exit(app.exec())
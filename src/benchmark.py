@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+"""
+Benchmarks the paths the dev server spends its day on, against synthetic mods
+of various sizes and a simulated TTS, and writes the results as json so they
+can be compared between versions:
+
+push      gathering a specfile's scripts and sending them as a save and play,
+          and the round trip until TTS has sent the reloaded scripts back
+ingest    receiving a scripts dump and saving it into a download folder, both
+          into an empty folder and again once nothing changed
+specfile  generating a specfile from a folder of scripts, both from scratch
+          and again once nothing changed
+codec     encoding a save and play message and decoding a scripts dump with
+          every installed json backend
+startup   starting dev_server.py and the gui from cold, until their listen
+          port accepts connections and until they report being ready. it
+          needs port 39998 free, so it only runs when asked for
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import importlib.util
+import platform
+import argparse
+import tempfile
+import threading
+import statistics
+# custom
+import tcp_actions.send as Send
+import tcp_actions.codec as Codec
+import generate_specfile
+from tcp_actions.server import ListenServer
+from tcp_actions.listen import READ_SIZE
+from tcp_actions.stream_decode import ScriptStateStream
+from tcp_actions.simulator import SimulatedTTS, synthetic_script_states
+
+BENCHMARKS = ("push", "ingest", "specfile", "codec")
+# run once rather than for every mod size, and only when asked for
+SIZELESS_BENCHMARKS = ("startup",)
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-n", "--objects", type=str, default="10,100,1000,5000",
+                    help="Comma separated mod sizes, in scripted objects.")
+parser.add_argument("-s", "--script-size", type=int, default=2048,
+                    help="Size in bytes of every generated script.")
+parser.add_argument("-r", "--repeat", type=int, default=5,
+                    help="Runs of every benchmark per mod size.")
+parser.add_argument("-b", "--benchmarks", type=str,
+                    default=",".join(BENCHMARKS),
+                    help="Comma separated benchmarks to run, out of "
+                         + ", ".join(BENCHMARKS + SIZELESS_BENCHMARKS) + ".")
+parser.add_argument("-o", "--output", type=str,
+                    default="benchmark_results.json",
+                    help="File to write the results to, or - for stdout.")
+
+HOST = "localhost"
+# seconds to wait for a message to come back before giving up on a run
+ROUND_TRIP_TIMEOUT = 120
+# the port dev_server.py and the gui always listen on
+LISTEN_PORT = 39998
+# seconds a frontend gets to start up before giving up on a run
+STARTUP_TIMEOUT = 60
+SOURCE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port() -> int:
+    """
+    a port nothing is listening on, so benchmarks never collide with a real
+    TTS or dev server
+    """
+    with socket.socket() as probe:
+        probe.bind((HOST, 0))
+        return probe.getsockname()[1]
+
+
+def summarize(name, objects, runs, size=0, **extra) -> dict:
+    result = {
+        "benchmark": name,
+        "objects": objects,
+        "bytes": size,
+        "runs": runs,
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "mean": statistics.fmean(runs),
+        "objects_per_second": objects / min(runs) if min(runs) > 0 else 0.0,
+        "mb_per_second": (size / 1048576 / min(runs)
+                          if min(runs) > 0 else 0.0),
+    }
+    result.update(extra)
+    return result
+
+
+def write_mod(script_states, folder):
+    """
+    save script_states as get_lua_scripts would have, so they can be turned
+    into a specfile
+    """
+    os.makedirs(folder, exist_ok=True)
+    for entry in script_states:
+        name = entry["name"].replace(" ", "_")
+        if entry["guid"] != "-1":
+            name = entry["guid"] + "-" + name
+        for kind, extension in (("script", ".lua"), ("ui", ".xml")):
+            if kind in entry:
+                path = os.path.join(folder, name + extension)
+                with open(path, mode="w", encoding="utf-8") as out:
+                    out.write(entry[kind])
+
+
+def wait_for():
+    """
+    an on_output callback and event pair that fires once the next message
+    has been handled, not just received, so a dump counts as ingested only
+    when it is on disk
+    """
+    handled = threading.Event()
+
+    def on_output(output):
+        handled.set()
+    return on_output, handled
+
+
+def bench_specfile(objects, script_states, workdir, repeat) -> list[dict]:
+    folder = os.path.join(workdir, "up")
+    specfile = os.path.join(workdir, "spec.json")
+    write_mod(script_states, folder)
+    cold = []
+    warm = []
+    for _ in range(repeat):
+        generate_specfile._cache.clear()
+        if os.path.exists(specfile):
+            os.remove(specfile)
+        started = time.perf_counter()
+        generate_specfile.generate_specfile_from_folder(folder, specfile)
+        cold.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        generate_specfile.generate_specfile_from_folder(folder, specfile)
+        warm.append(time.perf_counter() - started)
+    return [
+        summarize("specfile", objects, cold, phase="cold"),
+        summarize("specfile", objects, warm, phase="unchanged"),
+    ]
+
+
+def bench_push(objects, script_states, workdir, repeat) -> list[dict]:
+    folder = os.path.join(workdir, "up")
+    specfile = os.path.join(workdir, "spec.json")
+    write_mod(script_states, folder)
+    generate_specfile.generate_specfile_from_folder(folder, specfile)
+    tts_port = free_port()
+    listen_port = free_port()
+    # the dev server end, which only has to notice the reloaded scripts
+    on_output, reloaded = wait_for()
+    server = ListenServer(HOST, listen_port, on_output=on_output)
+    server.start_in_thread()
+    tts = SimulatedTTS(
+        synthetic_script_states(0),
+        HOST, tts_port, listen_port
+    )
+    tts.start()
+    gathered = []
+    sent = []
+    round_trips = []
+    size = sum(len(entry.get("script", "")) + len(entry.get("ui", ""))
+               for entry in script_states)
+    try:
+        for _ in range(repeat):
+            reloaded.clear()
+            started = time.perf_counter()
+            definitions = Send.gather_files(specfile)
+            gathered_at = time.perf_counter()
+            rd = Send.send_save_and_play_signal(definitions, HOST, tts_port)
+            sent_at = time.perf_counter()
+            if len(rd) > 0 or not reloaded.wait(ROUND_TRIP_TIMEOUT):
+                raise OSError("the simulated TTS never answered")
+            round_trips.append(time.perf_counter() - started)
+            gathered.append(gathered_at - started)
+            sent.append(sent_at - gathered_at)
+    finally:
+        tts.shutdown()
+        server.shutdown()
+    return [
+        summarize("push", objects, gathered, size, phase="gather"),
+        summarize("push", objects, sent, size, phase="send"),
+        summarize("push", objects, round_trips, size, phase="round_trip"),
+    ]
+
+
+def bench_ingest(objects, script_states, workdir, repeat) -> list[dict]:
+    listen_port = free_port()
+    on_output, saved = wait_for()
+    server = ListenServer(HOST, listen_port, on_output=on_output)
+    server.start_in_thread()
+    tts = SimulatedTTS(script_states, HOST, free_port(), listen_port)
+    size = len(Codec.dumps({"messageID": 1, "scriptStates": script_states}))
+    cold = []
+    warm = []
+    try:
+        for run in range(repeat):
+            # a fresh folder every run, so the first dump always writes
+            server.folder = os.path.join(workdir, "down" + str(run))
+            os.makedirs(server.folder)
+            for runs in (cold, warm):
+                saved.clear()
+                started = time.perf_counter()
+                rd = tts.send_dump()
+                if len(rd) > 0 or not saved.wait(ROUND_TRIP_TIMEOUT):
+                    raise OSError("the dev server never finished the dump")
+                runs.append(time.perf_counter() - started)
+    finally:
+        tts.shutdown()
+        server.shutdown()
+    return [
+        summarize("ingest", objects, cold, size, phase="cold"),
+        summarize("ingest", objects, warm, size, phase="unchanged"),
+    ]
+
+
+def bench_codec(objects, script_states, workdir, repeat) -> list[dict]:
+    message = {"messageID": 1, "scriptStates": script_states}
+    results = []
+    chosen = Codec.backend
+    try:
+        for name in Codec.BACKENDS:
+            Codec.use_backend(name)
+            encoded = Codec.dumps(message)
+            encodes = []
+            decodes = []
+            streams = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                Codec.dumps(message)
+                encodes.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                Codec.loads(encoded)
+                decodes.append(time.perf_counter() - started)
+                # the way the listen server really decodes a dump
+                started = time.perf_counter()
+                stream = ScriptStateStream()
+                for offset in range(0, len(encoded), READ_SIZE):
+                    stream.feed(encoded[offset:offset + READ_SIZE])
+                stream.finish()
+                streams.append(time.perf_counter() - started)
+            size = len(encoded)
+            results.append(summarize("codec", objects, encodes, size,
+                                     phase="encode", codec=name))
+            results.append(summarize("codec", objects, decodes, size,
+                                     phase="decode", codec=name))
+            results.append(summarize("codec", objects, streams, size,
+                                     phase="stream_decode", codec=name))
+    finally:
+        Codec.use_backend(chosen)
+    return results
+
+
+def port_open(port) -> bool:
+    try:
+        with socket.create_connection((HOST, port), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def time_startup(command, ready_line, workdir, env) -> tuple[float, float]:
+    """
+    run command and return the seconds until its listen port accepted a
+    connection and until it printed ready_line, then stop it
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=workdir, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    ready = {}
+    ready_event = threading.Event()
+
+    def watch_output():
+        for line in process.stdout:
+            if line.startswith(ready_line) and "at" not in ready:
+                ready["at"] = time.perf_counter()
+                ready_event.set()
+        ready_event.set()
+    threading.Thread(target=watch_output, daemon=True).start()
+    try:
+        listening = None
+        deadline = started + STARTUP_TIMEOUT
+        while listening is None:
+            if time.perf_counter() > deadline or process.poll() is not None:
+                raise OSError(" ".join(command) + " never started listening")
+            if port_open(LISTEN_PORT):
+                listening = time.perf_counter()
+            else:
+                time.sleep(0.001)
+        if not ready_event.wait(STARTUP_TIMEOUT) or "at" not in ready:
+            raise OSError(" ".join(command) + " never reported being ready")
+    finally:
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return listening - started, ready["at"] - started
+
+
+def bench_startup(objects, script_states, workdir, repeat) -> list[dict]:
+    if port_open(LISTEN_PORT):
+        raise OSError("port " + str(LISTEN_PORT) + " is taken, stop any "
+                      "running dev server before benchmarking startup")
+    env = dict(os.environ, PYTHONUNBUFFERED="1", QT_QPA_PLATFORM="offscreen")
+    frontends = [(
+        "dev_server",
+        [sys.executable, os.path.join(SOURCE_FOLDER, "dev_server.py"),
+         workdir],
+        "TTS DevServer listening on port"
+    )]
+    if importlib.util.find_spec("PySide6") is not None:
+        frontends.append((
+            "gui",
+            [sys.executable, os.path.join(SOURCE_FOLDER, "__init__.py")],
+            "TTS DevServer GUI ready"
+        ))
+    else:
+        print("PySide6 is not installed, not timing the gui startup",
+              file=sys.stderr)
+    results = []
+    for frontend, command, ready_line in frontends:
+        listening = []
+        ready = []
+        for _ in range(repeat):
+            listen_time, ready_time = time_startup(command, ready_line,
+                                                   workdir, env)
+            listening.append(listen_time)
+            ready.append(ready_time)
+        results.append(summarize("startup", objects, listening,
+                                 phase="listening", frontend=frontend))
+        results.append(summarize("startup", objects, ready,
+                                 phase="ready", frontend=frontend))
+    return results
+
+
+RUNNERS = {
+    "push": bench_push,
+    "ingest": bench_ingest,
+    "specfile": bench_specfile,
+    "codec": bench_codec,
+    "startup": bench_startup,
+}
+
+
+def run(name, objects, script_states, repeat) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for result in RUNNERS[name](objects, script_states, workdir, repeat):
+            results.append(result)
+            print(name, result["phase"],
+                  result.get("codec", result.get("frontend", "")),
+                  objects, "objects:",
+                  round(result["min"] * 1000, 2), "ms min,",
+                  round(result["median"] * 1000, 2), "ms median",
+                  file=sys.stderr)
+    return results
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.objects.split(",")]
+    chosen = [name.strip() for name in args.benchmarks.split(",")]
+    for name in chosen:
+        if name not in RUNNERS:
+            print("Error: unknown benchmark ", name)
+            sys.exit(1)
+
+    results = []
+    try:
+        for name in chosen:
+            if name in SIZELESS_BENCHMARKS:
+                results.extend(run(name, 0, [], args.repeat))
+        for objects in sizes:
+            script_states = synthetic_script_states(objects, args.script_size,
+                                                    ui_every=10)
+            for name in chosen:
+                if name not in SIZELESS_BENCHMARKS:
+                    results.extend(run(name, objects, script_states,
+                                       args.repeat))
+    except OSError as err:
+        print("Error running benchmarks: ", err)
+        sys.exit(1)
+
+    report = json.dumps({
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "script_size": args.script_size,
+        "repeat": args.repeat,
+        "codec": Codec.backend,
+        "results": results,
+    }, indent=4)
+    if args.output == "-":
+        print(report)
+    else:
+        with open(args.output, mode="w", encoding="utf-8") as out:
+            out.write(report)
@@ -3,15 +3,22 @@
 Spins up a server which listens on localhost:39998 for messages from TTS and
 responds to them accordingly, pulling down scripts into a directory of the
 user's choice or displaying console messages.
+
+With -d it also runs as a daemon for the other scripts: they hand their work
+to it over a local control socket instead of doing it themselves. Its stats
+command reports the same figures --stats prints on exit.
 """
 
 import sys
-import atexit
-import socket
-import selectors
 import argparse
 # custom
-import tcp_actions.listen as Listen
+from tcp_actions.client import parse_target
+from tcp_actions.engine import Engine
+from tcp_actions.control import ControlServer
+from tcp_actions.daemon import Daemon
+from tcp_actions.metrics import format_stats
+from tcp_actions.capture import start_capture, stop_capture
+from tcp_actions.render import RENDERERS
 
 parser = argparse.ArgumentParser()
 parser.add_argument("folder", type=str,
@@ -20,41 +27,73 @@ parser.add_argument("-e", "--editor",
                     help="Specify what command should be run when attempting "
                     "to load a script in an editor. If left blank, no editor "
                     "will be opened.")
+parser.add_argument("-d", "--daemon", action="store_true",
+                    help="Also serve requests from the other scripts over a "
+                    "local control socket, keeping caches warm between them.")
+parser.add_argument("--control-socket", type=str, default=None,
+                    help="Path of the daemon's control socket.")
+parser.add_argument("--capture", type=str, metavar="FILE",
+                    help="Record every message sent and received to FILE, "
+                    "for replay_capture.py.")
+parser.add_argument("--capture-size", type=int, default=64, metavar="MB",
+                    help="Rotate the capture file once it grows past this "
+                    "many megabytes, keeping three old ones.")
+parser.add_argument("-f", "--format", choices=sorted(RENDERERS),
+                    default="text",
+                    help="How messages from TTS are printed: plain text, the "
+                    "html the gui shows, or one json object per line.")
+parser.add_argument("--target", type=parse_target, action="append",
+                    metavar="HOST:PORT",
+                    help="A TTS instance the daemon sends to, as HOST:PORT "
+                    "or just PORT. May be given more than once, and messages "
+                    "received are then tagged with the target they came "
+                    "from. Defaults to $TTS_DEVSERVER_TARGETS, else "
+                    "localhost:39999.")
+parser.add_argument("--stats", action="store_true",
+                    help="Print message counts, sizes and timings by "
+                    "messageID on exit.")
 
 args = parser.parse_args()
 
 HOST = "localhost"
 PORT = 39998
+SEND_PORT = 39999
+
+
+def print_output(toprint):
+    print(toprint, end="", flush=True)
 
-selector = selectors.DefaultSelector()
 
+if args.capture:
+    try:
+        start_capture(args.capture, args.capture_size * 1024 * 1024)
+    except OSError as err:
+        print("Error opening capture file: ", err)
+        sys.exit(1)
+engine = Engine(HOST, SEND_PORT, PORT, args.target)
+server = engine.listen(args.folder, args.editor, on_output=print_output,
+                       render=RENDERERS[args.format])
+control_server = None
+if args.daemon:
+    daemon = Daemon(engine)
+    control_server = ControlServer(daemon.handle, args.control_socket)
+    server.attach(control_server)
 try:
-    tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    tcp_socket.bind((HOST, PORT))
-    tcp_socket.listen()
+    server_thread = server.start_in_thread()
     print("TTS DevServer listening on port", PORT)
-    tcp_socket.setblocking(False)
-
-    atexit.register(Listen.terminate_socket, tcp_socket, selector)
-
-    selector.register(tcp_socket, selectors.EVENT_READ, data=None)
-
-    while True:
-        events = selector.select(timeout=None)
-        for key, mask in events:
-            if key.data is None:
-                Listen.accept_wrapper(key.fileobj, selector)
-            else:
-                toprint = Listen.service_connection(
-                    key, mask,
-                    args.folder, args.editor,
-                    selector
-                )
-                if len(toprint) > 0:
-                    for entry in toprint:
-                        print(entry, end="")
-except socket.error as err:
+    if control_server is not None:
+        print("Daemon control socket at", control_server.socket_path)
+    # join in short steps so SIGINT is noticed on every platform
+    while server_thread.is_alive():
+        server_thread.join(0.5)
+except OSError as err:
     print("Socket error ", err)
 except KeyboardInterrupt:
     # avoid ugly errors in term when SIGINT received and gracefully exit
+    print("\nSpinning down server.")
+    server.shutdown()
+    stop_capture()
+    if args.stats:
+        rd = format_stats(server.metrics.snapshot())
+        print_output("".join(str(entry) for entry in rd))
     sys.exit(0)
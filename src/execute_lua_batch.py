@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Executes many snippets of lua code on many objects at once, packing them into
+as few messages to the running TableTop Sim instance as possible, and prints
+a result for each snippet.
+
+Snippets are read one per line as json objects, either from a file or from
+stdin:
+
+{"guid": "67362e", "code": "return self.getName()"}
+{"guid": "-1", "code": "return #getObjects()"}
+"""
+
+import sys
+import argparse
+# custom
+import tcp_actions.codec as Codec
+from tcp_actions.client import (daemon_request, parse_target, print_response,
+                                read_batch_items)
+
+parser = argparse.ArgumentParser()
+parser.add_argument("file", type=str, nargs="?", default="-",
+                    help="File of json lines holding guid and code pairs. "
+                         "Reads from stdin if omitted or -.")
+parser.add_argument("-n", "--no-wait", action="store_true",
+                    help="Send the snippets without waiting for results. "
+                         "Without a dev_server.py daemon, use this while "
+                         "dev_server.py is running.")
+parser.add_argument("-t", "--timeout", type=float, default=30.0,
+                    help="Seconds to wait for all results.")
+parser.add_argument("--target", type=parse_target, action="append",
+                    metavar="HOST:PORT",
+                    help="A TTS instance to send to, as HOST:PORT or just "
+                         "PORT. May be given more than once; results are "
+                         "only waited for on the first. Defaults to "
+                         "$TTS_DEVSERVER_TARGETS, else localhost:39999.")
+
+args = parser.parse_args()
+
+HOST = "localhost"
+PORT = 39999
+LISTEN_PORT = 39998
+
+try:
+    if args.file == "-":
+        items = read_batch_items(sys.stdin)
+    else:
+        with open(args.file, mode="r", encoding="utf-8") as batch_file:
+            items = read_batch_items(batch_file)
+except (OSError, ValueError, KeyError) as err:
+    print("Error reading snippets: ", err)
+    sys.exit(1)
+
+request = {
+    "items": items,
+    "wait": not args.no_wait,
+    "timeout": args.timeout,
+    "targets": args.target,
+}
+# let a running daemon do the work if there is one
+batch = daemon_request(dict(request, command="execute_batch"))
+if batch is None:
+    # no daemon, so do the work here
+    from tcp_actions.engine import Engine
+    engine = Engine(HOST, PORT, LISTEN_PORT, args.target)
+    batch = engine.execute_batch(**request)
+    engine.close()
+if args.no_wait or not batch.get("ok"):
+    sys.exit(print_response(batch))
+
+for result in batch["results"]:
+    print(Codec.dumps(result).decode("utf-8"))
+print(batch["count"], "snippets in", batch["messages"], "messages,",
+      batch["failed"], "failed,", round(batch["per_second"], 1),
+      "per second", file=sys.stderr)
+sys.exit(1 if batch["failed"] > 0 else 0)
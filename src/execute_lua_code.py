@@ -4,9 +4,10 @@ Sends arbitrary code to the running TableTop Sim instance,
 to be executed globally or on a given object
 """
 
-import socket
-import json
+import sys
 import argparse
+# custom
+from tcp_actions.client import daemon_request, parse_target, print_response
 
 parser = argparse.ArgumentParser()
 parser.add_argument("guid", type=str,
@@ -14,29 +15,41 @@ parser.add_argument("guid", type=str,
                          "-1 is global.")
 parser.add_argument("code", type=str,
                     help="The code to be executed.")
+parser.add_argument("-w", "--wait", action="store_true",
+                    help="Wait for the code to finish and print the value "
+                         "it returned. Without a dev_server.py daemon this "
+                         "listens on port 39998 itself, so dev_server.py "
+                         "must not be running.")
+parser.add_argument("-t", "--timeout", type=float, default=10.0,
+                    help="Seconds to wait for a returned value with -w.")
+parser.add_argument("--target", type=parse_target, action="append",
+                    metavar="HOST:PORT",
+                    help="A TTS instance to send to, as HOST:PORT or just "
+                         "PORT. May be given more than once; -w only waits "
+                         "on the first. Defaults to $TTS_DEVSERVER_TARGETS, "
+                         "else localhost:39999.")
 
 args = parser.parse_args()
 
 HOST = "localhost"
 PORT = 39999
+LISTEN_PORT = 39998
 
-message = {
-    "messageID": 3,
+request = {
     "guid": args.guid,
-    "script": args.code
+    "code": args.code,
+    "wait": args.wait,
+    "timeout": args.timeout,
+    "targets": args.target,
 }
-
-data = json.dumps(message)
-
-# prevent name being unbound in 'finally'
-tcp_socket = None
-try:
-    tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    tcp_socket.connect((HOST, PORT))
-    tcp_socket.sendall(bytes(data, encoding="utf-8"))
-    tcp_socket.shutdown(socket.SHUT_RDWR)
-except socket.error as err:
-    print("Socket error ", err)
-finally:
-    if tcp_socket:
-        tcp_socket.close()
+# let a running daemon do the work if there is one
+response = daemon_request(dict(request, command="execute"))
+if response is None:
+    # no daemon, so do the work here
+    from tcp_actions.engine import Engine
+    engine = Engine(HOST, PORT, LISTEN_PORT, args.target)
+    response = engine.execute(**request)
+    engine.close()
+if args.wait and response.get("ok"):
+    print(response["value"])
+sys.exit(print_response(response))
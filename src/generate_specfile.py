@@ -3,10 +3,59 @@ tools for automatically generating a specfile from a given folder of scripts
 """
 
 import os
-import json
+import re
+# custom
+import tcp_actions.codec as Codec
 
+# folder + specfile -> the directory mtimes seen by the last run, and the
+# stat of the specfile it left behind
+_cache = {}
+# the six hex digit guid TTS gives every object, and the name after it
+GUID_PREFIX = re.compile(r"^([0-9a-f]{6})-(.*)$")
 
-def generate_specfile_from_folder(folder, specfile_path):
+
+def scan_folder(folder) -> tuple[list, dict]:
+    """
+    walk folder and its subfolders (skipping hidden ones like .git) with
+    os.scandir, returning every file as a (name, path) pair along with the
+    mtime of every directory visited
+    """
+    files = []
+    dir_mtimes = {}
+    pending = [os.path.abspath(folder)]
+    while pending:
+        directory = pending.pop()
+        dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+        with os.scandir(directory) as scan:
+            for entry in scan:
+                if entry.is_dir():
+                    if not entry.name.startswith("."):
+                        pending.append(entry.path)
+                elif entry.is_file():
+                    files.append((entry.name, entry.path))
+    files.sort(key=lambda file: file[1])
+    return files, dir_mtimes
+
+
+def _specfile_stat(specfile_path) -> tuple | None:
+    try:
+        stat = os.stat(specfile_path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _dirs_unchanged(dir_mtimes) -> bool:
+    try:
+        for directory, mtime in dir_mtimes.items():
+            if os.stat(directory).st_mtime_ns != mtime:
+                return False
+    except OSError:
+        return False
+    return True
+
+
+def generate_specfile_from_folder(folder, specfile_path) -> bool:
     """
     given a folder, parse every script within and generate a specfile from the
     names of the scripts in the folder. intended to be used with the
@@ -20,26 +69,45 @@ def generate_specfile_from_folder(folder, specfile_path):
     |    name saved in specfile
     guid saved in specfile
 
-    the single '-' splits these two, and the file extension determines if it is
-    stored in the 'script' (lua) or 'ui' (xml) key.
+    the first '-' splits these two, and the file extension determines if it is
+    stored in the 'script' (lua) or 'ui' (xml) key. only a guid as TTS makes
+    them, six lowercase hex digits, counts as one.
 
-    this function is ignorant of subdirectories.
+    a file without a guid is only taken for Global if it is named Global
+    (Global.lua / Global.xml, as TTS dumps it) and sits in folder itself.
+    every other file without a guid, string-utils.lua say, is a library
+    pulled in with #include or require(), like those unbundled from received
+    scripts, and is left out.
+    subdirectories are searched too. the directory mtimes of every run are
+    cached, and since they only change when files are added, removed or
+    renamed, an unchanged tree is not rescanned at all, as long as the
+    specfile was not rewritten since (from another folder, say). the
+    specfile is only rewritten when its contents would actually change.
+
+    return True if the specfile was written
     """
-    entries = []
+    cache_key = (os.path.abspath(folder), os.path.abspath(specfile_path))
+    cached = _cache.get(cache_key)
+    if (cached is not None and _dirs_unchanged(cached["dirs"])
+            and cached["specfile"] == _specfile_stat(specfile_path)):
+        return False
+    entries = {}
     try:
-        # gather files in given directory
-        for name in os.listdir(folder):
-            # get absolute path
-            abs_path = os.path.abspath(folder)
-            # open file
-            parse_filename = name.split("-")
+        files, dir_mtimes = scan_folder(folder)
+        root = os.path.abspath(folder)
+        for name, path in files:
+            parse_filename = GUID_PREFIX.match(name)
             obj_guid = -1
             # this may be global, in which case guid is not in filename
-            if len(parse_filename) > 1:
-                obj_guid = parse_filename[0]
-                obj_name = parse_filename[1]
+            if parse_filename is not None:
+                obj_guid, obj_name = parse_filename.groups()
+            elif (os.path.dirname(path) == root
+                    and os.path.splitext(name)[0] == "Global"):
+                obj_name = name
             else:
-                obj_name = parse_filename[0]
+                # files without a guid are libraries pulled in with #include
+                # or require()
+                continue
             split_extension = obj_name.split(".")
             obj_name = split_extension[0]  # strip extension
             if obj_name == "":
@@ -51,29 +119,37 @@ def generate_specfile_from_folder(folder, specfile_path):
                 continue
             obj_name = obj_name.replace("_", " ")
             # does an entry already exist for this item?
-            entry_does_not_exist = True
-            for entry in entries:
-                if obj_guid == entry["guid"]:  # we already made an entry
-                    entry_does_not_exist = False
-                    if type == "lua":
-                        entry["script"] = os.path.join(abs_path, name)
-                    else:
-                        entry["ui"] = os.path.join(abs_path, name)
-                    break
-            # create a new dict entry
-            if entry_does_not_exist:
-                new_entry = {
+            entry = entries.get(obj_guid)
+            if entry is None:
+                entry = {
                     "name": obj_name,
                     "guid": obj_guid
                 }
-                if type == "lua":
-                    new_entry["script"] = os.path.join(abs_path, name)
-                else:
-                    new_entry["ui"] = os.path.join(abs_path, name)
-                entries.append(new_entry)
-        # parse and save objects to disk
-        new_specfile = json.dumps(entries)
-        with open(specfile_path, mode="w", encoding="utf-8") as spec:
-            spec.write(new_specfile)
+                entries[obj_guid] = entry
+            if type == "lua":
+                entry["script"] = path
+            else:
+                entry["ui"] = path
+        # parse and save objects to disk, unless nothing changed
+        new_specfile = Codec.dumps(list(entries.values()))
+        written = False
+        try:
+            with open(specfile_path, mode="rb") as spec:
+                unchanged = spec.read() == new_specfile
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            with open(specfile_path, mode="wb") as spec:
+                spec.write(new_specfile)
+            written = True
+            # creating the specfile inside the scanned tree touches its dir
+            for directory in dir_mtimes:
+                dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+        _cache[cache_key] = {
+            "dirs": dir_mtimes,
+            "specfile": _specfile_stat(specfile_path),
+        }
+        return written
     except OSError as err:
         print("Error accessing file: ", err)
+        return False
@@ -3,27 +3,27 @@
 Requests lua scripts from the running TableTop Sim instance
 """
 
-import socket
-import json
+import sys
+import argparse
+# custom
+from tcp_actions.client import daemon_request, parse_target, print_response
 
-HOST = "localhost"
-PORT = 39999
+parser = argparse.ArgumentParser()
+parser.add_argument("--target", type=parse_target, action="append",
+                    metavar="HOST:PORT",
+                    help="A TTS instance to send to, as HOST:PORT or just "
+                         "PORT. May be given more than once. Defaults to "
+                         "$TTS_DEVSERVER_TARGETS, else localhost:39999.")
 
-message = {
-    "messageID": 0,
-}
+args = parser.parse_args()
 
-data = json.dumps(message)
+HOST = "localhost"
+PORT = 39999
 
-# prevent name being unbound in 'finally'
-tcp_socket = None
-try:
-    tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    tcp_socket.connect((HOST, PORT))
-    tcp_socket.sendall(bytes(data, encoding="utf-8"))
-    tcp_socket.shutdown(socket.SHUT_RDWR)
-except socket.error as err:
-    print("Socket error ", err)
-finally:
-    if tcp_socket:
-        tcp_socket.close()
+# let a running daemon do the work if there is one
+response = daemon_request({"command": "get_scripts", "targets": args.target})
+if response is None:
+    # no daemon, so do the work here
+    from tcp_actions.engine import Engine
+    response = Engine(HOST, PORT, targets=args.target).get_scripts()
+sys.exit(print_response(response))
@@ -0,0 +1,153 @@
+"""
+the qt side of the gui: the main window, the console bridge and the stats
+panel. __init__.py only imports this once its listen server is bound, since
+loading PySide6 and building the generated ui is most of its startup time
+"""
+
+import threading
+from collections import deque
+# qt6
+from PySide6.QtCore import QObject, Qt, QTimer, Signal
+from PySide6.QtWidgets import QMainWindow, QPlainTextEdit, QPushButton
+from ui_gui_mainwindow import Ui_MainWindow
+
+
+class MainWindow(QMainWindow):
+    """
+    on_close, if given, is called when the window is closed
+    """
+
+    def __init__(self, on_close=None):
+        super().__init__()
+        self.on_close = on_close
+        self.ui = Ui_MainWindow()
+        self.ui.setupUi(self)
+
+    def closeEvent(self, event):
+        event.accept()
+        if self.on_close is not None:
+            self.on_close()
+
+
+class ConsoleBridge(QObject):
+    """
+    hands output from any thread to the console widget. output is queued
+    and drawn at most once per flush interval on the gui thread, in a single
+    append, and both the queue and the console are capped to max_lines so a
+    mod spamming print() cannot freeze or bloat the gui
+    """
+    pending = Signal()
+
+    def __init__(self, console, max_lines, interval):
+        super().__init__()
+        self.console = console
+        self.interval = interval
+        self.console.document().setMaximumBlockCount(max_lines)
+        self._lines = deque(maxlen=max_lines)
+        self._dropped = 0
+        self._scheduled = False
+        self._lock = threading.Lock()
+        # emitted from the server thread, so this always lands on ours
+        self.pending.connect(self._schedule, Qt.QueuedConnection)
+
+    def write(self, toprint):
+        """
+        queue one message's worth of output, either already rendered or as
+        an output list. safe to call from any thread
+        """
+        if isinstance(toprint, str):
+            line = toprint
+        else:
+            line = "".join(str(entry) for entry in toprint)
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen:
+                self._dropped += 1
+            self._lines.append(line)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.pending.emit()
+
+    def _schedule(self):
+        QTimer.singleShot(self.interval, self.flush)
+
+    def flush(self):
+        with self._lock:
+            lines = list(self._lines)
+            self._lines.clear()
+            dropped = self._dropped
+            self._dropped = 0
+            self._scheduled = False
+        if dropped > 0:
+            lines.insert(0, "<font color='#FF9900'>" + str(dropped)
+                         + " older messages dropped</font>")
+        if len(lines) == 0:
+            return
+        self.console.append("".join(lines))
+        scrollbar = self.console.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+
+class StatsPanel:
+    """
+    a stats button on the left of the generated ui, toggling a panel on the
+    right that shows describe() and refreshes it every interval while it is
+    shown. the panel itself is only built the first time it is asked for
+    """
+
+    def __init__(self, window, interval, describe):
+        self.window = window
+        self.interval = interval
+        self.describe = describe
+        self.panel = None
+        self.timer = None
+        ui = window.ui
+        button = QPushButton("Show / Hide Stats", ui.left_split_frame)
+        button.setObjectName("stats_button")
+        ui.verticalLayout.addWidget(button)
+        button.clicked.connect(self.toggle)
+
+    def toggle(self):
+        if self.panel is None:
+            self._build()
+        if self.panel.isVisible():
+            self.timer.stop()
+            self.panel.hide()
+        else:
+            self.refresh()
+            self.panel.show()
+            self.timer.start()
+
+    def refresh(self):
+        self.panel.setPlainText(self.describe())
+
+    def _build(self):
+        ui = self.window.ui
+        self.panel = QPlainTextEdit(ui.right_split_frame)
+        self.panel.setObjectName("stats_panel")
+        self.panel.setReadOnly(True)
+        self.panel.setFont(ui.console_output.font())
+        self.panel.hide()
+        ui.right_split.addWidget(self.panel)
+        self.timer = QTimer(self.window)
+        self.timer.setInterval(self.interval)
+        self.timer.timeout.connect(self.refresh)
+
+
+def idle_timer(parent, interval, callback) -> QTimer:
+    """
+    a single shot timer calling callback once it has been left alone for
+    interval milliseconds since it was last (re)started
+    """
+    timer = QTimer(parent)
+    timer.setSingleShot(True)
+    timer.setInterval(interval)
+    timer.timeout.connect(callback)
+    return timer
+
+
+def when_idle(callback):
+    """
+    call callback once the event loop is running and has drawn the window
+    """
+    QTimer.singleShot(0, callback)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Plays back a capture recorded with dev_server.py --capture.
+
+By default the messages TTS sent are fed to a dev server listening on
+localhost:39998, as if TTS was sending them again. With --outbound, the
+messages the dev server sent are fed to whatever listens on localhost:39999
+instead (TTS itself, or tts_simulator.py). With --folder, a listen server of
+its own is started and fed, saving into that folder, so a capture can be
+replayed as a fixture with nothing else running.
+"""
+
+import sys
+import time
+import argparse
+import threading
+# custom
+from tcp_actions.capture import (INBOUND, OUTBOUND, DIRECTIONS, UNKNOWN_ID,
+                                 capture_files, read_capture, replay)
+from tcp_actions.sender import Sender
+from tcp_actions.server import ListenServer
+from tcp_actions.metrics import format_stats
+
+parser = argparse.ArgumentParser()
+parser.add_argument("capture", type=str,
+                    help="Capture file to play back. Files it was rotated "
+                         "into are played first.")
+parser.add_argument("-o", "--outbound", action="store_true",
+                    help="Play back what the dev server sent to TTS, instead "
+                         "of what TTS sent to the dev server.")
+parser.add_argument("-s", "--speed", type=float, default=1.0,
+                    help="Playback speed relative to the capture. 0 sends "
+                         "everything as fast as possible.")
+parser.add_argument("-f", "--folder", type=str, default=None,
+                    help="Replay into a listen server of our own that saves "
+                         "scripts here, and print its stats afterwards.")
+parser.add_argument("-l", "--list", action="store_true",
+                    help="Only list the frames in the capture.")
+
+args = parser.parse_args()
+
+HOST = "localhost"
+PORT = 39999
+LISTEN_PORT = 39998
+
+direction = OUTBOUND if args.outbound else INBOUND
+
+
+def frames():
+    for path in capture_files(args.capture):
+        for frame in read_capture(path):
+            if args.list or frame[1] == direction:
+                yield frame
+
+
+if args.list:
+    try:
+        for timestamp, frame_direction, message_id, data in frames():
+            print(round(timestamp, 3), DIRECTIONS.get(frame_direction),
+                  message_id, len(data), "bytes")
+    except (OSError, ValueError) as err:
+        print("Error reading capture: ", err)
+        sys.exit(1)
+    sys.exit(0)
+
+# seconds our own listen server gets to finish handling the replay
+DRAIN_TIMEOUT = 60
+handled = threading.Semaphore(0)
+
+server = None
+if args.folder is not None:
+    # port 0 lets the system pick a free one
+    server = ListenServer(HOST, 0, args.folder)
+    server.subscribe(None, lambda message: handled.release())
+    try:
+        server.start_in_thread()
+    except OSError as err:
+        print("Socket error ", err)
+        sys.exit(1)
+    sender = Sender(HOST, server.bound_port)
+else:
+    sender = Sender(HOST, PORT if args.outbound else LISTEN_PORT)
+
+
+def send(message_id, data) -> list[str]:
+    return sender.send(data, None if message_id == UNKNOWN_ID else message_id)
+
+
+try:
+    result = replay(frames(), send, args.speed)
+except (OSError, ValueError) as err:
+    print("Error reading capture: ", err)
+    if server is not None:
+        server.shutdown()
+    sys.exit(1)
+if server is not None:
+    # wait for every message that got through to be handled
+    deadline = time.monotonic() + DRAIN_TIMEOUT
+    for _ in range(result["count"] - result["failed"]):
+        if not handled.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            print("Error: not every message was handled in time")
+            break
+    server.shutdown()
+print("Replayed", result["count"], "messages,", result["bytes"], "bytes in",
+      round(result["seconds"], 3), "seconds,", result["failed"], "failed")
+if server is not None:
+    for entry in format_stats(server.metrics.snapshot()):
+        print(entry, end="")
+sys.exit(1 if result["failed"] > 0 else 0)
@@ -19,58 +19,120 @@ adhering to the following pattern:
 ...and so forth for each object with an associated script and/or ui file.
 The "script" and "ui" fields are optional, but you really should have at least
 one or the other.
+
+With -i, only the objects whose files changed since the last push are sent,
+using a manifest stored next to the specfile. With -w FOLDER it keeps running,
+regenerating the specfile from FOLDER and pushing whatever changed every time
+scripts in it are saved.
+
+Lines like "#include lib/util" and calls like require("lib.util") are
+resolved next to the script and then in every -I folder, and the files they
+name are bundled into the script that is sent.
 """
 
-import socket
-import json
+import os
+import sys
 import argparse
+# custom
+from tcp_actions.client import daemon_request, parse_target, print_response
 
 parser = argparse.ArgumentParser()
 parser.add_argument("specfile", type=str,
                     help="Path to the spec.json file defining the objects, "
                          "scripts, and XML files to be sent to TTS.")
+parser.add_argument("-i", "--incremental", action="store_true",
+                    help="Only send objects whose script or ui changed since "
+                         "the last push. The first push is always full.")
+parser.add_argument("-w", "--watch", type=str, metavar="FOLDER",
+                    help="Keep running, and after every burst of saves in "
+                         "FOLDER regenerate the specfile from it and push "
+                         "only the changed scripts.")
+parser.add_argument("--poll", action="store_true",
+                    help="With -w, poll the folder instead of using inotify.")
+parser.add_argument("-I", "--include", type=str, action="append",
+                    default=[], metavar="FOLDER",
+                    help="Folder to look for #include and require() files "
+                         "in. May be given more than once.")
+parser.add_argument("-m", "--minify", action="store_true",
+                    help="Strip comments and collapse whitespace in the lua "
+                         "and xml sent, to shrink big pushes.")
+parser.add_argument("--target", type=parse_target, action="append",
+                    metavar="HOST:PORT",
+                    help="A TTS instance to send to, as HOST:PORT or just "
+                         "PORT. May be given more than once. Defaults to "
+                         "$TTS_DEVSERVER_TARGETS, else localhost:39999.")
 
 args = parser.parse_args()
 
 HOST = "localhost"
 PORT = 39999
+# the engine doing the work when no daemon is running, kept between pushes
+engine = None
+
+
+def local_engine():
+    """
+    the engine is only imported and created once a daemon was not found
+    """
+    global engine
+    if engine is None:
+        from tcp_actions.engine import Engine
+        engine = Engine(HOST, PORT, targets=args.target)
+    return engine
 
-# gather all the files from the given path
-definitions = []
-try:
-    with open(args.specfile, mode="r", encoding="utf-8") as specfile:
-        json_spec = json.load(specfile)
-        for entry in json_spec:
-            new_definition = {
-                "name": entry["name"],
-                "guid": entry["guid"],
-            }
-            if "script" in entry:
-                with open(entry["script"], mode="r", encoding="utf-8") as scr:
-                    new_definition["script"] = scr.read()
-            if "ui" in entry:
-                with open(entry["ui"], mode="r", encoding="utf-8") as xml:
-                    new_definition["ui"] = xml.read()
-            definitions.append(new_definition)
-except OSError as error:
-    print("Error opening specfile: ", error)
-
-message = {
-    "messageID": 1,
-    "scriptStates": definitions
-}
 
-data = json.dumps(message)
-
-# prevent name being unbound in 'finally'
-tcp_socket = None
-try:
-    tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    tcp_socket.connect((HOST, PORT))
-    tcp_socket.sendall(bytes(data, encoding="utf-8"))
-    tcp_socket.shutdown(socket.SHUT_RDWR)
-except socket.error as err:
-    print("Socket error ", err)
-finally:
-    if tcp_socket:
-        tcp_socket.close()
+def push_changes(specfile, folder, changes) -> int:
+    """
+    push the objects touched by one burst of changes, through the daemon if
+    one is running. changes of None mean everything has to be rechecked
+    """
+    structure_changed = (changes is None
+                         or any(kind != CHANGED for kind in changes.values()))
+    only_paths = None if changes is None else sorted(changes)
+    request = {
+        "specfile": specfile,
+        "folder": folder if structure_changed else None,
+        "incremental": True,
+        "paths": only_paths,
+        "skip_empty": True,
+        "include_path": include_path,
+        "minify": args.minify,
+        "targets": args.target,
+    }
+    response = daemon_request(dict(request, command="save_and_play"))
+    if response is None:
+        response = local_engine().save_and_play(**request)
+    if response.get("sent"):
+        print("Pushed", response["sent"], "changed objects")
+    return print_response(response)
+
+
+include_path = [os.path.abspath(folder) for folder in args.include]
+
+if args.watch:
+    from tcp_actions.watch import CHANGED, create_watcher, debounced_changes
+    specfile_path = os.path.abspath(args.specfile)
+    watch_folder = os.path.abspath(args.watch)
+    watcher = create_watcher(watch_folder, args.poll)
+    print("Watching", watch_folder, "for changes")
+    try:
+        # catch up on anything saved while we were not watching
+        push_changes(specfile_path, watch_folder, None)
+        for changes in debounced_changes(watcher):
+            push_changes(specfile_path, watch_folder, changes)
+    except KeyboardInterrupt:
+        watcher.close()
+        sys.exit(0)
+
+request = {
+    "specfile": os.path.abspath(args.specfile),
+    "incremental": args.incremental,
+    "include_path": include_path,
+    "minify": args.minify,
+    "targets": args.target,
+}
+# let a running daemon do the work if there is one
+response = daemon_request(dict(request, command="save_and_play"))
+if response is None:
+    response = local_engine().save_and_play(**request)
+sys.exit(print_response(response))
@@ -4,46 +4,38 @@ Sends a custom message to the running TableTop Sim instance,
 in the format of a table containing key=value pairs
 """
 
-import socket
-import json
+import sys
 import argparse
+# custom
+from tcp_actions.client import (daemon_request, parse_table, parse_target,
+                                print_response)
 
 parser = argparse.ArgumentParser()
 parser.add_argument("values", type=str, nargs="*",
                     help="key = value pairs. Any number is allowed.")
+parser.add_argument("--target", type=parse_target, action="append",
+                    metavar="HOST:PORT",
+                    help="A TTS instance to send to, as HOST:PORT or just "
+                         "PORT. May be given more than once. Defaults to "
+                         "$TTS_DEVSERVER_TARGETS, else localhost:39999.")
 
 args = parser.parse_args()
 
-keys = []
-values = []
-
-for entry in args.values:
-    split = entry.split("=")
-    if len(split) > 1 and "" != split[1]:
-        keys.append(split[0])
-        values.append(split[1])
-
-table_to_send = dict(zip(keys, values))
+table_to_send = parse_table(args.values)
 
 HOST = "localhost"
 PORT = 39999
 
-message = {
-    "messageID": 2,
-    "customMessage": table_to_send
-}
-
-data = json.dumps(message)
-
-# prevent name being unbound in 'finally'
-tcp_socket = None
-try:
-    tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    tcp_socket.connect((HOST, PORT))
-    tcp_socket.sendall(bytes(data, encoding="utf-8"))
-    tcp_socket.shutdown(socket.SHUT_RDWR)
-except socket.error as err:
-    print("Socket error ", err)
-finally:
-    if tcp_socket:
-        tcp_socket.close()
+# let a running daemon do the work if there is one
+response = daemon_request({
+    "command": "send_message",
+    "table": table_to_send,
+    "targets": args.target,
+})
+if response is None:
+    # no daemon, so do the work here
+    from tcp_actions.engine import Engine
+    response = Engine(HOST, PORT, targets=args.target).send_message(
+        table_to_send
+    )
+sys.exit(print_response(response))
@@ -0,0 +1,91 @@
+"""
+a store for the gui's user settings, which writes them to disk on a
+background thread so saving never blocks the ui
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+# custom
+import tcp_actions.codec as Codec
+from tcp_actions.writer import write_atomic
+
+SETTINGS_FIELDS = (
+    "specfile",
+    "editor",
+    "up_folder",
+    "down_folder",
+    "send_message",
+    "code",
+    "guid",
+)
+
+
+class SettingsStore:
+    """
+    holds the current value of every setting. update() only queues a save
+    when a value actually changed, saves run one at a time on a single
+    worker thread, and each one replaces the settings file atomically
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.values = dict.fromkeys(SETTINGS_FIELDS)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="settings"
+        )
+        self._pending = None
+
+    def load(self) -> bool:
+        """
+        load previously saved settings
+        return True if successful or False if not
+        """
+        try:
+            with open(self.path, mode="rb") as save_file:
+                parsed_data = Codec.loads(save_file.read())
+        except (OSError, ValueError) as err:
+            print("Error loading user settings: ", err)
+            return False
+        with self._lock:
+            for field in SETTINGS_FIELDS:
+                if field in parsed_data:
+                    self.values[field] = parsed_data[field]
+        return True
+
+    def update(self, changes) -> bool:
+        """
+        merge changed fields into the store and queue a save if any of them
+        differ from what is already there
+
+        return True if a save was queued
+        """
+        with self._lock:
+            dirty = {
+                field: value for field, value in changes.items()
+                if self.values.get(field) != value
+            }
+            if not dirty:
+                return False
+            self.values.update(dirty)
+            snapshot = dict(self.values)
+            self._pending = self._executor.submit(self._save, snapshot)
+        return True
+
+    def flush(self):
+        """
+        block until the last queued save has finished
+        """
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _save(self, snapshot):
+        try:
+            write_atomic(self.path, Codec.dumps(snapshot))
+        except OSError as err:
+            print("Error saving user settings: ", err)
@@ -0,0 +1,176 @@
+"""
+pack many (guid, code) snippets into as few execute code messages as possible
+and hand back a result for each of them
+"""
+
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+# custom
+import tcp_actions.codec as Codec
+from tcp_actions.evaluate import DEFAULT_TIMEOUT
+from tcp_actions.messages import ExecuteLua
+
+# stay well under what TTS comfortably accepts in a single message
+MAX_PAYLOAD_BYTES = 256 * 1024
+# keeps every generated chunk far from lua's per-function constant limits
+MAX_ITEMS_PER_CHUNK = 500
+PRELUDE = """local __results = {}
+local function __run(index, guid, fn)
+    local target = nil
+    if guid ~= "-1" then
+        target = getObjectFromGUID(guid)
+        if target == nil then
+            __results[#__results + 1] = {
+                index = index, guid = guid, ok = false,
+                error = "no object with guid " .. guid
+            }
+            return
+        end
+    end
+    local ok, value = pcall(fn, target)
+    if type(value) == "userdata" or type(value) == "function" then
+        value = tostring(value)
+    end
+    local result = {index = index, guid = guid, ok = ok}
+    if ok then
+        result.value = value
+    else
+        result.error = tostring(value)
+    end
+    __results[#__results + 1] = result
+end
+"""
+ITEM = """__run({index}, {guid}, function(self)
+{code}
+end)
+"""
+EPILOGUE = "return JSON.encode(__results)\n"
+
+
+def build_chunks(items, max_bytes=MAX_PAYLOAD_BYTES,
+                 max_items=MAX_ITEMS_PER_CHUNK) -> list[list[int]]:
+    """
+    split the items into chunks that each fit in one message, returning the
+    item indexes belonging to each chunk
+    """
+    chunks = []
+    current = []
+    size = len(PRELUDE) + len(EPILOGUE)
+    for index, (guid, code) in enumerate(items):
+        item_size = len(ITEM) + len(guid) + len(code.encode("utf-8")) + 16
+        if current and (size + item_size > max_bytes
+                        or len(current) >= max_items):
+            chunks.append(current)
+            current = []
+            size = len(PRELUDE) + len(EPILOGUE)
+        current.append(index)
+        size += item_size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def build_batch_script(items, indexes) -> str:
+    """
+    generate the Global script that runs the given items and returns all of
+    their results at once as a json string.
+
+    every snippet runs inside Global with self bound to its object, rather
+    than inside that object's own script, so snippets relying on an object's
+    script-local functions or variables should be executed one at a time
+    """
+    parts = [PRELUDE]
+    for index in indexes:
+        guid, code = items[index]
+        parts.append(ITEM.format(
+            index=index,
+            guid=Codec.dumps(guid).decode("utf-8"),
+            code=code
+        ))
+    parts.append(EPILOGUE)
+    return "".join(parts)
+
+
+def _collect(returned, results, indexes, error=None):
+    if error is not None:
+        for index in indexes:
+            results[index] = {"ok": False, "error": str(error)}
+        return
+    for result in Codec.loads(returned):
+        index = int(result["index"])
+        results[index] = {"ok": result["ok"]}
+        if result["ok"]:
+            results[index]["value"] = result.get("value")
+        else:
+            results[index]["error"] = result.get("error")
+
+
+def run_batch(evaluator, items, timeout=DEFAULT_TIMEOUT,
+              max_bytes=MAX_PAYLOAD_BYTES) -> dict:
+    """
+    run every (guid, code) item through the given Evaluator, packed into as
+    few messages as possible, and return a result per item in input order.
+
+    if a whole chunk fails (a syntax error in one snippet breaks the chunk
+    it was packed into), it is split in half and retried until the bad
+    snippet is isolated, so it does not take the others down with it
+    """
+    started = time.perf_counter()
+    results = [None] * len(items)
+    chunks = build_chunks(items, max_bytes)
+    messages = 0
+    while chunks:
+        in_flight = [
+            (indexes,
+             evaluator.submit("-1", build_batch_script(items, indexes)))
+            for indexes in chunks
+        ]
+        messages += len(in_flight)
+        chunks = []
+        for indexes, future in in_flight:
+            remaining = max(0.0, started + timeout - time.perf_counter())
+            try:
+                _collect(future.result(remaining), results, indexes)
+            except FutureTimeoutError:
+                _collect(None, results, indexes, "no answer from TTS")
+            except Exception as err:
+                if len(indexes) > 1:
+                    # halve the chunk until the broken snippet is isolated
+                    half = len(indexes) // 2
+                    chunks.extend([indexes[:half], indexes[half:]])
+                else:
+                    _collect(None, results, indexes, err)
+    for index, (guid, _) in enumerate(items):
+        if results[index] is None:
+            results[index] = {"ok": False, "error": "no result returned"}
+        results[index]["guid"] = guid
+    seconds = time.perf_counter() - started
+    return {
+        "results": results,
+        "count": len(items),
+        "failed": sum(not result["ok"] for result in results),
+        "messages": messages,
+        "seconds": seconds,
+        "per_second": len(items) / seconds if seconds > 0 else 0.0,
+    }
+
+
+def batch_messages(items, max_bytes=MAX_PAYLOAD_BYTES) -> list[ExecuteLua]:
+    """
+    every item packed into as few messages as possible
+    """
+    return [
+        ExecuteLua("-1", build_batch_script(items, indexes))
+        for indexes in build_chunks(items, max_bytes)
+    ]
+
+
+def send_batch(sender, items, max_bytes=MAX_PAYLOAD_BYTES) -> list[str]:
+    """
+    fire off every item packed into as few messages as possible, without
+    waiting for any results
+    """
+    rd = []
+    for message in batch_messages(items, max_bytes):
+        rd.extend(sender.send_message(message))
+    return rd
@@ -0,0 +1,276 @@
+"""
+inline the files a lua script pulls in with #include or require() before it
+is pushed to TTS, and split scripts TTS sends back into their original files.
+
+    #include path/to/file
+is replaced by the file's contents (themselves expanded), between two
+    ----#include path/to/file
+marker lines, the same way the Atom plugin bundles them.
+
+    require("some.module")
+makes some/module.lua a function registered in a small module table at the
+top of the script, loaded once on first use. each module sits between
+----#bundle marker lines so it can be found again.
+
+both are looked up next to the file using them first, and then in every
+folder of the include path, with .lua or .ttslua appended if need be
+"""
+
+import os
+import re
+from collections import OrderedDict
+
+EXTENSIONS = ("", ".lua", ".ttslua")
+INCLUDE = re.compile(r"^#include[ \t]+<?([^>\s]+)>?[ \t]*\r?$", re.MULTILINE)
+REQUIRE = re.compile(r"""(?<![\w.:])require\s*\(?\s*["']([\w./-]+)["']""")
+INCLUDE_MARKER = re.compile(r"^----#include[ \t]+(\S+)[ \t]*\r?\n?$")
+PRELUDE = """----#bundle prelude
+local __bundle_modules, __bundle_loaded = {}, {}
+local function __bundle_require(name)
+    local loaded = __bundle_loaded[name]
+    if loaded ~= nil then return loaded end
+    local module = __bundle_modules[name]
+    if module == nil then error("module '" .. name .. "' not found") end
+    loaded = module(__bundle_require)
+    if loaded == nil then loaded = true end
+    __bundle_loaded[name] = loaded
+    return loaded
+end
+local require = __bundle_require
+"""
+MODULE = """----#bundle module {name}
+__bundle_modules["{name}"] = function(require)
+{contents}end
+----#bundle end
+"""
+ROOT_MARKER = "----#bundle root\n"
+# how many built bundles are kept, least recently used dropped first
+BUNDLE_CACHE_SIZE = 32
+MODULE_BLOCK = re.compile(
+    r'^----#bundle module (\S+)\n__bundle_modules\[[^\n]*\] = '
+    r'function\(require\)\n(.*?)^end\n----#bundle end\n',
+    re.MULTILINE | re.DOTALL
+)
+
+
+class BundleError(ValueError):
+    """
+    a script could not be bundled: an #include could not be found, or
+    includes itself
+    """
+
+
+def _read(path) -> str:
+    with open(path, mode="r", encoding="utf-8") as source:
+        return source.read()
+
+
+def _with_newline(contents) -> str:
+    if contents and not contents.endswith("\n"):
+        return contents + "\n"
+    return contents
+
+
+class Bundler:
+    """
+    keeps a dependency graph of every file it has parsed, refreshed only
+    when a file's mtime or size changes, and the last few bundles built,
+    each rebuilt only when a file it depends on changed. the contents of
+    files are not kept, only the names they include and require
+    """
+
+    def __init__(self, include_path=()):
+        self.include_path = [os.path.abspath(folder)
+                             for folder in include_path]
+        # path -> mtime, size and the names it includes / requires
+        self._parsed = {}
+        # path -> (dependency signature, bundled script)
+        self._bundles = OrderedDict()
+
+    def dependencies(self, path) -> dict:
+        """
+        every file the script at path depends on, directly or not, mapped to
+        its [mtime, size]. raises BundleError if an #include is missing
+        """
+        path = os.path.abspath(path)
+        found = {}
+        pending = [path]
+        while pending:
+            current = pending.pop()
+            parsed = self._parse(current)
+            for name in parsed["includes"]:
+                resolved = self._resolve(name, current)
+                if resolved is None:
+                    raise BundleError("cannot find #include " + name
+                                      + " from " + current)
+                if resolved not in found and resolved != path:
+                    pending.append(resolved)
+                    found[resolved] = None
+            for name in parsed["requires"]:
+                # a require we cannot find is left for the game to deal with
+                resolved = self._resolve(name.replace(".", "/"), current)
+                if (resolved is not None and resolved not in found
+                        and resolved != path):
+                    pending.append(resolved)
+                    found[resolved] = None
+        for dependency in found:
+            parsed = self._parsed[dependency]
+            found[dependency] = [parsed["mtime"], parsed["size"]]
+        return found
+
+    def bundle(self, path) -> str:
+        """
+        the script at path with everything it includes or requires inlined.
+        a script using neither comes back exactly as it is on disk
+        """
+        path = os.path.abspath(path)
+        dependencies = self.dependencies(path)
+        parsed = self._parsed[path]
+        signature = (parsed["mtime"], parsed["size"],
+                     sorted(dependencies.items()))
+        cached = self._bundles.get(path)
+        if cached is not None and cached[0] == signature:
+            self._bundles.move_to_end(path)
+            return cached[1]
+        if not dependencies:
+            bundled = _read(path)
+        else:
+            modules = {}
+            root = self._expand(path, [], modules)
+            if modules:
+                parts = [PRELUDE]
+                for name, contents in modules.items():
+                    parts.append(MODULE.format(
+                        name=name,
+                        contents=_with_newline(contents)
+                    ))
+                parts.append(ROOT_MARKER)
+                parts.append(root)
+                bundled = "".join(parts)
+            else:
+                bundled = root
+        self._bundles[path] = (signature, bundled)
+        self._bundles.move_to_end(path)
+        while len(self._bundles) > BUNDLE_CACHE_SIZE:
+            self._bundles.popitem(last=False)
+        return bundled
+
+    def _parse(self, path) -> dict:
+        stat = os.stat(path)
+        parsed = self._parsed.get(path)
+        if (parsed is not None and parsed["mtime"] == stat.st_mtime_ns
+                and parsed["size"] == stat.st_size):
+            return parsed
+        contents = _read(path)
+        parsed = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "includes": INCLUDE.findall(contents),
+            "requires": REQUIRE.findall(contents),
+        }
+        self._parsed[path] = parsed
+        return parsed
+
+    def _resolve(self, name, relative_to) -> str | None:
+        folders = [os.path.dirname(relative_to)] + self.include_path
+        for folder in folders:
+            base = os.path.join(folder, os.path.expanduser(name))
+            for extension in EXTENSIONS:
+                candidate = base + extension
+                if os.path.isfile(candidate):
+                    return os.path.abspath(candidate)
+        return None
+
+    def _expand(self, path, stack, modules) -> str:
+        if path in stack:
+            raise BundleError("#include cycle through " + path)
+        parsed = self._parse(path)
+        contents = _read(path)
+        for name in parsed["requires"]:
+            if name in modules:
+                continue
+            resolved = self._resolve(name.replace(".", "/"), path)
+            if resolved is not None:
+                # claim the name first, modules may require each other
+                modules[name] = ""
+                modules[name] = self._expand(resolved, [], modules)
+
+        def include(match) -> str:
+            name = match.group(1)
+            resolved = self._resolve(name, path)
+            if resolved is None:
+                raise BundleError("cannot find #include " + name
+                                  + " from " + path)
+            marker = "----#include " + name + "\n"
+            return (marker
+                    + _with_newline(self._expand(resolved, stack + [path],
+                                                 modules))
+                    + marker.rstrip("\n"))
+        return INCLUDE.sub(include, contents)
+
+
+def module_file_name(name, required) -> str:
+    """
+    the file a module or include of the given name is saved as
+    """
+    if required:
+        name = name.replace(".", "/")
+    if os.path.splitext(name)[1] == "":
+        name += ".lua"
+    return name
+
+
+def _collapse_includes(script, modules, base="") -> str:
+    """
+    replace every #include region of script with its directive again,
+    collecting what it held in modules. an include is saved relative to
+    the file it appeared in (base being the folder of script itself), since
+    that is where it is looked up first
+    """
+    lines = script.splitlines(keepends=True)
+    out = []
+    # names, surrounding output and file names of the #include regions we
+    # are inside
+    stack = []
+    for line in lines:
+        match = INCLUDE_MARKER.match(line)
+        if match is None:
+            out.append(line)
+            continue
+        name = match.group(1)
+        if stack and stack[-1][0] == name:
+            _, outer, file_name = stack.pop()
+            modules[file_name] = "".join(out)
+            out = outer
+            out.append("#include " + name
+                       + ("\n" if line.endswith("\n") else ""))
+        else:
+            folder = os.path.dirname(stack[-1][2]) if stack else base
+            file_name = os.path.join(folder, module_file_name(name, False))
+            stack.append((name, out, file_name))
+            out = []
+    # an opening marker that never closed was not ours, put it back
+    while stack:
+        name, outer, _ = stack.pop()
+        outer.append("----#include " + name + "\n")
+        outer.extend(out)
+        out = outer
+    return "".join(out)
+
+
+def unbundle(script) -> tuple[str, dict]:
+    """
+    split a bundled script back into the script as it was written and the
+    files it pulled in. returns the script and {relative path: contents}
+    """
+    if "----#" not in script:
+        return script, {}
+    modules = {}
+    if script.startswith(PRELUDE) and ROOT_MARKER in script:
+        head, script = script.split(ROOT_MARKER, 1)
+        for match in MODULE_BLOCK.finditer(head):
+            file_name = module_file_name(match.group(1), True)
+            modules[file_name] = _collapse_includes(
+                match.group(2), modules, os.path.dirname(file_name)
+            )
+    return _collapse_includes(script, modules), modules
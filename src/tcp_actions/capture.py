@@ -0,0 +1,179 @@
+"""
+record every message crossing the wire to a rotating capture file, and play
+captures back, so slow or misbehaving reload cycles can be investigated and
+turned into repeatable fixtures.
+
+a capture file starts with MAGIC and holds one frame per message: a FRAME
+header (wall clock time, direction, messageID and payload length) followed
+by the payload exactly as it was sent or received
+"""
+
+import os
+import time
+import struct
+import threading
+
+MAGIC = b"TTSCAPTURE1\n"
+FRAME = struct.Struct("<dBBI")
+INBOUND = 0
+OUTBOUND = 1
+DIRECTIONS = {INBOUND: "in", OUTBOUND: "out"}
+# stored for messages whose messageID could not be read
+UNKNOWN_ID = 255
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+
+class CaptureLog:
+    """
+    appends frames to path from any thread. once the file grows past
+    max_bytes it is rotated to path.1 (and path.1 to path.2 and so on),
+    keeping at most backups old files
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES,
+                 backups=DEFAULT_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._open()
+
+    def append(self, direction, message_id, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not isinstance(message_id, int) or not 0 <= message_id < 255:
+            message_id = UNKNOWN_ID
+        header = FRAME.pack(time.time(), direction, message_id, len(data))
+        with self._lock:
+            if self._file is None:
+                return
+            if self._size + len(header) + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(header)
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(header) + len(data)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        self._file = open(self.path, mode="ab")
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write(MAGIC)
+            self._size = len(MAGIC)
+
+    def _rotate(self):
+        self._file.close()
+        for number in range(self.backups - 1, 0, -1):
+            older = self.path + "." + str(number)
+            if os.path.exists(older):
+                os.replace(older, self.path + "." + str(number + 1))
+        if self.backups > 0:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+def capture_files(path) -> list[str]:
+    """
+    the files of a rotated capture, oldest first
+    """
+    files = []
+    number = 1
+    while os.path.exists(path + "." + str(number)):
+        files.insert(0, path + "." + str(number))
+        number += 1
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_capture(path):
+    """
+    yield (timestamp, direction, message_id, data) for every frame in the
+    capture file at path. raises ValueError if it is not a capture file
+    """
+    with open(path, mode="rb") as capture:
+        if capture.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + " is not a capture file")
+        while True:
+            header = capture.read(FRAME.size)
+            if len(header) < FRAME.size:
+                return
+            timestamp, direction, message_id, length = FRAME.unpack(header)
+            data = capture.read(length)
+            if len(data) < length:
+                # the capture was cut off mid-frame
+                return
+            yield timestamp, direction, message_id, data
+
+
+def replay(frames, send, speed=1.0) -> dict:
+    """
+    hand every (timestamp, direction, message_id, data) frame to
+    send(message_id, data), which returns a list of output lines that is
+    empty on success. frames are spaced out as they were captured, sped up
+    by speed, or sent back to back if speed is 0
+    """
+    started = time.perf_counter()
+    first = None
+    count = 0
+    failed = 0
+    size = 0
+    for timestamp, _, message_id, data in frames:
+        if first is None:
+            first = timestamp
+        if speed > 0:
+            due = started + (timestamp - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if len(send(message_id, data)) > 0:
+            failed += 1
+        count += 1
+        size += len(data)
+    seconds = time.perf_counter() - started
+    return {
+        "count": count,
+        "failed": failed,
+        "bytes": size,
+        "seconds": seconds,
+        "per_second": count / seconds if seconds > 0 else 0.0,
+    }
+
+
+_capture = None
+
+
+def start_capture(path, max_bytes=DEFAULT_MAX_BYTES,
+                  backups=DEFAULT_BACKUPS) -> CaptureLog:
+    """
+    start capturing everything this process sends and receives to path
+    """
+    global _capture
+    stop_capture()
+    _capture = CaptureLog(path, max_bytes, backups)
+    return _capture
+
+
+def stop_capture():
+    global _capture
+    if _capture is not None:
+        _capture.close()
+        _capture = None
+
+
+def active_capture() -> CaptureLog | None:
+    """
+    the capture this process is recording to, if any
+    """
+    return _capture
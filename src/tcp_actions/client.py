@@ -0,0 +1,113 @@
+"""
+the client half of the daemon's control socket, and everything else a
+command line script needs before it knows whether a daemon will do its work.
+it imports neither asyncio nor the engine, so a script handing its work to a
+running daemon starts quickly, and only imports the engine when there is none
+"""
+
+import os
+import socket
+import tempfile
+# custom
+import tcp_actions.codec as Codec
+
+HOST = "localhost"
+# seconds a client waits on the daemon before giving up
+CLIENT_TIMEOUT = 60.0
+
+
+def default_socket_path() -> str:
+    """
+    the control socket's default location, one per user
+    """
+    user = str(os.getuid()) if hasattr(os, "getuid") else "user"
+    return os.path.join(tempfile.gettempdir(),
+                        "tts_devserver-" + user + ".sock")
+
+
+def daemon_request(request, socket_path=None,
+                   timeout=CLIENT_TIMEOUT) -> dict | None:
+    """
+    send a request (a dict with a "command" key) to the daemon and return
+    its response, or None if no daemon is listening. a daemon that dies or
+    times out part way answers {"ok": False, "error": ...}
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    if socket_path is None:
+        socket_path = default_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    control_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    control_socket.settimeout(timeout)
+    try:
+        control_socket.connect(socket_path)
+    except OSError:
+        control_socket.close()
+        return None
+    try:
+        control_socket.sendall(Codec.dumps(request) + b"\n")
+        with control_socket.makefile("rb") as response:
+            line = response.readline()
+        if not line:
+            return {"ok": False,
+                    "error": "the daemon closed the connection without "
+                             "answering"}
+        return Codec.loads(line)
+    except OSError as err:
+        return {"ok": False, "error": "daemon request failed: " + str(err)}
+    except ValueError as err:
+        return {"ok": False, "error": "bad answer from the daemon: "
+                                      + str(err)}
+    finally:
+        control_socket.close()
+
+
+def print_response(response) -> int:
+    """
+    print the response of a daemon request or an Engine operation, and
+    return the exit code to use
+    """
+    if response.get("output"):
+        print(response["output"], end="")
+    if not response.get("ok"):
+        print("Error: ", response.get("error"))
+        return 1
+    return 0
+
+
+def parse_target(text, host=HOST) -> tuple:
+    """
+    a TTS instance given as "host:port", or as just "port" on host. raises
+    ValueError if the port is not a number
+    """
+    name, _, port = text.strip().rpartition(":")
+    return (name or host, int(port))
+
+
+def parse_table(pairs) -> dict:
+    """
+    turn key=value strings into the table a custom message carries. pairs
+    without a value are left out
+    """
+    table = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        if value != "":
+            table[key] = value
+    return table
+
+
+def read_batch_items(stream) -> list[tuple]:
+    """
+    read (guid, code) pairs from a stream holding one json object per line,
+    for example {"guid": "67362e", "code": "return self.getName()"}
+    """
+    items = []
+    for line in stream:
+        line = line.strip()
+        if line == "":
+            continue
+        entry = Codec.loads(line)
+        items.append((str(entry["guid"]), entry["code"]))
+    return items
@@ -0,0 +1,82 @@
+"""
+the json codec every message, specfile, manifest and settings file goes
+through. orjson is used when it is installed, then ujson, and the standard
+library otherwise. every backend encodes straight to compact utf-8 bytes, so
+what goes on the wire is the same whichever one is in use.
+
+set TTS_DEVSERVER_JSON to one of the backend names to pick one by hand
+"""
+
+import os
+import json
+
+# preferred first
+PREFERENCE = ("orjson", "ujson", "json")
+ENVIRONMENT_VARIABLE = "TTS_DEVSERVER_JSON"
+
+
+def _stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _stdlib_loads(data):
+    return json.loads(data)
+
+
+def _load_backends() -> dict:
+    backends = {}
+    try:
+        import orjson
+        backends["orjson"] = (orjson.dumps, orjson.loads)
+    except ImportError:
+        pass
+    try:
+        import ujson
+
+        def ujson_dumps(obj) -> bytes:
+            return ujson.dumps(obj, ensure_ascii=False,
+                               escape_forward_slashes=False).encode("utf-8")
+
+        def ujson_loads(data):
+            if not isinstance(data, str):
+                data = bytes(data).decode("utf-8")
+            return ujson.loads(data)
+        backends["ujson"] = (ujson_dumps, ujson_loads)
+    except ImportError:
+        pass
+    backends["json"] = (_stdlib_dumps, _stdlib_loads)
+    return backends
+
+
+BACKENDS = _load_backends()
+backend = None
+dumps = None
+loads = None
+
+
+def use_backend(name):
+    """
+    encode and decode with the named backend from now on. raises ValueError
+    if it is not installed
+    """
+    global backend, dumps, loads
+    if name not in BACKENDS:
+        raise ValueError("json backend " + name + " is not available, "
+                         "pick one of " + ", ".join(BACKENDS))
+    backend = name
+    dumps, loads = BACKENDS[name]
+
+
+def _default_backend() -> str:
+    chosen = os.environ.get(ENVIRONMENT_VARIABLE)
+    if chosen in BACKENDS:
+        return chosen
+    if chosen:
+        print("Error: json backend ", chosen, " is not available")
+    for name in PREFERENCE:
+        if name in BACKENDS:
+            return name
+
+
+use_backend(_default_backend())
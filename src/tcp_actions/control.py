@@ -0,0 +1,90 @@
+"""
+a local control socket that lets thin clients hand their work to a running
+dev_server.py daemon instead of doing it all themselves. the client half is
+in tcp_actions.client, which does not import asyncio
+"""
+
+import os
+import socket
+import asyncio
+# custom
+import tcp_actions.codec as Codec
+from tcp_actions.client import daemon_request, default_socket_path
+
+
+class ControlServer:
+    """
+    serves newline-delimited json requests on a unix domain socket, one
+    response line per request. attach it to a ListenServer so both run on
+    the same loop and stop together. handler is a blocking function taking
+    the request dict and returning the response dict; it runs on a thread
+    """
+
+    def __init__(self, handler, socket_path=None):
+        if socket_path is None:
+            socket_path = default_socket_path()
+        self.handler = handler
+        self.socket_path = socket_path
+        self._server = None
+
+    async def start(self):
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("the control socket needs unix domain sockets, "
+                          "which this platform does not have")
+        if os.path.exists(self.socket_path):
+            # a live daemon answers, a stale socket file does not
+            response = await asyncio.to_thread(
+                daemon_request, {"command": "ping"}, self.socket_path, 1.0
+            )
+            if response is not None and response.get("ok"):
+                raise OSError("a daemon is already listening on "
+                              + self.socket_path)
+            os.unlink(self.socket_path)
+        control_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # created private, so no one else can connect even for a moment
+        old_umask = os.umask(0o177)
+        try:
+            control_socket.bind(self.socket_path)
+        except OSError:
+            control_socket.close()
+            raise
+        finally:
+            os.umask(old_umask)
+        self._server = await asyncio.start_unix_server(
+            self._service_client,
+            sock=control_socket
+        )
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    async def _service_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = Codec.loads(line)
+                except ValueError as err:
+                    response = {"ok": False, "error": str(err)}
+                else:
+                    if isinstance(request, dict):
+                        response = await asyncio.to_thread(self.handler,
+                                                           request)
+                    else:
+                        response = {"ok": False,
+                                    "error": "a request is a json object, "
+                                             "not " + type(request).__name__}
+                writer.write(Codec.dumps(response) + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
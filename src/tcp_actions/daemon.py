@@ -0,0 +1,95 @@
+"""
+the commands a resident dev_server.py daemon carries out for its clients,
+using the engine (and so the listen socket, sender and file caches) it keeps
+between requests
+"""
+
+# custom
+from tcp_actions.evaluate import DEFAULT_TIMEOUT
+
+
+class Daemon:
+    """
+    handles control socket requests by handing them to an Engine that is
+    listening. its push manifests stay in memory and are reconciled against
+    every dump TTS sends, so incremental pushes do not have to reload them
+    from disk, and execute requests can wait for their returned values
+    because the engine owns the listen socket. requests may name "targets"
+    to send to instead of the engine's, as a list of [host, port]
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.commands = {
+            "ping": self.ping,
+            "save_and_play": self.save_and_play,
+            "get_scripts": self.get_scripts,
+            "execute": self.execute,
+            "execute_batch": self.execute_batch,
+            "send_message": self.send_message,
+            "stats": self.stats,
+        }
+
+    def handle(self, request) -> dict:
+        """
+        carry out a single request and build its response. whatever goes
+        wrong, the client is answered with an error rather than left hanging
+        """
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "a request is a json object, not "
+                                          + type(request).__name__}
+        command = self.commands.get(request.get("command"))
+        if command is None:
+            return {"ok": False,
+                    "error": "unknown command " + str(request.get("command"))}
+        try:
+            return command(request)
+        except Exception as err:
+            # a well-formed request of the wrong shape, like a number where
+            # a list goes, fails anywhere in the engine
+            return {"ok": False, "error": repr(err)}
+
+    def ping(self, request) -> dict:
+        return {"ok": True}
+
+    def save_and_play(self, request) -> dict:
+        return self.engine.save_and_play(
+            request["specfile"],
+            incremental=request.get("incremental", False),
+            folder=request.get("folder"),
+            paths=request.get("paths"),
+            skip_empty=request.get("skip_empty", False),
+            include_path=request.get("include_path", ()),
+            minify=request.get("minify", False),
+            targets=request.get("targets")
+        )
+
+    def get_scripts(self, request) -> dict:
+        return self.engine.get_scripts(request.get("targets"))
+
+    def send_message(self, request) -> dict:
+        return self.engine.send_message(request["table"],
+                                        request.get("targets"))
+
+    def execute(self, request) -> dict:
+        return self.engine.execute(
+            request["guid"],
+            request["code"],
+            request.get("wait", False),
+            request.get("timeout", DEFAULT_TIMEOUT),
+            request.get("targets")
+        )
+
+    def execute_batch(self, request) -> dict:
+        return self.engine.execute_batch(
+            request["items"],
+            request.get("wait", True),
+            request.get("timeout", DEFAULT_TIMEOUT),
+            request.get("targets")
+        )
+
+    def stats(self, request) -> dict:
+        """
+        pass "reset": true to start counting afresh afterwards
+        """
+        return self.engine.stats(request.get("reset", False))
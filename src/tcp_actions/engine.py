@@ -0,0 +1,341 @@
+"""
+everything the dev server does, as one in-process api. the gui, every
+command line script and the daemon are thin frontends over an Engine, so
+they all push, ingest and evaluate code the same way, and headless machines
+get all of it without importing qt.
+
+operations return a dict with "ok", and "output" and "error" where there is
+something to say, which is also what the daemon answers its clients with.
+
+an engine can send to several TTS instances (a host and its test seats, say)
+at once. messages are encoded once and sent to every target in parallel, and
+"targets" in the result holds how each of them fared
+"""
+
+import os
+import threading
+# custom
+import tcp_actions.manifest as Manifest
+from tcp_actions.client import parse_target
+from tcp_actions.send import gather_changed_files
+from tcp_actions.batch import batch_messages, run_batch
+from tcp_actions.bundle import Bundler
+from tcp_actions.minify import Minifier
+from tcp_actions.render import render_html
+from tcp_actions.evaluate import DEFAULT_TIMEOUT, Evaluator
+from tcp_actions.sender import fan_out, sender_for
+from tcp_actions.stream_encode import check_files, iter_encode
+from tcp_actions.server import ListenServer
+from tcp_actions.messages import (
+    GameLoaded, GetScripts, SaveAndPlay, SendCustomMessage, ExecuteLua
+)
+from tcp_actions.metrics import default_metrics, format_stats
+from generate_specfile import generate_specfile_from_folder
+
+HOST = "localhost"
+# TTS listens here
+SEND_PORT = 39999
+# and sends to here
+LISTEN_PORT = 39998
+# comma separated targets to send to when none are given
+TARGETS_VARIABLE = "TTS_DEVSERVER_TARGETS"
+
+
+def _output(rd) -> str:
+    return "".join(str(entry) for entry in rd)
+
+
+def targets_from(targets=None, host=HOST, port=SEND_PORT) -> list[tuple]:
+    """
+    the (host, port) of every TTS instance to send to: targets if given,
+    else those listed in TTS_DEVSERVER_TARGETS, else just host:port
+    """
+    if targets:
+        return [(str(name), int(number)) for name, number in targets]
+    parsed = []
+    for text in os.environ.get(TARGETS_VARIABLE, "").split(","):
+        if not text.strip():
+            continue
+        try:
+            parsed.append(parse_target(text, host))
+        except ValueError:
+            print("Error: bad target ", text, " in ", TARGETS_VARIABLE)
+    return parsed if parsed else [(host, port)]
+
+
+def _aggregate(results) -> dict:
+    """
+    one response for messages sent to every target, from the output of the
+    sends to each. it is only ok if every target got everything
+    """
+    targets = {
+        name: {"ok": len(rd) == 0, "output": _output(rd)}
+        for name, rd in results.items()
+    }
+    if len(targets) == 1:
+        output = next(iter(targets.values()))["output"]
+    else:
+        output = "".join(
+            name + ": " + result["output"]
+            for name, result in targets.items() if result["output"]
+        )
+    return {
+        "ok": all(result["ok"] for result in targets.values()),
+        "output": output,
+        "targets": targets,
+    }
+
+
+class Engine:
+    """
+    keeps what is worth keeping between operations: the sender, a Bundler
+    per include path with its dependency graph, the minifier's memo, and the
+    manifest of every specfile pushed, which is reconciled against every
+    dump TTS sends while the engine is listening.
+
+    targets lists the (host, port) of every TTS instance to send to, see
+    targets_from(). the first is the one code is evaluated on when waiting
+    for its value, since return values do not say which call they answer.
+    the operations that send also take targets, to send elsewhere just once
+    """
+
+    def __init__(self, host=HOST, send_port=SEND_PORT,
+                 listen_port=LISTEN_PORT, targets=None):
+        self.host = host
+        self.send_port = send_port
+        self.listen_port = listen_port
+        self.targets = targets_from(targets, host, send_port)
+        self.senders = [sender_for(name, port) for name, port in self.targets]
+        self.sender = self.senders[0]
+        self.server = None
+        self.evaluator = None
+        self.manifests = {}
+        # include path -> the Bundler whose dependency graph it keeps warm
+        self.bundlers = {}
+        self.minifier = Minifier()
+        # guards manifests, only ever held briefly so that dumps coming in
+        # on the listen thread are not held up by a push
+        self._manifest_lock = threading.Lock()
+        # one push at a time, from gathering the files to saving its manifest
+        self._push_lock = threading.Lock()
+        # the scriptStates of the games loaded while a push was being sent
+        self._loads_during_push = None
+
+    def listen(self, folder=None, editor=None, on_output=None,
+               render=render_html, port=None) -> ListenServer:
+        """
+        create the listen server that saves dumps into folder and opens new
+        scripts with editor. it is not started, so services can be attached
+        to it first; start it with start_in_thread(). with several targets,
+        messages are tagged with the target, or the host, they came from
+        """
+        self.server = ListenServer(
+            self.host, self.listen_port if port is None else port,
+            folder, editor, on_output=on_output, render=render,
+            sources=self.targets
+        )
+        self.server.subscribe(GameLoaded, self._reconcile_manifests)
+        self.evaluator = Evaluator(self.server, self.sender)
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+
+    def save_and_play(self, specfile, incremental=False, folder=None,
+                      paths=None, skip_empty=False, include_path=(),
+                      minify=False, targets=None) -> dict:
+        """
+        push the scripts and ui of a specfile and reload the game.
+
+        folder       regenerate the specfile from this folder first
+        incremental  only send objects changed since the last push
+        paths        files already known to be the only ones changed
+        skip_empty   do not reload at all when nothing changed
+        include_path folders to look for #include and require() files in
+        minify       strip comments and whitespace from what is sent
+        """
+        if folder:
+            generate_specfile_from_folder(folder, specfile)
+        with self._push_lock:
+            with self._manifest_lock:
+                if incremental:
+                    # reconciling only ever drops whole objects, so a copy
+                    # of the top level is enough to read from unlocked
+                    manifest = dict(self._manifest(specfile))
+                else:
+                    manifest = {}
+                self._loads_during_push = []
+            try:
+                response, new_manifest = self._push(
+                    specfile, manifest, paths, skip_empty, include_path,
+                    minify, targets
+                )
+                if new_manifest is not None:
+                    self._swap_manifest(specfile, new_manifest)
+            finally:
+                with self._manifest_lock:
+                    self._loads_during_push = None
+        return response
+
+    def _push(self, specfile, manifest, paths, skip_empty, include_path,
+              minify, targets) -> tuple[dict, dict | None]:
+        """
+        gather and send what changed since manifest. returns the response
+        and the manifest to keep, None if the push failed
+        """
+        include_path = tuple(include_path)
+        if include_path not in self.bundlers:
+            self.bundlers[include_path] = Bundler(include_path)
+        definitions, new_manifest = gather_changed_files(
+            specfile,
+            manifest,
+            None if paths is None else set(paths),
+            self.bundlers[include_path]
+        )
+        if len(definitions) == 0 and skip_empty:
+            return {"ok": True, "sent": 0}, new_manifest
+        if minify:
+            definitions = self.minifier.apply(definitions, new_manifest)
+        try:
+            check_files(definitions)
+        except OSError as err:
+            return {"ok": False, "error": "cannot read " + str(err)}, None
+        response = self._send([SaveAndPlay(definitions)], targets)
+        if not response["ok"]:
+            # pushed incrementally, a target that missed this push would
+            # miss these changes for good
+            response["error"] = "the push did not reach TTS whole"
+            return response, None
+        response["output"] += _output(self.minifier.report())
+        response["sent"] = len(definitions)
+        return response, new_manifest
+
+    def _swap_manifest(self, specfile, new_manifest):
+        """
+        make new_manifest the one of specfile, reconciled against the games
+        loaded while it was being pushed, and save it
+        """
+        with self._manifest_lock:
+            for script_states in self._loads_during_push:
+                Manifest.reconcile_manifest(new_manifest, script_states)
+            self.manifests[specfile] = new_manifest
+            Manifest.save_manifest(
+                new_manifest, Manifest.manifest_path_for(specfile)
+            )
+
+    def track_manifest(self, specfile):
+        """
+        load the push manifest of specfile now, so that dumps received before
+        its first push are reconciled against it too
+        """
+        with self._manifest_lock:
+            self._manifest(specfile)
+
+    def get_scripts(self, targets=None) -> dict:
+        return self._send([GetScripts()], targets)
+
+    def send_message(self, table, targets=None) -> dict:
+        return self._send([SendCustomMessage(table)], targets)
+
+    def execute(self, guid, code, wait=False, timeout=DEFAULT_TIMEOUT,
+                targets=None) -> dict:
+        """
+        run code on the object with the given guid ("-1" for global). with
+        wait, block until the first target returns its value. that needs the
+        listen port, which is bound here if the engine is not listening yet
+        """
+        if not wait:
+            return self._send([ExecuteLua(guid, code)], targets)
+        try:
+            value = self._evaluator().evaluate(guid, code, timeout)
+        except Exception as err:
+            return {"ok": False, "error": str(err)}
+        return {"ok": True, "value": value}
+
+    def execute_batch(self, items, wait=True, timeout=DEFAULT_TIMEOUT,
+                      targets=None) -> dict:
+        """
+        run many (guid, code) snippets packed into as few messages as
+        possible. with wait, they run on the first target only and the
+        result holds one result per snippet
+        """
+        items = [(str(guid), code) for guid, code in items]
+        if not wait:
+            return self._send(batch_messages(items), targets)
+        try:
+            batch = run_batch(self._evaluator(), items, timeout)
+        except OSError as err:
+            return {"ok": False, "error": str(err)}
+        batch["ok"] = True
+        return batch
+
+    def stats(self, reset=False) -> dict:
+        """
+        the metrics recorded so far, both as data and as readable output.
+        with reset, start counting afresh afterwards
+        """
+        metrics = (self.server.metrics if self.server is not None
+                   else default_metrics())
+        snapshot = metrics.snapshot()
+        if reset:
+            metrics.reset()
+        return {
+            "ok": True,
+            "stats": snapshot,
+            "output": _output(format_stats(snapshot)),
+        }
+
+    def _send(self, messages, targets=None) -> dict:
+        """
+        encode each message once and send it to every target in parallel
+        """
+        senders = self.senders
+        if targets:
+            senders = [sender_for(name, port)
+                       for name, port in targets_from(targets)]
+        results = {}
+        for message in messages:
+            # pushes are streamed, so they are never held whole in memory
+            if isinstance(message, SaveAndPlay):
+                data = iter_encode(message)
+            else:
+                data = message.encode()
+            sent = fan_out(senders, data, message.MESSAGE_ID)
+            for name, rd in sent.items():
+                results.setdefault(name, []).extend(rd)
+        return _aggregate(results)
+
+    def _manifest(self, specfile) -> dict:
+        if specfile not in self.manifests:
+            self.manifests[specfile] = Manifest.load_manifest(
+                Manifest.manifest_path_for(specfile)
+            )
+        return self.manifests[specfile]
+
+    def _evaluator(self) -> Evaluator:
+        """
+        raises OSError if the listen port is taken, by a running
+        dev_server.py for example
+        """
+        if self.server is None:
+            try:
+                self.listen().start_in_thread()
+            except OSError:
+                self.server = None
+                self.evaluator = None
+                raise
+        return self.evaluator
+
+    def _reconcile_manifests(self, message):
+        with self._manifest_lock:
+            if self._loads_during_push is not None:
+                # the manifest of the push in flight is not in manifests yet
+                self._loads_during_push.append(message.script_states)
+            for specfile, manifest in self.manifests.items():
+                if Manifest.reconcile_manifest(
+                        manifest, message.script_states):
+                    Manifest.save_manifest(
+                        manifest,
+                        Manifest.manifest_path_for(specfile)
+                    )
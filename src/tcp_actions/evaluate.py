@@ -0,0 +1,182 @@
+"""
+send lua code to TTS and get back the value it returned, instead of only
+seeing it printed to the console
+"""
+
+import time
+import asyncio
+import threading
+import collections
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+# custom
+from tcp_actions.sender import sender_for
+from tcp_actions.server import ListenServer
+from tcp_actions.messages import ErrorMessage, ExecuteLua, ReturnValue
+
+DEFAULT_TIMEOUT = 10.0
+# stands in for nil, since TTS sends nothing back when code returns nothing
+NIL_SENTINEL = "__tts_devserver_nil__"
+WRAPPER = """local __devserver_return = (function()
+{code}
+end)()
+if __devserver_return == nil then return "{nil}" end
+return __devserver_return
+"""
+
+
+class EvaluationError(Exception):
+    """
+    TTS reported an error (messageID 3) while running evaluated code
+    """
+
+    def __init__(self, guid, prefix, message):
+        super().__init__(str(prefix) + " " + str(message))
+        self.guid = guid
+        self.prefix = prefix
+        self.message = message
+
+
+def wrap_code(code) -> str:
+    """
+    wrap code so that TTS always answers it with a returnValue (messageID 5)
+    """
+    return WRAPPER.format(code=code, nil=NIL_SENTINEL)
+
+
+class Evaluator:
+    """
+    correlates execute code requests (messageID 3) with their results.
+
+    TTS does not echo anything identifying a request back, but it runs
+    external code in the order it arrives and answers every wrapped snippet
+    with exactly one returnValue (messageID 5) or, if it raised, one error
+    (messageID 3) naming the guid it ran on. returnValues therefore resolve
+    the oldest outstanding request, and errors resolve the oldest outstanding
+    request for their guid.
+
+    a request that times out is forgotten; should its answer still arrive it
+    will be paired with the next request, so keep timeouts generous.
+    """
+
+    def __init__(self, server, sender):
+        self.server = server
+        self.sender = sender
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        server.subscribe(ReturnValue, self._on_return)
+        server.subscribe(ErrorMessage, self._on_error)
+
+    def submit(self, guid, code) -> Future:
+        """
+        send code to run on the object with the given guid (-1 for global)
+        and return a future resolved with its return value
+        """
+        future = Future()
+        request = (str(guid), future)
+        message = ExecuteLua(guid, wrap_code(code))
+        # register before sending, the answer can beat us back
+        with self._lock:
+            self._pending.append(request)
+        rd = self.sender.send_message(message)
+        if len(rd) > 0:
+            self._forget(request)
+            future.set_exception(ConnectionError("".join(map(str, rd))))
+        return future
+
+    def evaluate(self, guid, code, timeout=DEFAULT_TIMEOUT):
+        """
+        run code and block until its return value arrives. raises
+        EvaluationError if it failed in TTS, TimeoutError if no answer came
+        """
+        future = self.submit(guid, code)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self._forget((str(guid), future))
+            raise TimeoutError("no answer from TTS for guid " + str(guid))
+
+    async def evaluate_async(self, guid, code, timeout=DEFAULT_TIMEOUT):
+        """
+        like evaluate, for use from a coroutine
+        """
+        future = await asyncio.to_thread(self.submit, guid, code)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self._forget((str(guid), future))
+            raise TimeoutError("no answer from TTS for guid " + str(guid))
+
+    def evaluate_many(self, requests, timeout=DEFAULT_TIMEOUT) -> dict:
+        """
+        run every (guid, code) pair, keeping them all in flight at once, and
+        return their results along with throughput figures. each result is
+        the returned value or the exception it failed with
+        """
+        started = time.perf_counter()
+        futures = [self.submit(guid, code) for guid, code in requests]
+        results = []
+        for (guid, _), future in zip(requests, futures):
+            remaining = max(0.0, started + timeout - time.perf_counter())
+            try:
+                results.append(future.result(remaining))
+            except FutureTimeoutError:
+                self._forget((str(guid), future))
+                results.append(TimeoutError("no answer from TTS"))
+            except Exception as err:
+                results.append(err)
+        seconds = time.perf_counter() - started
+        return {
+            "results": results,
+            "count": len(results),
+            "failed": sum(isinstance(r, Exception) for r in results),
+            "seconds": seconds,
+            "per_second": len(results) / seconds if seconds > 0 else 0.0,
+        }
+
+    def _forget(self, request):
+        with self._lock:
+            try:
+                self._pending.remove(request)
+            except ValueError:
+                pass
+
+    async def _on_return(self, message):
+        with self._lock:
+            if len(self._pending) == 0:
+                return
+            _, future = self._pending.popleft()
+        value = message.return_value
+        if value == NIL_SENTINEL:
+            value = None
+        if not future.done():
+            future.set_result(value)
+
+    async def _on_error(self, message):
+        guid = str(message.guid)
+        with self._lock:
+            for request in self._pending:
+                if request[0] == guid:
+                    self._pending.remove(request)
+                    break
+            else:
+                # an error from something other than evaluated code
+                return
+        future = request[1]
+        if not future.done():
+            future.set_exception(EvaluationError(
+                guid,
+                message.prefix,
+                message.error
+            ))
+
+
+def start_evaluator(host, listen_port, send_port, folder=None) -> Evaluator:
+    """
+    start a listen server of its own on a background thread and return an
+    Evaluator using it. raises OSError if the listen port is already taken,
+    for example by a running dev_server.py
+    """
+    server = ListenServer(host, listen_port, folder)
+    server.start_in_thread()
+    return Evaluator(server, sender_for(host, send_port))
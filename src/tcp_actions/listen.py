@@ -1,54 +1,130 @@
 """
-functions to be used when spinning up a tcp listen socket to receive messages
-from TTS
+what the listen server does with the messages it receives from TTS, see
+tcp_actions.server for the server itself
 """
 
 import os
 import subprocess
-import json
-import socket
-import selectors
+import threading
+# custom
+from tcp_actions.bundle import unbundle
+from tcp_actions.render import render_html
+from tcp_actions.messages import NewObject, GameLoaded
+from tcp_actions.writer import default_writer
+from tcp_actions.manifest import index_path_for, load_manifest, save_manifest
 
+# how many bytes to pull off a connection per read. TTS dumps every script in
+# the save at once, so this is much larger than a typical socket read
+READ_SIZE = 262144
 
-def save_received_files(files, folder) -> list[str]:
+# download folder indexes, shared by every connection in this process
+_folder_indexes = {}
+_folder_indexes_lock = threading.Lock()
+
+
+def received_file_path(entry, kind, folder) -> str:
+    """
+    work out where a received script (kind "script") or xml (kind "ui")
+    should be stored
+    """
+    # make sure global guid is not stored
+    guid = ""
+    if entry["guid"] != "-1":
+        guid = entry["guid"] + "-"
+    name = guid + entry["name"]
+    name = name.replace(" ", "_") + (".lua" if kind == "script" else ".xml")
+    return os.path.join(os.path.abspath(folder), name)
+
+
+def module_file_path(name, folder) -> str | None:
     """
-    save a table of files/scripts/xml to the specified folder
+    where a file unbundled from a received script is stored, or None if its
+    name would lead outside of the folder
+    """
+    name = os.path.normpath(name)
+    if os.path.isabs(name) or name.split(os.sep)[0] == os.pardir:
+        return None
+    return os.path.join(os.path.abspath(folder), name)
+
+
+def folder_index(folder) -> dict:
+    """
+    the index of what was last written to the given download folder, loaded
+    from disk the first time it is needed
+    """
+    index_path = index_path_for(folder)
+    with _folder_indexes_lock:
+        if index_path not in _folder_indexes:
+            _folder_indexes[index_path] = load_manifest(index_path)
+        return _folder_indexes[index_path]
+
+
+def save_received_files(files, folder, writer=None, totals=None,
+                        save_index=True) -> list[str]:
+    """
+    save a table of files/scripts/xml to the specified folder. the writes are
+    batched across the writer's thread pool. files the folder's index shows
+    we already wrote are not rewritten, and neither are local edits made to
+    them since. bundled scripts are split back into the script as written
+    and the files it included or required, which are saved alongside it.
+
+    totals, if given, is a dict whose "written", "unchanged", "kept" and
+    "failed" counts are increased by this call. without save_index, the
+    folder's index is only updated in memory, for saving a dump that arrives
+    in chunks and persisting the index once it is all written
     """
     rd = []  # return data
+    if folder is None:
+        return ["\tNo script folder set, not saving received scripts.\n"]
+    to_write = []
+    modules = {}
     for entry in files:
-        if "script" in entry:
-            # make sure global guid is not stored
-            guid = ""
-            if entry["guid"] != "-1":
-                guid = entry["guid"] + "-"
-            script = guid + entry["name"]
-            script = script.replace(" ", "_") + ".lua"
-            abs_path = os.path.abspath(folder)
-            final_path = os.path.join(abs_path, script)
-            rd.extend(["\tWriting script to: ", final_path, "\n"])
-            try:
-                with open(final_path, mode="w", encoding="utf-8") as new_file:
-                    new_file.write(entry["script"])
-            except OSError as err:
-                print("Error saving / opening: ", err,
-                      "| with file", script, "at", folder)
-
-        if "ui" in entry:
-            # make sure global guid is not stored
-            guid = ""
-            if entry["guid"] != "-1":
-                guid = entry["guid"] + "-"
-            xml = guid + entry["name"]
-            xml = xml.replace(" ", "_") + ".xml"
-            abs_path = os.path.abspath(folder)
-            final_path = os.path.join(abs_path, xml)
+        for kind in ("script", "ui"):
+            if kind not in entry:
+                continue
+            contents = entry[kind]
+            if kind == "script":
+                contents, found = unbundle(contents)
+                modules.update(found)
+            to_write.append((
+                received_file_path(entry, kind, folder),
+                contents
+            ))
+    for name, contents in modules.items():
+        module_path = module_file_path(name, folder)
+        if module_path is None:
+            print("Error saving / opening: not saving", name,
+                  "outside of", folder)
+            continue
+        try:
+            os.makedirs(os.path.dirname(module_path), exist_ok=True)
+        except OSError as err:
+            print("Error saving / opening: ", err, "| with file", module_path)
+            continue
+        to_write.append((module_path, contents))
+    if len(to_write) == 0:
+        return rd
+    if writer is None:
+        writer = default_writer()
+    index = folder_index(folder)
+    for batch in writer.write(to_write, index):
+        for final_path in batch["written"]:
             rd.extend(["\tWriting script to: ", final_path, "\n"])
-            try:
-                with open(final_path, mode="w", encoding="utf-8") as new_file:
-                    new_file.write(entry["ui"])
-            except OSError as err:
-                print("Error saving / opening: ", err,
-                      "| with file", xml, "at", folder)
+        for final_path in batch["kept"]:
+            rd.extend(["\tKeeping local edits to: ", final_path, "\n"])
+        for final_path, err in batch["failed"]:
+            print("Error saving / opening: ", err,
+                  "| with file", final_path, "at", folder)
+        rd.extend([
+            "\tBatch of ", len(batch["written"]) + len(batch["unchanged"])
+            + len(batch["kept"]) + len(batch["failed"]), " files in ",
+            round(batch["seconds"] * 1000, 1), " ms\n"
+        ])
+        if totals is not None:
+            for count in ("written", "unchanged", "kept", "failed"):
+                totals[count] = totals.get(count, 0) + len(batch[count])
+    if save_index:
+        save_manifest(index, index_path_for(folder))
     return rd
 
 
@@ -58,6 +134,8 @@ def save_and_open_received_file(file, folder, script, editor_cmd) -> list[str]:
     in an editor using the provided editor_cmd
     """
     rd = []  # return data
+    if folder is None:
+        return ["\tNo script folder set, not saving received script.\n"]
     # process a new filename
     file = file.replace(" ", "_") + ".lua"
     abs_path = os.path.abspath(folder)
@@ -79,132 +157,65 @@ def save_and_open_received_file(file, folder, script, editor_cmd) -> list[str]:
     return rd
 
 
-def terminate_socket(sock, selector):
-    """
-    gracefully spin down the tcp socket and its connection
-    """
-    print("\nSpinning down server.")
+def _open_new_scripts(message, folder, editor, written, unwritten,
+                      totals) -> list[str]:
+    rd = []  # return data
+    for entry in message.script_states:
+        # make sure global guid is not stored
+        guid = ""
+        if entry["guid"] != -1:
+            guid = entry["guid"]
+        rd.extend(save_and_open_received_file(
+            guid + "-" + entry["name"],
+            folder,
+            entry["script"],
+            editor
+        ))
+    return rd
 
-    # catch exceptions and close socket anyway
-    if sock:
-        try:
-            sock.shutdown(socket.SHUT_RDWR)
-        except socket.error as err:
-            print("Socket shutdown error: ", err)
-        finally:
-            sock.close()
 
-    selector.close()
+def _save_loaded_scripts(message, folder, editor, written, unwritten,
+                         totals) -> list[str]:
+    if written is None:
+        written = []
+        unwritten = message.script_states
+    if totals is None:
+        totals = {}
+    rd = list(written)  # return data
+    rd.extend(save_received_files(unwritten, folder, totals=totals,
+                                  save_index=False))
+    if folder is not None:
+        save_manifest(folder_index(folder), index_path_for(folder))
+    rd.extend([
+        totals.get("written", 0), " written, ",
+        totals.get("unchanged", 0), " unchanged"
+    ])
+    if totals.get("kept", 0) > 0:
+        rd.extend([", ", totals["kept"], " local edits kept"])
+    rd.append("\n")
+    return rd
 
 
-def accept_wrapper(incoming_socket, selector):
-    """
-    accept incoming connections, make sure they do not block the server,
-    and register them with the selector
-    """
-    connection, address = incoming_socket.accept()
-    connection.setblocking(False)
-    data = {
-        "address": address,
-        "inbound": b"",
-    }
-    # set a mask showing if connection is ready to be read
-    connection_events = selectors.EVENT_READ
-    selector.register(connection, connection_events, data=data)
-
-
-def service_connection(key, mask, folder, editor, selector) -> list[str]:
+# message class -> what to do with it besides showing it
+HANDLERS = {
+    NewObject: _open_new_scripts,
+    GameLoaded: _save_loaded_scripts,
+}
+
+
+def handle_message(message, folder, editor, written=None, unwritten=None,
+                   totals=None, render=render_html) -> str:
     """
-    service an incoming connection request from TTS
+    act upon a fully received, typed message from TTS and return its output
+    as rendered by render.
+
+    scripts from a GameLoaded dump that were already saved while the message
+    was still arriving are passed in as the output they produced (written),
+    along with the entries that still need saving (unwritten) and the counts
+    accumulated so far (totals)
     """
-    # the connection socket stored in our selector key
-    connection = key.fileobj
-    data = key.data
-    if mask & selectors.EVENT_READ:
-        received_data = connection.recv(4096)
-        if received_data:
-            data["inbound"] += received_data
-            return []
-        # we are ready to act upon this request as all its data is received
-        rd = ["<pre>"]  # return data
-        parsed_data = json.loads(data["inbound"])
-        message_id = parsed_data["messageID"]
-        match message_id:
-            case 0:
-                rd.append("<font color='#9999FF'>")
-                for entry in parsed_data["scriptStates"]:
-                    rd.extend([
-                        "Created script for ->",
-                        entry["name"],
-                        "(guid:)",
-                        entry["guid"],
-                        "\n"
-                    ])
-                    # make sure global guid is not stored
-                    guid = ""
-                    if entry["guid"] != -1:
-                        guid = entry["guid"]
-                    rd.extend(save_and_open_received_file(
-                        guid + "-" + entry["name"],
-                        folder,
-                        entry["script"],
-                        editor
-                    ))
-            case 1:
-                rd.append("<font color='#99FF99'>")
-                rd.append("New object and script data received:\n")
-                iterator = 0
-                for entry in parsed_data["scriptStates"]:
-                    rd.extend([iterator, "->\t", entry["name"], "\n"])
-                    rd.extend(["\t", entry["guid"], "\n"])
-                    rd.append("---------------------------------------\n")
-                    iterator += 1
-                rd.append("Writing received scripts to project folder.\n")
-                rd.extend(save_received_files(
-                    parsed_data["scriptStates"],
-                    folder
-                ))
-            case 2:
-                rd.extend([parsed_data["message"], "\n"])
-            case 3:
-                rd.extend([
-                    "<font color='#FF0000'>",
-                    parsed_data["errorMessagePrefix"],
-                    "-> guid:",
-                    parsed_data["guid"],
-                    "\n"
-                ])
-                rd.extend(["\t", parsed_data["error"], "\n"])
-            case 4:
-                rd.append("<font color='#0099FF'>")
-                rd.append("Received custom message from TTS:")
-                rd.extend(["\t", parsed_data["customMessage"], "\n"])
-            case 5:
-                rd.extend([
-                    "<font color='#00FFFF'>",
-                    "External code returned value:\n\t",
-                    parsed_data["returnValue"],
-                    "\n"
-                ])
-            case 6:
-                rd.extend([
-                    "<font color='#00FF00'>",
-                    "Game saved to ",
-                    parsed_data["savePath"],
-                    "\n"
-                ])
-            case 7:
-                rd.extend([
-                    "<font color='#FFFF00'>",
-                    "Object created ->",
-                    parsed_data["guid"],
-                    "\n"
-                ])
-            case _:
-                rd.append("<font color='#FF0000'>")
-                rd.append("Unrecognized messageID")
-        selector.unregister(connection)
-        connection.close()
-        rd.append("</pre>")
-        return rd
-    return []
+    handler = HANDLERS.get(type(message))
+    if handler is None:
+        return render(message)
+    notes = handler(message, folder, editor, written, unwritten, totals)
+    return render(message, "".join(str(entry) for entry in notes))
@@ -0,0 +1,136 @@
+"""
+content-hash manifests of the scripts and xml files last pushed to TTS, used
+to work out which objects actually need to be sent on the next save and play,
+and of the files last written to the download folder
+"""
+
+import os
+import hashlib
+# custom
+import tcp_actions.codec as Codec
+from tcp_actions.stream_encode import FileContents
+
+MANIFEST_SUFFIX = ".manifest"
+# kept inside the download folder
+INDEX_FILENAME = ".tts_devserver_index.json"
+FILE_KINDS = ("script", "ui")
+
+
+def manifest_path_for(specfile) -> str:
+    """
+    the manifest is kept right next to the specfile it describes
+    """
+    return specfile + MANIFEST_SUFFIX
+
+
+def index_path_for(folder) -> str:
+    """
+    the download folder's index lives inside the folder itself
+    """
+    return os.path.join(os.path.abspath(folder), INDEX_FILENAME)
+
+
+def hash_contents(contents) -> str:
+    """
+    hash the contents of a script or xml file
+    """
+    if isinstance(contents, str):
+        contents = contents.encode("utf-8")
+    return hashlib.blake2b(contents, digest_size=16).hexdigest()
+
+
+def hash_file(path) -> str:
+    """
+    hash_contents of a text file, read a chunk at a time
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for text in FileContents(path).chunks():
+        digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_manifest(path) -> dict:
+    """
+    load a previously saved manifest, returning an empty one (which forces a
+    full push) if it is missing or unreadable
+    """
+    try:
+        with open(path, mode="rb") as manifest_file:
+            manifest = Codec.loads(manifest_file.read())
+            if isinstance(manifest, dict):
+                return manifest
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def save_manifest(manifest, path):
+    """
+    persist the manifest so the next push can diff against it. it is written
+    to a temporary file first so a crash never leaves half a manifest behind
+    """
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, mode="wb") as manifest_file:
+            manifest_file.write(Codec.dumps(manifest))
+        os.replace(temp_path, path)
+    except OSError as err:
+        print("Error saving manifest: ", err)
+
+
+def check_file(record, path) -> tuple[bool, dict]:
+    """
+    compare the file at path against its manifest record.
+
+    the mtime and size are checked first so that untouched files are never
+    read; a file is only hashed if its stat changed, which also catches files
+    that were touched but saved with identical contents. it is hashed a
+    chunk at a time, so a big file is never held whole.
+
+    return (changed, new_record)
+    """
+    stat = os.stat(path)
+    if (record is not None
+            and record.get("path") == path
+            and record.get("mtime") == stat.st_mtime_ns
+            and record.get("size") == stat.st_size):
+        return False, record
+    new_record = {
+        "path": path,
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": hash_file(path),
+    }
+    changed = record is None or record.get("hash") != new_record["hash"]
+    return changed, new_record
+
+
+def reconcile_manifest(manifest, script_states) -> int:
+    """
+    drop every record that no longer matches the scripts TTS reports having
+    loaded (messageID 1), so those objects are pushed in full next time. this
+    is what keeps a diff push safe after a different save is loaded or a
+    script is edited in-game.
+
+    return the number of objects that were invalidated
+    """
+    reported = {}
+    for entry in script_states:
+        reported[str(entry["guid"])] = entry
+    invalidated = 0
+    for guid in list(manifest.keys()):
+        entry = reported.get(guid)
+        records = manifest[guid]
+        in_sync = entry is not None
+        for kind in FILE_KINDS:
+            if not in_sync:
+                break
+            if kind in records:
+                # a minified push leaves TTS holding something else again
+                sent = records[kind].get("sent", records[kind]["hash"])
+                in_sync = (kind in entry
+                           and sent == hash_contents(entry[kind]))
+        if not in_sync:
+            del manifest[guid]
+            invalidated += 1
+    return invalidated
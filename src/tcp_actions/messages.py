@@ -0,0 +1,231 @@
+"""
+typed versions of every message of the TTS external editor protocol: the
+eight TTS sends to the dev server (inbound) and the four the dev server sends
+to TTS (outbound). each is a slotted dataclass carrying only its own fields,
+registered by messageID so a decoded message can be turned into its class
+with a single lookup.
+
+scriptStates entries are kept as the dicts they were decoded into, since
+they go straight to the file writer and back onto the wire unchanged
+"""
+
+from typing import ClassVar
+from dataclasses import dataclass
+# custom
+import tcp_actions.codec as Codec
+
+# messageID -> class, for messages from TTS
+INBOUND = {}
+# messageID -> class, for messages to TTS
+OUTBOUND = {}
+
+
+class Message:
+    """
+    KEYS lists the json key of every field, in field order. source is only
+    set on messages a listen server tagged with the TTS instance they came
+    from, see tag()
+    """
+    __slots__ = ("_source",)
+    MESSAGE_ID: ClassVar[int] = None
+    KEYS: ClassVar[tuple] = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        raises KeyError if a field is missing
+        """
+        return cls(*[data[key] for key in cls.KEYS])
+
+    def to_dict(self) -> dict:
+        data = {"messageID": self.MESSAGE_ID}
+        for key, field in zip(self.KEYS, self.__slots__):
+            data[key] = getattr(self, field)
+        return data
+
+    def encode(self) -> bytes:
+        return Codec.dumps(self.to_dict())
+
+    def tag(self, source):
+        """
+        record where the message came from: the "host:port" of a target, or
+        a host with several of them
+        """
+        self._source = source
+        return self
+
+    @property
+    def source(self) -> str | None:
+        return getattr(self, "_source", None)
+
+
+def _inbound(cls):
+    INBOUND[cls.MESSAGE_ID] = cls
+    return cls
+
+
+def _outbound(cls):
+    OUTBOUND[cls.MESSAGE_ID] = cls
+    return cls
+
+
+# from TTS
+
+
+@_inbound
+@dataclass(slots=True)
+class NewObject(Message):
+    """
+    the scripting editor was opened on an object without a script
+    """
+    MESSAGE_ID: ClassVar[int] = 0
+    KEYS: ClassVar[tuple] = ("scriptStates",)
+    script_states: list
+
+
+@_inbound
+@dataclass(slots=True)
+class GameLoaded(Message):
+    """
+    a game was loaded, or saved and played, and every script sent along
+    """
+    MESSAGE_ID: ClassVar[int] = 1
+    KEYS: ClassVar[tuple] = ("scriptStates",)
+    script_states: list
+
+
+@_inbound
+@dataclass(slots=True)
+class PrintMessage(Message):
+    MESSAGE_ID: ClassVar[int] = 2
+    KEYS: ClassVar[tuple] = ("message",)
+    message: str
+
+
+@_inbound
+@dataclass(slots=True)
+class ErrorMessage(Message):
+    MESSAGE_ID: ClassVar[int] = 3
+    KEYS: ClassVar[tuple] = ("error", "guid", "errorMessagePrefix")
+    error: str
+    guid: str
+    prefix: str
+
+
+@_inbound
+@dataclass(slots=True)
+class CustomMessage(Message):
+    """
+    a table a script sent with sendExternalMessage()
+    """
+    MESSAGE_ID: ClassVar[int] = 4
+    KEYS: ClassVar[tuple] = ("customMessage",)
+    custom_message: object
+
+
+@_inbound
+@dataclass(slots=True)
+class ReturnValue(Message):
+    """
+    what code sent with ExecuteLua returned
+    """
+    MESSAGE_ID: ClassVar[int] = 5
+    KEYS: ClassVar[tuple] = ("returnValue",)
+    return_value: object
+
+
+@_inbound
+@dataclass(slots=True)
+class GameSaved(Message):
+    MESSAGE_ID: ClassVar[int] = 6
+    KEYS: ClassVar[tuple] = ("savePath",)
+    save_path: str
+
+
+@_inbound
+@dataclass(slots=True)
+class ObjectCreated(Message):
+    MESSAGE_ID: ClassVar[int] = 7
+    KEYS: ClassVar[tuple] = ("guid",)
+    guid: str
+
+
+@dataclass(slots=True)
+class UnknownMessage(Message):
+    """
+    a message with a messageID we do not know, kept whole
+    """
+    message_id: object
+    data: dict
+
+    def to_dict(self) -> dict:
+        return self.data
+
+
+@dataclass(slots=True)
+class MalformedMessage(Message):
+    """
+    stands in for a message from TTS that could not be decoded, so it can
+    be shown like any other
+    """
+    KEYS: ClassVar[tuple] = ("error",)
+    error: str
+
+
+# to TTS
+
+
+@_outbound
+@dataclass(slots=True)
+class GetScripts(Message):
+    MESSAGE_ID: ClassVar[int] = 0
+
+
+@_outbound
+@dataclass(slots=True)
+class SaveAndPlay(Message):
+    """
+    replace the scripts of the given objects, then save and reload. entries
+    may hold FileContents from tcp_actions.stream_encode, which only
+    iter_encode() can encode
+    """
+    MESSAGE_ID: ClassVar[int] = 1
+    KEYS: ClassVar[tuple] = ("scriptStates",)
+    script_states: list
+
+
+@_outbound
+@dataclass(slots=True)
+class SendCustomMessage(Message):
+    """
+    a table for onExternalMessage()
+    """
+    MESSAGE_ID: ClassVar[int] = 2
+    KEYS: ClassVar[tuple] = ("customMessage",)
+    custom_message: object
+
+
+@_outbound
+@dataclass(slots=True)
+class ExecuteLua(Message):
+    """
+    run script on the object with the given guid, "-1" being global
+    """
+    MESSAGE_ID: ClassVar[int] = 3
+    KEYS: ClassVar[tuple] = ("guid", "script")
+    guid: str
+    script: str
+
+
+def parse_message(data, registry=INBOUND) -> Message:
+    """
+    the typed message for a decoded json message. raises ValueError if it
+    is not a json object and KeyError if a field is missing
+    """
+    if not isinstance(data, dict):
+        raise ValueError("expected a json object")
+    message_id = data.get("messageID")
+    cls = registry.get(message_id) if isinstance(message_id, int) else None
+    if cls is None:
+        return UnknownMessage(message_id, data)
+    return cls.from_dict(data)
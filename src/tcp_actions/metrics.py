@@ -0,0 +1,146 @@
+"""
+counters and timing histograms for the dev server, broken down by messageID,
+so a slow save and reload can be traced to the stage it spends its time in
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# upper bounds, in seconds, of the histogram buckets. anything slower lands
+# in a final overflow bucket
+BUCKET_BOUNDS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    """
+    a running count, total, min and max, plus counts per duration bucket
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {
+                bound: count for bound, count in zip(
+                    [str(bound) for bound in BUCKET_BOUNDS] + ["inf"],
+                    self.buckets
+                )
+            },
+        }
+
+
+class Metrics:
+    """
+    a thread safe registry of counters and histograms. every figure is
+    recorded under a name and a messageID (None for figures that belong to
+    no particular message)
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, message_id=None, amount=1):
+        with self._lock:
+            key = (name, message_id)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, message_id=None):
+        with self._lock:
+            key = (name, message_id)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = Histogram()
+                self._histograms[key] = histogram
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, message_id=None):
+        """
+        observe how long the body of a with statement took
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, message_id)
+
+    def snapshot(self) -> dict:
+        """
+        every figure recorded so far, as json ready dicts keyed by name and
+        then by messageID
+        """
+        with self._lock:
+            counters = {}
+            for (name, message_id), value in self._counters.items():
+                counters.setdefault(name, {})[str(message_id)] = value
+            histograms = {}
+            for (name, message_id), histogram in self._histograms.items():
+                histograms.setdefault(name, {})[str(message_id)] = (
+                    histogram.snapshot()
+                )
+        return {
+            "uptime": time.time() - self.started,
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def format_stats(snapshot) -> list[str]:
+    """
+    turn a snapshot into readable lines, in the same output list form the
+    rest of tcp_actions prints
+    """
+    rd = ["Stats over ", round(snapshot["uptime"], 1), " seconds\n"]
+    for name, by_message in sorted(snapshot["counters"].items()):
+        for message_id, value in sorted(by_message.items()):
+            rd.extend(["  ", name, " [", message_id, "]: ", value, "\n"])
+    for name, by_message in sorted(snapshot["histograms"].items()):
+        for message_id, stats in sorted(by_message.items()):
+            rd.extend([
+                "  ", name, " [", message_id, "]: ",
+                stats["count"], " x, ",
+                round(stats["mean"] * 1000, 2), " ms mean, ",
+                round(stats["max"] * 1000, 2), " ms max, ",
+                round(stats["total"] * 1000, 2), " ms total\n"
+            ])
+    return rd
+
+
+_metrics = Metrics()
+
+
+def default_metrics() -> Metrics:
+    """
+    the registry shared by everything in this process
+    """
+    return _metrics
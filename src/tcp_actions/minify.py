@@ -0,0 +1,186 @@
+"""
+optional minification of the lua and xml pushed to TTS, to cut the size of
+big save and play messages: comments and indentation are stripped and
+whitespace collapsed, while strings, CDATA and the marker comments of
+bundled scripts are left exactly as they are
+"""
+
+import re
+from collections import OrderedDict
+# custom
+from tcp_actions.manifest import hash_contents
+from tcp_actions.stream_encode import FileContents
+
+LUA_TOKEN = re.compile(r"""
+    (?P<marker>----\#[^\n]*)
+  | (?P<comment>--(?:\[(?P<level>=*)\[.*?\](?P=level)\]|[^\n]*))
+  | (?P<longstring>\[(?P<strlevel>=*)\[.*?\](?P=strlevel)\])
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<space>\s+)
+  | (?P<number>0[xX][0-9a-fA-F.]+(?:[pP][+-]?\d+)?
+              |\d+\.?\d*(?:[eE][+-]?\d+)?
+              |\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<symbol>\.\.\.|\.\.|==|~=|<=|>=|::|//|<<|>>|[^\s\w])
+""", re.VERBOSE | re.DOTALL)
+# symbol pairs that would read as a different token if written together
+COMBINING = {"--", "..", "==", "<=", ">=", "~=", "//", "::", "<<", ">>",
+             "[[", "[="}
+XML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+XML_CDATA = re.compile(r"(<!\[CDATA\[.*?\]\]>)", re.DOTALL)
+# indentation between tags. a run of whitespace without a line break, as in
+# <b>big</b> <i>world</i>, is text that shows and is kept
+XML_BETWEEN_TAGS = re.compile(r">[ \t\r]*\n\s*<")
+# how many minified files are remembered, least recently used dropped first
+MINIFY_CACHE_SIZE = 256
+
+
+class MinifyError(ValueError):
+    """
+    the source could not be tokenized, and is sent as it is instead
+    """
+
+
+def _needs_space(previous, previous_kind, token) -> bool:
+    before = previous[-1]
+    after = token[0]
+    if (before.isalnum() or before == "_") and (after.isalnum()
+                                                or after == "_"):
+        return True
+    # 1 .. 2 must not become the malformed number 1..2
+    if previous_kind == "number" and after == ".":
+        return True
+    return before + after in COMBINING
+
+
+def minify_lua(source) -> str:
+    """
+    strip comments, indentation and blank lines, and drop every space lua
+    does not need. line breaks between statements are kept
+    """
+    out = []
+    previous = None
+    previous_kind = None
+    pending_newline = False
+    position = 0
+    length = len(source)
+    while position < length:
+        match = LUA_TOKEN.match(source, position)
+        if match is None:
+            raise MinifyError("cannot tokenize lua at offset "
+                              + str(position))
+        position = match.end()
+        kind = match.lastgroup
+        if kind in ("level", "strlevel"):
+            kind = "comment" if match.group("comment") else "longstring"
+        token = match.group(0)
+        if kind == "space" or kind == "comment":
+            if "\n" in token:
+                pending_newline = True
+            continue
+        if kind == "marker":
+            # bundle markers have to stay on lines of their own
+            if out:
+                out.append("\n")
+            out.append(token)
+            previous = None
+            pending_newline = True
+            continue
+        if previous is not None or pending_newline:
+            if pending_newline and out:
+                out.append("\n")
+            elif previous is not None and _needs_space(previous,
+                                                       previous_kind, token):
+                out.append(" ")
+        pending_newline = False
+        out.append(token)
+        previous = token
+        previous_kind = kind
+    if out:
+        out.append("\n")
+    return "".join(out)
+
+
+def minify_xml(source) -> str:
+    """
+    strip comments and the line breaks and indentation between tags,
+    leaving CDATA alone
+    """
+    parts = XML_CDATA.split(source)
+    for index in range(0, len(parts), 2):
+        part = XML_COMMENT.sub("", parts[index])
+        parts[index] = XML_BETWEEN_TAGS.sub("><", part)
+    return "".join(parts).strip()
+
+
+class Minifier:
+    """
+    minifies definitions before they are sent, remembering the result for
+    the last few file hashes so an unchanged file is not minified twice, and
+    keeping count of the sizes before and after
+    """
+
+    def __init__(self):
+        # (kind, hash) -> minified contents
+        self._memo = OrderedDict()
+        self.before = 0
+        self.after = 0
+
+    def minify(self, kind, contents) -> str:
+        key = (kind, hash_contents(contents))
+        minified = self._memo.get(key)
+        if minified is None:
+            try:
+                if kind == "script":
+                    minified = minify_lua(contents)
+                else:
+                    minified = minify_xml(contents)
+            except MinifyError as err:
+                print("Error minifying, sending as is: ", err)
+                minified = contents
+            self._memo[key] = minified
+            while len(self._memo) > MINIFY_CACHE_SIZE:
+                self._memo.popitem(last=False)
+        else:
+            self._memo.move_to_end(key)
+        self.before += len(contents.encode("utf-8"))
+        self.after += len(minified.encode("utf-8"))
+        return minified
+
+    def apply(self, definitions, manifest=None) -> list[dict]:
+        """
+        return minified copies of definitions. records in manifest for the
+        objects sent also note the hash of what TTS will really hold, so
+        that reconcile_manifest does not take minified scripts for changes
+        """
+        minified_definitions = []
+        for definition in definitions:
+            minified_definition = dict(definition)
+            records = (manifest or {}).get(str(definition["guid"]), {})
+            for kind in ("script", "ui"):
+                if kind not in definition:
+                    continue
+                contents = definition[kind]
+                if isinstance(contents, FileContents):
+                    contents = contents.read()
+                minified = self.minify(kind, contents)
+                minified_definition[kind] = minified
+                if kind in records:
+                    records[kind]["sent"] = hash_contents(minified)
+            minified_definitions.append(minified_definition)
+        return minified_definitions
+
+    def report(self) -> list[str]:
+        """
+        the sizes of everything minified since the last report
+        """
+        before, after = self.before, self.after
+        self.before = 0
+        self.after = 0
+        if before == 0:
+            return []
+        return [
+            "Minified ", round(before / 1024, 1), " KiB to ",
+            round(after / 1024, 1), " KiB (",
+            round(100 * after / before, 1), "%)\n"
+        ]
@@ -0,0 +1,130 @@
+"""
+turn typed messages from TTS into console output. parsing and acting upon a
+message never formats anything; a renderer is picked once by whoever shows
+the output: plain text for a terminal, html for the gui console, or one json
+object per line for other tools.
+
+notes is the output of acting upon the message (like the files a dump was
+written to), which is shown along with it. messages tagged with the
+TTS instance they came from are prefixed with it
+"""
+
+import html
+# custom
+import tcp_actions.codec as Codec
+from tcp_actions.messages import (
+    NewObject, GameLoaded, PrintMessage, ErrorMessage, CustomMessage,
+    ReturnValue, GameSaved, ObjectCreated, UnknownMessage, MalformedMessage
+)
+
+RULE = "---------------------------------------\n"
+
+
+def _new_object(message) -> str:
+    return "".join([
+        "Created script for ->" + str(entry["name"])
+        + "(guid:)" + str(entry["guid"]) + "\n"
+        for entry in message.script_states
+    ])
+
+
+def _game_loaded(message) -> str:
+    lines = ["New object and script data received:\n"]
+    for index, entry in enumerate(message.script_states):
+        lines.append(str(index) + "->\t" + str(entry["name"]) + "\n\t"
+                     + str(entry["guid"]) + "\n" + RULE)
+    lines.append("Writing received scripts to project folder.\n")
+    return "".join(lines)
+
+
+def _print_message(message) -> str:
+    return str(message.message) + "\n"
+
+
+def _error_message(message) -> str:
+    return (str(message.prefix) + "-> guid:" + str(message.guid) + "\n\t"
+            + str(message.error) + "\n")
+
+
+def _custom_message(message) -> str:
+    return ("Received custom message from TTS:\t"
+            + str(message.custom_message) + "\n")
+
+
+def _return_value(message) -> str:
+    return ("External code returned value:\n\t" + str(message.return_value)
+            + "\n")
+
+
+def _game_saved(message) -> str:
+    return "Game saved to " + str(message.save_path) + "\n"
+
+
+def _object_created(message) -> str:
+    return "Object created ->" + str(message.guid) + "\n"
+
+
+def _unknown_message(message) -> str:
+    return "Unrecognized messageID " + str(message.message_id) + "\n"
+
+
+def _malformed_message(message) -> str:
+    return "Malformed message from TTS: " + str(message.error) + "\n"
+
+
+# message class -> (html colour, plain text description)
+DESCRIPTIONS = {
+    NewObject: ("#9999FF", _new_object),
+    GameLoaded: ("#99FF99", _game_loaded),
+    PrintMessage: (None, _print_message),
+    ErrorMessage: ("#FF0000", _error_message),
+    CustomMessage: ("#0099FF", _custom_message),
+    ReturnValue: ("#00FFFF", _return_value),
+    GameSaved: ("#00FF00", _game_saved),
+    ObjectCreated: ("#FFFF00", _object_created),
+    UnknownMessage: ("#FF0000", _unknown_message),
+    MalformedMessage: ("#FF0000", _malformed_message),
+}
+
+
+def _describe(message, describe) -> str:
+    if message.source is None:
+        return describe(message)
+    return "[" + message.source + "] " + describe(message)
+
+
+def render_text(message, notes="") -> str:
+    _, describe = DESCRIPTIONS[type(message)]
+    return _describe(message, describe) + notes
+
+
+def render_html(message, notes="") -> str:
+    colour, describe = DESCRIPTIONS[type(message)]
+    body = html.escape(_describe(message, describe) + notes, quote=False)
+    if colour is None:
+        return "<pre>" + body + "</pre>"
+    return ("<pre><font color='" + colour + "'>" + body
+            + "</font></pre>")
+
+
+def render_json(message, notes="") -> str:
+    data = dict(message.to_dict())
+    if "scriptStates" in data:
+        # the scripts themselves are on disk, do not repeat them
+        data["scriptStates"] = [
+            {"name": entry["name"], "guid": entry["guid"]}
+            for entry in data["scriptStates"]
+        ]
+    data["type"] = type(message).__name__
+    if message.source is not None:
+        data["source"] = message.source
+    if notes:
+        data["notes"] = notes
+    return Codec.dumps(data).decode("utf-8") + "\n"
+
+
+RENDERERS = {
+    "text": render_text,
+    "html": render_html,
+    "json": render_json,
+}
@@ -2,44 +2,36 @@
 functions to be used when poking a tcp listen socket to send messages to TTS
 """
 
-import socket
-import json
+import os
+# custom
+import tcp_actions.codec as Codec
+from tcp_actions.bundle import BundleError
+from tcp_actions.manifest import FILE_KINDS, check_file, hash_contents
+from tcp_actions.sender import sender_for
+from tcp_actions.stream_encode import FileContents, check_files, iter_encode
+from tcp_actions.messages import (
+    GetScripts, SaveAndPlay, SendCustomMessage, ExecuteLua
+)
+
+
+def poke_tcp_server(data, host, port, message_id=None) -> list[str]:
+    """
+    send a data packet to the tcp socket at host:port, through the sender
+    this process keeps for that target
+    """
+    return sender_for(host, port).send(data, message_id)
 
 
-def poke_tcp_server(data, host, port) -> list[str]:
+def gather_files(specfile, bundler=None) -> list[dict]:
     """
-    send a data packet to the tcp socket at host:port
-    """
-    rd = []
-    # prevent name being unbound in 'finally'
-    tcp_socket = None
-    try:
-        tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        tcp_socket.connect((host, port))
-        tcp_socket.sendall(bytes(data, encoding="utf-8"))
-        tcp_socket.shutdown(socket.SHUT_RDWR)
-    except socket.error as err:
-        print("Socket error ", err)
-        rd.extend([
-            "<font color='#FF0000'>",
-            "Socket error:",
-            str(err),
-            "\n"
-        ])
-    finally:
-        if tcp_socket:
-            tcp_socket.close()
-    return rd
-
-
-def gather_files(specfile) -> list[dict]:
-    """
-    gather all the files from the paths in the given specfile
+    gather all the files from the paths in the given specfile. with a
+    Bundler, scripts have their #includes and requires inlined; every other
+    file is left as FileContents, to be read while it is sent
     """
     definitions = []
     try:
-        with open(specfile, mode="r", encoding="utf-8") as spec:
-            json_spec = json.load(spec)
+        with open(specfile, mode="rb") as spec:
+            json_spec = Codec.loads(spec.read())
             for entry in json_spec:
                 new_definition = {
                     "name": entry["name"],
@@ -51,20 +43,30 @@ def gather_files(specfile) -> list[dict]:
                     validation_str = validation_str[len(validation_str) - 1]
                     if validation_str != "lua":
                         continue
-                    with open(entry["script"],
-                              mode="r",
-                              encoding="utf-8") as scr:
-                        new_definition["script"] = scr.read()
+                    if bundler is not None:
+                        try:
+                            if bundler.dependencies(entry["script"]):
+                                new_definition["script"] = bundler.bundle(
+                                    entry["script"]
+                                )
+                            else:
+                                new_definition["script"] = FileContents(
+                                    entry["script"]
+                                )
+                        except BundleError as error:
+                            print("Error bundling script: ", error)
+                            continue
+                    else:
+                        new_definition["script"] = FileContents(
+                            entry["script"]
+                        )
                 if "ui" in entry:
                     # validate filepath
                     validation_str = entry["ui"].split(".")
                     validation_str = validation_str[len(validation_str) - 1]
                     if validation_str != "xml":
                         continue
-                    with open(entry["ui"],
-                              mode="r",
-                              encoding="utf-8") as xml:
-                        new_definition["ui"] = xml.read()
+                    new_definition["ui"] = FileContents(entry["ui"])
                 definitions.append(new_definition)
     except OSError as error:
         print("Error opening specfile: ", error)
@@ -72,56 +74,165 @@ def gather_files(specfile) -> list[dict]:
     return definitions
 
 
-def send_save_and_play_signal(script_definitions, host, port) -> list[str]:
+def _check_script(record, path, bundler) -> tuple[bool, str | None, dict]:
     """
-    send the provided definitions to TTS and trigger a save+reload
+    check_file for a script that gets bundled. its record also holds the
+    stat of every file it depends on, and the hash of the bundled script,
+    which is what TTS ends up holding. the bundled script is returned too
+    if it had to be built. a script that includes and requires nothing is
+    checked like any other file, and is never bundled
     """
-    message = {
-        "messageID": 1,
-        "scriptStates": script_definitions
+    dependencies = {} if bundler is None else bundler.dependencies(path)
+    if not dependencies:
+        # a record with deps was for a bundle, which TTS no longer gets
+        if record is not None and record.get("deps"):
+            record = None
+        changed, new_record = check_file(record, path)
+        return changed, None, new_record
+    stat = os.stat(path)
+    if (record is not None
+            and record.get("path") == path
+            and record.get("mtime") == stat.st_mtime_ns
+            and record.get("size") == stat.st_size
+            and record.get("deps", {}) == dependencies):
+        return False, None, record
+    contents = bundler.bundle(path)
+    new_record = {
+        "path": path,
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": hash_contents(contents),
     }
-    data = json.dumps(message)
+    if dependencies:
+        new_record["deps"] = dependencies
+    changed = record is None or record.get("hash") != new_record["hash"]
+    return changed, contents, new_record
+
 
-    return poke_tcp_server(data, host, port)
+def gather_changed_files(specfile, manifest, only_paths=None,
+                         bundler=None) -> tuple[list[dict], dict]:
+    """
+    like gather_files, but only gather the objects whose script or ui changed
+    since the push recorded in the given manifest. unchanged files are
+    skipped using their mtime and size without being read.
 
+    only_paths, if given, is the set of files already known to have changed
+    (from a file watcher, say); the files of every other object already in
+    the manifest are not even looked at.
 
-def send_get_scripts_signal(host, port) -> list[str]:
+    with a Bundler, scripts that include or require files are bundled, and
+    an object also counts as changed when any of those files changed. every
+    other file is left as FileContents, to be read while it is sent.
+
+    return the definitions to send and the manifest to save once the push
+    succeeds. an empty manifest produces the full set.
     """
-    request new servers from the running TTS instance
+    definitions = []
+    new_manifest = {}
+    try:
+        with open(specfile, mode="rb") as spec:
+            json_spec = Codec.loads(spec.read())
+    except OSError as error:
+        print("Error opening specfile: ", error)
+        return definitions, manifest
+    for entry in json_spec:
+        guid = str(entry["guid"])
+        old_records = manifest.get(guid, {})
+        if only_paths is not None and guid in manifest:
+            kinds = [kind for kind in FILE_KINDS if kind in entry]
+            if (set(kinds) == set(old_records)
+                    and all(entry[kind] == old_records[kind]["path"]
+                            and entry[kind] not in only_paths
+                            and only_paths.isdisjoint(
+                                old_records[kind].get("deps", ()))
+                            for kind in kinds)):
+                new_manifest[guid] = old_records
+                continue
+        new_records = {}
+        contents = {}
+        changed = False
+        try:
+            for kind in FILE_KINDS:
+                if kind not in entry:
+                    continue
+                # validate filepath, same as gather_files
+                extension = entry[kind].split(".")
+                extension = extension[len(extension) - 1]
+                if extension != ("lua" if kind == "script" else "xml"):
+                    break
+                if kind == "script":
+                    file_changed, file_contents, record = _check_script(
+                        old_records.get(kind), entry[kind], bundler
+                    )
+                else:
+                    file_contents = None
+                    file_changed, record = check_file(
+                        old_records.get(kind), entry[kind]
+                    )
+                changed = changed or file_changed
+                contents[kind] = file_contents
+                new_records[kind] = record
+            else:
+                # a file was added to or removed from this object
+                if set(new_records) != set(old_records):
+                    changed = True
+                if changed:
+                    new_definition = {
+                        "name": entry["name"],
+                        "guid": entry["guid"],
+                    }
+                    # objects are always sent whole, so bundle anything the
+                    # stat check let us skip
+                    for kind, file_contents in contents.items():
+                        if (file_contents is None
+                                and new_records[kind].get("deps")):
+                            file_contents = bundler.bundle(entry[kind])
+                        elif file_contents is None:
+                            file_contents = FileContents(entry[kind])
+                        new_definition[kind] = file_contents
+                    definitions.append(new_definition)
+                new_manifest[guid] = new_records
+        except OSError as error:
+            print("Error opening file: ", error)
+        except BundleError as error:
+            print("Error bundling script: ", error)
+    return definitions, new_manifest
+
+
+def send_save_and_play_signal(script_definitions, host, port) -> list[str]:
     """
-    message = {
-        "messageID": 0,
-    }
+    send the provided definitions to TTS and trigger a save+reload. the
+    message is streamed to the socket as it is encoded
+    """
+    try:
+        check_files(script_definitions)
+    except OSError as err:
+        print("Error opening file: ", err)
+        return ["<font color='#FF0000'>", "Error opening file:", str(err),
+                "\n"]
+    return poke_tcp_server(iter_encode(SaveAndPlay(script_definitions)),
+                           host, port, SaveAndPlay.MESSAGE_ID)
 
-    data = json.dumps(message)
 
-    return poke_tcp_server(data, host, port)
+def send_get_scripts_signal(host, port) -> list[str]:
+    """
+    request new servers from the running TTS instance
+    """
+    return poke_tcp_server(GetScripts().encode(), host, port,
+                           GetScripts.MESSAGE_ID)
 
 
 def send_execute_code_signal(guid, code, host, port) -> list[str]:
     """
     send a bit of code over to TTS to be executed on object with given GUID
     """
-    message = {
-        "messageID": 3,
-        "guid": guid,
-        "script": code
-    }
-
-    data = json.dumps(message)
-
-    return poke_tcp_server(data, host, port)
+    return poke_tcp_server(ExecuteLua(guid, code).encode(), host, port,
+                           ExecuteLua.MESSAGE_ID)
 
 
 def send_message_signal(table, host, port) -> list[str]:
     """
     send a lua table to TTS to be operated on with onExternalMessage()
     """
-    message = {
-        "messageID": 2,
-        "customMessage": table
-    }
-
-    data = json.dumps(message)
-
-    return poke_tcp_server(data, host, port)
+    return poke_tcp_server(SendCustomMessage(table).encode(), host, port,
+                           SendCustomMessage.MESSAGE_ID)
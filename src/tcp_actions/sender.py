@@ -0,0 +1,407 @@
+"""
+a reusable sender for the TTS external editor port, with connect retries,
+timeouts, a queue for pipelined sends and per-message latency figures, and
+fan_out() to send one message to several TTS instances at once, each written
+to by a thread of its own
+"""
+
+import time
+import queue
+import socket
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+# custom
+from tcp_actions.metrics import default_metrics
+from tcp_actions.capture import OUTBOUND, active_capture
+
+# seconds to wait for TTS to accept a connection
+DEFAULT_TIMEOUT = 5.0
+# seconds TTS may take to read one chunk of a message. it reads a big push
+# slowly while it is busy loading, so this is generous, but a TTS that has
+# stopped reading altogether is given up on rather than waited on forever
+DEFAULT_SEND_TIMEOUT = 60.0
+# bytes handed to the socket at a time, so the send timeout is per chunk
+# rather than for the whole of a big message
+WRITE_CHUNK_SIZE = 262144
+DEFAULT_RETRIES = 3
+# seconds before the first retry, doubled after every failed attempt
+DEFAULT_BACKOFF = 0.05
+# the most TTS instances fan_out() sends to at the same time
+FAN_OUT_WORKERS = 8
+# chunks of a streamed message queued for a target that is behind the others
+# before the message waits for it to catch up, or time out
+FAN_OUT_QUEUE_CHUNKS = 16
+
+
+class Sender:
+    """
+    TTS reads a message until its connection is closed, so every message
+    still needs a connection of its own. what a Sender keeps between messages
+    is everything else: the resolved address, the retry and timeout policy,
+    a worker thread that drains queued sends back to back, and latency
+    figures per messageID, which also go to the shared metrics registry.
+    every message sent is appended to the active capture, if there is one.
+    """
+
+    def __init__(self, host, port, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 send_timeout=DEFAULT_SEND_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.name = str(host) + ":" + str(port)
+        self.timeout = timeout
+        self.send_timeout = send_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.latency = {}
+        self._address = None
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+
+    def send(self, data, message_id=None) -> list[str]:
+        """
+        send one encoded message, retrying the connection with exponential
+        backoff while TTS is not accepting. data is a str, bytes, or an
+        iterable of bytes chunks (see tcp_actions.stream_encode), which are
+        sent as they are produced. returns a list of output lines, empty on
+        success
+        """
+        return _transmit([self], data, message_id)[self.name]
+
+    def send_message(self, message) -> list[str]:
+        """
+        encode a typed message from tcp_actions.messages and send it
+        """
+        return self.send(message.encode(), message.MESSAGE_ID)
+
+    def queue_message(self, message) -> Future:
+        """
+        queue a message to be sent by the worker thread and return at once.
+        queued messages go out in order, one straight after the other. the
+        returned future resolves to the output of send()
+        """
+        future = Future()
+        with self._lock:
+            if self._worker is None:
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(
+                    target=self._drain,
+                    name="tts-sender",
+                    daemon=True
+                )
+                self._worker.start()
+        self._queue.put((message, future))
+        return future
+
+    def flush(self):
+        """
+        block until every queued message has been sent
+        """
+        if self._queue is not None:
+            self._queue.join()
+
+    def close(self):
+        """
+        send whatever is still queued, then stop the worker thread
+        """
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is not None:
+            self._queue.put(None)
+            worker.join()
+
+    def metrics(self) -> dict:
+        """
+        return a snapshot of the latency figures, keyed by messageID
+        """
+        with self._lock:
+            snapshot = {}
+            for message_id, stats in self.latency.items():
+                entry = dict(stats)
+                entry["mean"] = stats["total"] / stats["count"]
+                snapshot[message_id] = entry
+            return snapshot
+
+    def _open(self) -> tuple[socket.socket | None, list[str], float]:
+        """
+        connect, with retries. return the socket, or None and the error
+        output, along with the seconds it took
+        """
+        started = time.perf_counter()
+        delay = self.backoff
+        attempt = 0
+        while True:
+            try:
+                tcp_socket = self._connect()
+                return tcp_socket, [], time.perf_counter() - started
+            except (ConnectionRefusedError, socket.timeout) as err:
+                if attempt >= self.retries:
+                    return None, self._error(err), 0.0
+                attempt += 1
+                time.sleep(delay)
+                delay *= 2
+            except OSError as err:
+                return None, self._error(err), 0.0
+
+    def _connect(self) -> socket.socket:
+        if self._address is None:
+            family, kind, proto, _, address = socket.getaddrinfo(
+                self.host, self.port, type=socket.SOCK_STREAM
+            )[0]
+            self._address = (family, kind, proto, address)
+        family, kind, proto, address = self._address
+        tcp_socket = socket.socket(family, kind, proto)
+        tcp_socket.settimeout(self.timeout)
+        try:
+            tcp_socket.connect(address)
+        except OSError:
+            tcp_socket.close()
+            raise
+        # TTS reads a big push slowly while it is busy loading, which must
+        # not fail the push, so writing gets much longer than the connect
+        tcp_socket.settimeout(self.send_timeout)
+        return tcp_socket
+
+    def _error(self, err, label="Socket error") -> list[str]:
+        print(label, err)
+        default_metrics().count("send_errors")
+        return [
+            "<font color='#FF0000'>",
+            label + ":",
+            str(err),
+            "\n"
+        ]
+
+    def _record(self, message_id, connect_time, transmit_time, size):
+        total = connect_time + transmit_time
+        with self._lock:
+            stats = self.latency.get(message_id)
+            if stats is None:
+                stats = {
+                    "count": 0,
+                    "total": 0.0,
+                    "min": total,
+                    "max": total,
+                    "connect": 0.0,
+                    "transmit": 0.0,
+                    "bytes": 0,
+                }
+                self.latency[message_id] = stats
+            stats["count"] += 1
+            stats["total"] += total
+            stats["min"] = min(stats["min"], total)
+            stats["max"] = max(stats["max"], total)
+            stats["connect"] += connect_time
+            stats["transmit"] += transmit_time
+            stats["bytes"] += size
+        metrics = default_metrics()
+        metrics.count("sent", message_id)
+        metrics.count("bytes_sent", message_id, size)
+        metrics.observe("send_connect", connect_time, message_id)
+        metrics.observe("send_transmit", transmit_time, message_id)
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            message, future = item
+            try:
+                future.set_result(self.send_message(message))
+            except Exception as err:
+                future.set_exception(err)
+            finally:
+                self._queue.task_done()
+
+
+_senders = {}
+_senders_lock = threading.Lock()
+
+
+def sender_for(host, port) -> Sender:
+    """
+    the sender shared by everything in this process for host:port
+    """
+    with _senders_lock:
+        sender = _senders.get((host, port))
+        if sender is None:
+            sender = Sender(host, port)
+            _senders[(host, port)] = sender
+        return sender
+
+
+_fan_out_pool = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _fan_out_pool
+    with _senders_lock:
+        if _fan_out_pool is None:
+            _fan_out_pool = ThreadPoolExecutor(
+                max_workers=FAN_OUT_WORKERS,
+                thread_name_prefix="tts-fan-out"
+            )
+        return _fan_out_pool
+
+
+class _Writer:
+    """
+    writes the chunks of one message to one target. with several targets
+    each writes on a thread of its own, so a slow target holds up the others
+    only once its queue is full, and a stalled one only until its send
+    timeout drops it. a lone target is written to straight away
+    """
+
+    def __init__(self, tcp_socket, threaded):
+        self.socket = tcp_socket
+        self.error = None
+        self._queue = None
+        self._thread = None
+        if threaded:
+            self._queue = queue.Queue(maxsize=FAN_OUT_QUEUE_CHUNKS)
+            self._thread = threading.Thread(
+                target=self._run,
+                name="tts-fan-out-writer",
+                daemon=True
+            )
+            self._thread.start()
+
+    def put(self, chunk):
+        if self._thread is None:
+            self._write(chunk)
+        elif self.error is None:
+            self._queue.put(chunk)
+
+    def finish(self):
+        """
+        wait until every chunk put is written, or writing failed
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+
+    def abort(self):
+        """
+        stop writing at once, even in the middle of a chunk
+        """
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.finish()
+
+    def _write(self, chunk):
+        try:
+            self.socket.sendall(chunk)
+        except OSError as err:
+            self.error = err
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            # once failed, keep draining so whoever puts is never blocked
+            if self.error is None:
+                self._write(chunk)
+
+
+def _chunks(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if not isinstance(data, (bytes, bytearray)):
+        return data
+    view = memoryview(data)
+    return [view[start:start + WRITE_CHUNK_SIZE]
+            for start in range(0, max(len(data), 1), WRITE_CHUNK_SIZE)]
+
+
+def _transmit(senders, data, message_id) -> dict:
+    """
+    connect to every sender, then hand each chunk of data to a writer per
+    sender as it is produced. returns the output of each keyed by its name
+    """
+    chunks = _chunks(data)
+    if len(senders) == 1:
+        opened = [senders[0]._open()]
+    else:
+        opened = list(_pool().map(Sender._open, senders))
+    results = {}
+    live = {}
+    for sender, (tcp_socket, rd, connect_time) in zip(senders, opened):
+        results[sender.name] = rd
+        if tcp_socket is not None:
+            live[sender.name] = (sender, tcp_socket, connect_time)
+    sockets = [tcp_socket for _, tcp_socket, _ in live.values()]
+    writers = {
+        name: _Writer(tcp_socket, len(live) > 1)
+        for name, (_, tcp_socket, _) in live.items()
+    }
+    capture = active_capture()
+    captured = [] if capture is not None else None
+    size = 0
+    started = time.perf_counter()
+    try:
+        for chunk in chunks:
+            if not live:
+                break
+            size += len(chunk)
+            if captured is not None:
+                captured.append(chunk)
+            for name in list(live):
+                writer = writers[name]
+                writer.put(chunk)
+                if writer.error is not None:
+                    writer.finish()
+                    results[name] = live.pop(name)[0]._error(writer.error)
+        for name, (sender, tcp_socket, _) in list(live.items()):
+            writers[name].finish()
+            try:
+                if writers[name].error is not None:
+                    raise writers[name].error
+                tcp_socket.shutdown(socket.SHUT_RDWR)
+            except OSError as err:
+                results[name] = sender._error(err)
+                del live[name]
+    except (OSError, ValueError) as err:
+        # the message itself could not be produced, a file it streams from
+        # went missing say, so what was sent of it is useless
+        for name, (sender, _, _) in live.items():
+            writers[name].abort()
+            results[name] = sender._error(
+                err, "Push cut short, TTS got a truncated message"
+            )
+        live = {}
+    finally:
+        for tcp_socket in sockets:
+            tcp_socket.close()
+    transmit_time = time.perf_counter() - started
+    for sender, _, connect_time in live.values():
+        sender._record(message_id, connect_time, transmit_time, size)
+    if capture is not None and live:
+        data = b"".join(captured)
+        for _ in live:
+            capture.append(OUTBOUND, message_id, data)
+    return results
+
+
+def fan_out(senders, data, message_id=None) -> dict:
+    """
+    send one message to every sender at once, encoding it only once. encoded
+    bytes are sent to every target from the fan out pool, and each chunk of
+    a streamed message (see tcp_actions.stream_encode) is queued for a
+    writer thread per target as it is produced, so every target is written
+    to in parallel. a target that stops reading is dropped with an error
+    once its send timeout runs out. returns the output of each send() keyed
+    by the sender's name
+    """
+    if isinstance(data, (str, bytes, bytearray)) and len(senders) > 1:
+        futures = [
+            (sender.name, _pool().submit(sender.send, data, message_id))
+            for sender in senders
+        ]
+        return {name: future.result() for name, future in futures}
+    return _transmit(senders, data, message_id)
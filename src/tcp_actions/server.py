@@ -0,0 +1,304 @@
+"""
+an asyncio listen server for the messages TTS sends to port 39998, shared by
+dev_server.py and the gui
+"""
+
+import time
+import socket
+import asyncio
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+# custom
+from tcp_actions.listen import READ_SIZE, handle_message, save_received_files
+from tcp_actions.render import render_html
+from tcp_actions.messages import (
+    NewObject, GameLoaded, MalformedMessage, parse_message
+)
+from tcp_actions.metrics import default_metrics
+from tcp_actions.capture import INBOUND, active_capture
+from tcp_actions.stream_decode import ScriptStateStream
+
+# messages that touch the disk or spawn an editor are handled off the loop
+BLOCKING_MESSAGES = (NewObject, GameLoaded)
+# how many connections are read and acted upon at once. the rest wait their
+# turn unread, so their socket buffers fill up and TTS is held back
+MAX_ACTIVE_MESSAGES = 16
+# seconds that in-flight messages get to finish once shutdown is requested
+SHUTDOWN_GRACE = 5
+
+
+class ListenServer:
+    """
+    every TTS connection is serviced by its own coroutine, so a multi-MB
+    script dump never holds up the print() spam (messageID 2) arriving next
+    to it. disk writes run on a single worker thread to keep the loop free
+    and the writes ordered.
+
+    folder and editor may be reassigned from any thread; they are read each
+    time a message is handled. on_output is called on the server's thread
+    with the output of every handled message, as rendered by render (html
+    by default, see tcp_actions.render).
+
+    message counts, sizes and the time spent receiving, parsing, writing and
+    handling each message are recorded in metrics, by messageID. while a
+    capture is active, every message received is appended to it.
+
+    sources lists the (host, port) of the TTS instances that send here, the
+    targets an engine sends to. with more than one, every message is tagged
+    with the one on the host it came from. TTS connects from a new port
+    every time, so when several of them share that host, the message can
+    only be tagged with the host.
+    """
+
+    def __init__(self, host, port, folder=None, editor=None,
+                 on_output=None, on_message=None, metrics=None,
+                 render=render_html, sources=()):
+        self.host = host
+        self.port = port
+        self.folder = folder
+        self.editor = editor
+        self.on_output = on_output
+        self.render = render
+        self.sources = list(sources)
+        self.metrics = metrics if metrics is not None else default_metrics()
+        self.subscribers = {}
+        if on_message is not None:
+            self.subscribe(None, on_message)
+        self.ready = threading.Event()
+        # the port actually listened on, which differs from port if it is 0
+        self.bound_port = None
+        self._loop = None
+        self._stopping = None
+        self._active = None
+        self._tasks = set()
+        self._services = []
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._thread = None
+        self._error = None
+        # address -> the names of the sources on it, while tagging
+        self._source_names = None
+
+    def subscribe(self, message_type, handler):
+        """
+        call handler with every message of the given class from
+        tcp_actions.messages, or with every message if None. coroutine
+        functions are awaited on the loop, plain functions are run on the
+        worker thread
+        """
+        self.subscribers.setdefault(message_type, []).append(handler)
+
+    def attach(self, service):
+        """
+        run another service (anything with an async start() and a close(),
+        like a ControlServer) on this server's loop, starting once the
+        listen port is bound and closing when the server shuts down
+        """
+        self._services.append(service)
+
+    async def serve(self):
+        """
+        bind and service connections until shutdown() is called
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._active = asyncio.Semaphore(MAX_ACTIVE_MESSAGES)
+        server = await asyncio.start_server(
+            self._service_connection,
+            self.host, self.port,
+            limit=READ_SIZE
+        )
+        self.bound_port = server.sockets[0].getsockname()[1]
+        try:
+            if len(self.sources) > 1:
+                self._source_names = await self._resolve_sources()
+            for service in self._services:
+                await service.start()
+            self.ready.set()
+            await self._stopping.wait()
+        finally:
+            server.close()
+            for service in self._services:
+                service.close()
+            # let messages that were already received finish writing
+            if self._tasks:
+                _, pending = await asyncio.wait(
+                    self._tasks,
+                    timeout=SHUTDOWN_GRACE
+                )
+                for task in pending:
+                    task.cancel()
+            self._executor.shutdown(wait=True)
+
+    def start_in_thread(self) -> threading.Thread:
+        """
+        run the server on a background thread, returning once it is bound.
+        raises OSError if the port could not be bound, and whatever else
+        stopped the server from starting, like an attached service failing
+        """
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self._thread
+
+    def shutdown(self):
+        """
+        stop accepting connections and wind the server down. safe to call
+        from any thread, and more than once
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        except RuntimeError:
+            # the loop already stopped on its own
+            return
+        if (self._thread is not None
+                and self._thread is not threading.current_thread()):
+            self._thread.join()
+
+    def _run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as err:
+            # start_in_thread raises it again if it happened while starting
+            self._error = err
+            if self.ready.is_set():
+                raise
+        finally:
+            self.ready.set()
+
+    async def _service_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        source = None
+        if self._source_names is not None:
+            peer = writer.get_extra_info("peername")
+            if peer:
+                source = self._source_for(peer[0])
+        try:
+            async with self._active:
+                rd = await self._receive(reader, source)
+        except (ValueError, KeyError) as err:
+            self.metrics.count("malformed")
+            rd = self.render(MalformedMessage(str(err)).tag(source))
+        finally:
+            writer.close()
+            self._tasks.discard(task)
+        if rd and self.on_output is not None:
+            self.on_output(rd)
+
+    async def _resolve_sources(self) -> dict:
+        names = {}
+        for host, port in self.sources:
+            try:
+                found = await self._loop.getaddrinfo(
+                    host, None, type=socket.SOCK_STREAM
+                )
+            except OSError:
+                continue
+            for _, _, _, _, address in found:
+                names.setdefault(address[0], set()).add(
+                    str(host) + ":" + str(port)
+                )
+        return names
+
+    def _source_for(self, address) -> str:
+        """
+        the source a connection from address came from, or just the address
+        when it is not one source's alone
+        """
+        address = address.removeprefix("::ffff:")
+        names = self._source_names.get(address, ())
+        if len(names) == 1:
+            return next(iter(names))
+        return address
+
+    async def _receive(self, reader, source=None) -> str:
+        stream = ScriptStateStream()
+        written = []
+        totals = {}
+        started = time.perf_counter()
+        parse_time = 0.0
+        write_time = 0.0
+        capture = active_capture()
+        chunks = [] if capture is not None else None
+        while True:
+            chunk = await reader.read(READ_SIZE)
+            if not chunk:
+                break
+            if chunks is not None:
+                chunks.append(chunk)
+            parse_started = time.perf_counter()
+            stream.feed(chunk)
+            parse_time += time.perf_counter() - parse_started
+            # start writing a big dump to disk while the rest arrives. the
+            # folder's index is saved once, when it has all been written
+            if stream.message_id == 1:
+                entries = stream.ready_entries()
+                if entries:
+                    write_started = time.perf_counter()
+                    written.extend(await self._run_blocking(
+                        save_received_files, entries, self.folder,
+                        None, totals, False
+                    ))
+                    write_time += time.perf_counter() - write_started
+        if stream.bytes_received == 0:
+            return ""
+        parse_started = time.perf_counter()
+        parsed_data = None
+        try:
+            parsed_data = stream.finish()
+        finally:
+            # malformed messages are captured too
+            if chunks is not None:
+                capture.append(
+                    INBOUND,
+                    parsed_data.get("messageID")
+                    if isinstance(parsed_data, dict) else stream.message_id,
+                    b"".join(chunks)
+                )
+        message = parse_message(parsed_data).tag(source)
+        parse_time += time.perf_counter() - parse_started
+        message_id = parsed_data.get("messageID")
+        self.metrics.count("messages", message_id)
+        self.metrics.count("bytes_received", message_id,
+                           stream.bytes_received)
+        self.metrics.observe("receive", time.perf_counter() - started,
+                             message_id)
+        self.metrics.observe("parse", parse_time, message_id)
+        await self._notify(message)
+        handle_started = time.perf_counter()
+        if isinstance(message, BLOCKING_MESSAGES):
+            rd = await self._run_blocking(
+                handle_message, message, self.folder, self.editor,
+                written, stream.ready_entries(), totals, self.render
+            )
+        else:
+            rd = handle_message(message, self.folder, self.editor,
+                                render=self.render)
+        # the rest of a dump is written while it is handled
+        handle_time = time.perf_counter() - handle_started
+        if message_id == 1:
+            write_time += handle_time
+            self.metrics.observe("write", write_time, message_id)
+        self.metrics.observe("handle", handle_time, message_id)
+        for count in ("written", "unchanged", "kept", "failed"):
+            if totals.get(count):
+                self.metrics.count("files_" + count, message_id,
+                                   totals[count])
+        return rd
+
+    async def _notify(self, message):
+        handlers = (self.subscribers.get(None, [])
+                    + self.subscribers.get(type(message), []))
+        for handler in handlers:
+            if inspect.iscoroutinefunction(handler):
+                await handler(message)
+            else:
+                await self._run_blocking(handler, message)
+
+    def _run_blocking(self, func, *args):
+        return self._loop.run_in_executor(self._executor, func, *args)
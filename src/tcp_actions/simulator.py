@@ -0,0 +1,317 @@
+"""
+a stand-in for Tabletop Simulator's side of the external editor protocol, so
+the rest of tcp_actions can be exercised and benchmarked without the game.
+
+a SimulatedTTS listens where TTS would (39999) and answers save and play,
+get scripts and execute code messages the way TTS does, by connecting back
+to the dev server (39998). it can also send the dev server anything TTS
+would on its own: script dumps of any size, print storms and error floods
+"""
+
+import re
+import time
+import socketserver
+import threading
+from concurrent.futures import ThreadPoolExecutor
+# custom
+import tcp_actions.codec as Codec
+from tcp_actions.messages import (
+    INBOUND, OUTBOUND, PrintMessage, ErrorMessage, CustomMessage,
+    ReturnValue, GameSaved, ObjectCreated, GetScripts, SaveAndPlay,
+    SendCustomMessage, ExecuteLua, parse_message
+)
+from tcp_actions.evaluate import NIL_SENTINEL
+from tcp_actions.sender import Sender
+
+TTS_HOST = "localhost"
+TTS_PORT = 39999
+DEVSERVER_PORT = 39998
+# matches one snippet packed by tcp_actions.batch
+BATCH_ITEM = re.compile(r'^__run\((\d+), ("(?:[^"\\]|\\.)*"), function',
+                        re.MULTILINE)
+FILLER = "-- generated by the TTS simulator\nlocal value = 0\n"
+
+
+def synthetic_guid(index) -> str:
+    return format(index + 1, "06x")
+
+
+def synthetic_script(guid, size) -> str:
+    """
+    a lua script of roughly size bytes, unique to guid
+    """
+    lines = ["-- script for " + guid + "\n"]
+    length = len(lines[0])
+    line_number = 0
+    while length < size:
+        line = "value = value + " + str(line_number) + " " + FILLER
+        lines.append(line)
+        length += len(line)
+        line_number += 1
+    return "".join(lines)
+
+
+def synthetic_script_states(objects, script_size=2048, ui_every=0,
+                            ui_size=512) -> list[dict]:
+    """
+    build the scriptStates of a mod with Global plus the given number of
+    scripted objects. every ui_every-th object also gets a ui (0 for none)
+    """
+    script_states = [{
+        "name": "Global",
+        "guid": "-1",
+        "script": synthetic_script("-1", script_size),
+        "ui": "<Panel id=\"global\"></Panel>\n",
+    }]
+    for index in range(objects):
+        guid = synthetic_guid(index)
+        entry = {
+            "name": "Object " + str(index),
+            "guid": guid,
+            "script": synthetic_script(guid, script_size),
+        }
+        if ui_every > 0 and index % ui_every == 0:
+            entry["ui"] = ("<Text id=\"" + guid + "\">"
+                           + "x" * max(0, ui_size - 32) + "</Text>\n")
+        script_states.append(entry)
+    return script_states
+
+
+def default_evaluate(tts, guid, script):
+    """
+    stand in for running external code, without a lua interpreter.
+
+    code wrapped by tcp_actions.evaluate gets a nil returnValue, a batch
+    from tcp_actions.batch gets a successful nil result for every snippet
+    whose object exists, and code on an unknown object raises the error TTS
+    would. anything else gets no answer, like code that returns nothing.
+
+    return ("value", value), ("error", message) or None
+    """
+    if guid != "-1" and tts.find_object(guid) is None:
+        return ("error", "Object with GUID " + str(guid) + " not found")
+    items = BATCH_ITEM.findall(script)
+    if items:
+        results = []
+        for index, item_guid in items:
+            item_guid = Codec.loads(item_guid)
+            result = {"index": int(index), "guid": item_guid, "ok": True}
+            if item_guid != "-1" and tts.find_object(item_guid) is None:
+                result["ok"] = False
+                result["error"] = "no object with guid " + item_guid
+            results.append(result)
+        return ("value", Codec.dumps(results).decode("utf-8"))
+    if NIL_SENTINEL in script:
+        return ("value", NIL_SENTINEL)
+    return None
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        chunks = []
+        while True:
+            chunk = self.request.recv(262144)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.server.tts._receive(b"".join(chunks))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SimulatedTTS:
+    """
+    holds the scripts of a simulated mod and answers the dev server's
+    messages as TTS would:
+        0 (get scripts) -> a messageID 1 dump of every script
+        1 (save and play) -> replaces the scripts of the objects sent, then
+                             a messageID 1 dump of every script
+        2 (custom message) -> nothing, unless on_custom_message answers
+        3 (execute code) -> a messageID 5 returnValue or a messageID 3 error,
+                            as decided by evaluate(tts, guid, script)
+
+    every message received is counted in received, keyed by messageID
+    """
+
+    def __init__(self, script_states=None, host=TTS_HOST, port=TTS_PORT,
+                 devserver_port=DEVSERVER_PORT, evaluate=default_evaluate,
+                 on_custom_message=None):
+        self.host = host
+        self.port = port
+        self.script_states = script_states if script_states is not None else []
+        self.evaluate = evaluate
+        self.on_custom_message = on_custom_message
+        self.sender = Sender(host, devserver_port)
+        self.received = {}
+        self.received_bytes = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self) -> threading.Thread:
+        """
+        start answering on host:port in a background thread. raises OSError
+        if the port cannot be bound
+        """
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.tts = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="tts-simulator",
+            daemon=True
+        )
+        self._thread.start()
+        return self._thread
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.sender.close()
+
+    def find_object(self, guid) -> dict | None:
+        with self._lock:
+            for entry in self.script_states:
+                if entry["guid"] == guid:
+                    return entry
+        return None
+
+    # what TTS sends on its own
+
+    def send_dump(self, message_id=1) -> list[str]:
+        """
+        send every script, as on loading a game (1) or as a single pushed
+        object (0) would
+        """
+        with self._lock:
+            script_states = list(self.script_states)
+        return self.sender.send_message(
+            INBOUND[message_id](script_states)
+        )
+
+    def send_print(self, message) -> list[str]:
+        return self.sender.send_message(PrintMessage(message))
+
+    def send_error(self, error, guid="-1",
+                   prefix="Error in Global Script: ") -> list[str]:
+        return self.sender.send_message(ErrorMessage(error, guid, prefix))
+
+    def send_custom_message(self, table) -> list[str]:
+        return self.sender.send_message(CustomMessage(table))
+
+    def send_return_value(self, value) -> list[str]:
+        return self.sender.send_message(ReturnValue(value))
+
+    def send_game_saved(self, save_path="TS_AutoSave.json") -> list[str]:
+        return self.sender.send_message(GameSaved(save_path))
+
+    def send_object_created(self, guid) -> list[str]:
+        return self.sender.send_message(ObjectCreated(guid))
+
+    def print_storm(self, count, concurrency=1) -> dict:
+        """
+        send count prints as fast as possible over concurrency connections
+        at a time
+        """
+        return self._flood(
+            count, concurrency,
+            lambda index: self.send_print("print storm line " + str(index))
+        )
+
+    def error_flood(self, count, concurrency=1) -> dict:
+        """
+        send count errors as fast as possible over concurrency connections
+        at a time
+        """
+        return self._flood(
+            count, concurrency,
+            lambda index: self.send_error(
+                "chunk_" + str(index) + ":(1,0-4): attempt to call a nil value"
+            )
+        )
+
+    def _flood(self, count, concurrency, send) -> dict:
+        started = time.perf_counter()
+        if concurrency <= 1:
+            failed = sum(len(send(index)) > 0 for index in range(count))
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                failed = sum(len(rd) > 0 for rd in executor.map(send,
+                                                                range(count)))
+        seconds = time.perf_counter() - started
+        return {
+            "count": count,
+            "failed": failed,
+            "seconds": seconds,
+            "per_second": count / seconds if seconds > 0 else 0.0,
+        }
+
+    # answering the dev server
+
+    def _receive(self, data):
+        try:
+            decoded = Codec.loads(data)
+            message_id = decoded["messageID"]
+            message = parse_message(decoded, OUTBOUND)
+        except (ValueError, KeyError, TypeError) as err:
+            print("Error decoding message: ", err)
+            return
+        with self._lock:
+            self.received[message_id] = self.received.get(message_id, 0) + 1
+            self.received_bytes += len(data)
+        answer = self._answers.get(type(message))
+        if answer is not None:
+            answer(self, message)
+
+    def _answer_get_scripts(self, message):
+        self.send_dump()
+
+    def _answer_save_and_play(self, message):
+        self._load(message.script_states)
+        self.send_dump()
+
+    def _answer_custom_message(self, message):
+        if self.on_custom_message is not None:
+            self.on_custom_message(self, message.custom_message)
+
+    def _answer_execute_lua(self, message):
+        answer = self.evaluate(self, str(message.guid), message.script)
+        if answer is None:
+            return
+        kind, value = answer
+        if kind == "error":
+            self.send_error(value, str(message.guid), "Error in Script: ")
+        else:
+            self.send_return_value(value)
+
+    # message class -> how TTS answers it
+    _answers = {
+        GetScripts: _answer_get_scripts,
+        SaveAndPlay: _answer_save_and_play,
+        SendCustomMessage: _answer_custom_message,
+        ExecuteLua: _answer_execute_lua,
+    }
+
+    def _load(self, pushed):
+        """
+        like TTS, only the objects sent are touched. sending no script or ui
+        for an object removes it
+        """
+        with self._lock:
+            by_guid = {entry["guid"]: entry for entry in self.script_states}
+            for entry in pushed:
+                guid = str(entry["guid"])
+                current = by_guid.get(guid)
+                if current is None:
+                    current = {"name": entry.get("name", ""), "guid": guid}
+                    by_guid[guid] = current
+                    self.script_states.append(current)
+                for kind in ("script", "ui"):
+                    if kind in entry:
+                        current[kind] = entry[kind]
+                    else:
+                        current.pop(kind, None)
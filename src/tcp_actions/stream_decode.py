@@ -0,0 +1,182 @@
+"""
+an incremental decoder for the json messages TTS sends to the listen server,
+able to hand out "scriptStates" entries while the rest of a large dump is
+still arriving
+"""
+
+import re
+# custom
+import tcp_actions.codec as Codec
+
+# structural characters when outside of a string
+STRUCTURE = re.compile(rb'["{}\[\]]')
+# the run of (possibly escaped) characters up to the end of a string, as an
+# unrolled loop that never backtracks
+STRING_BODY = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+# what follows a string: a colon makes it a key
+COLON = re.compile(rb'\s*(:?)')
+MESSAGE_ID = re.compile(rb'\s*(-?\d+)\D')
+# longest top-level string we bother keeping around as a possible key
+MAX_KEY_LENGTH = 64
+
+
+class ScriptStateStream:
+    """
+    feed this the raw bytes of a single message as they are received.
+
+    the bytes are scanned exactly once. every complete object inside the
+    top-level "scriptStates" array is decoded as soon as its closing brace
+    arrives, and the bytes of all those decoded are dropped from the buffer
+    at the end of each feed(), so the buffer only ever holds the entries
+    still in flight plus the small envelope around the array.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.message_id = None
+        self.bytes_received = 0
+        self.entries = []
+        self._taken = 0
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start = 0
+        # a top-level string that is only a key if a colon follows it
+        self._pending_key = None
+        self._last_key = None
+        self._message_id_at = None
+        self._in_states = False
+        self._states_start = None
+        self._states_end = None
+        self._element_start = None
+
+    def feed(self, chunk):
+        """
+        append newly received bytes and decode whatever is now complete
+        """
+        self.buffer += chunk
+        self.bytes_received += len(chunk)
+        self._scan()
+
+    def ready_entries(self) -> list[dict]:
+        """
+        return the scriptStates entries decoded since the last call
+        """
+        ready = self.entries[self._taken:]
+        self._taken = len(self.entries)
+        return ready
+
+    def finish(self) -> dict:
+        """
+        decode the rest of the message once the peer is done sending. the
+        already decoded scriptStates are spliced back in rather than parsed
+        a second time.
+        """
+        if self._states_start is None or self._states_end is None:
+            return Codec.loads(self.buffer)
+        envelope = (self.buffer[:self._states_start + 1]
+                    + self.buffer[self._states_end:])
+        parsed_data = Codec.loads(envelope)
+        parsed_data["scriptStates"] = self.entries
+        return parsed_data
+
+    def _scan(self):
+        buffer = self.buffer
+        pos = self._pos
+        # the run of decoded entries to drop once this chunk is scanned
+        drop_start = None
+        drop_end = None
+        while True:
+            if self._pending_key is not None:
+                colon = COLON.match(buffer, pos)
+                if not colon.group(1) and colon.end() >= len(buffer):
+                    # only whitespace so far, the colon may be next
+                    break
+                if colon.group(1):
+                    self._remember_key(colon.end())
+                self._pending_key = None
+                pos = colon.end()
+                continue
+            if self._in_string:
+                pos = STRING_BODY.match(buffer, pos).end()
+                if pos >= len(buffer) or buffer[pos] != 0x22:
+                    # the string (or an escape) continues in the next chunk
+                    break
+                self._in_string = False
+                if (self._depth == 1
+                        and pos - self._string_start <= MAX_KEY_LENGTH):
+                    self._pending_key = bytes(
+                        buffer[self._string_start:pos]
+                    )
+                pos += 1
+                continue
+            match = STRUCTURE.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            pos = match.start()
+            char = buffer[pos]
+            if char == 0x22:  # quote
+                self._in_string = True
+                self._string_start = pos + 1
+            elif char == 0x7B or char == 0x5B:  # { or [
+                if (char == 0x5B and self._depth == 1
+                        and self._last_key == b"scriptStates"):
+                    self._in_states = True
+                    self._states_start = pos
+                elif self._in_states and self._depth == 2:
+                    self._element_start = pos
+                self._depth += 1
+            else:  # } or ]
+                self._depth -= 1
+                if self._in_states and self._depth == 2 and char == 0x7D:
+                    start = self._element_start
+                    self.entries.append(Codec.loads(buffer[start:pos + 1]))
+                    # nothing needs these bytes again, nor the commas
+                    # between them and the entries before
+                    if drop_start is None:
+                        drop_start = start
+                    drop_end = pos + 1
+                    self._element_start = None
+                elif self._in_states and self._depth == 1:
+                    self._in_states = False
+                    self._states_end = pos
+            pos += 1
+        if drop_start is not None:
+            pos = self._drop(drop_start, drop_end, pos)
+        self._pos = pos
+        if self.message_id is None and self._message_id_at is not None:
+            self._read_message_id()
+
+    def _drop(self, start, end, pos) -> int:
+        """
+        delete buffer[start:end] in one go, moving every position after it
+        back. returns pos moved back
+        """
+        del self.buffer[start:end]
+        removed = end - start
+
+        def moved(position):
+            if position is not None and position >= end:
+                return position - removed
+            return position
+        self._string_start = moved(self._string_start)
+        self._element_start = moved(self._element_start)
+        self._states_end = moved(self._states_end)
+        self._message_id_at = moved(self._message_id_at)
+        return moved(pos)
+
+    def _remember_key(self, value_at):
+        """
+        the pending string was followed by a colon, so it is a key. value_at
+        is where its value starts
+        """
+        self._last_key = self._pending_key
+        if self._last_key == b"messageID" and self.message_id is None:
+            self._message_id_at = value_at
+
+    def _read_message_id(self):
+        match = MESSAGE_ID.match(self.buffer, self._message_id_at)
+        if match is not None:
+            self.message_id = int(match.group(1))
+            self._message_id_at = None
@@ -0,0 +1,137 @@
+"""
+encode a message to TTS piece by piece, the counterpart of stream_decode. a
+save and play push is never built up as one big json string: the envelope
+and each script are escaped and handed to the socket a chunk at a time, and
+files given as FileContents are read from disk while they are sent. what
+goes on the wire is byte for byte what Message.encode() would produce.
+"""
+
+from dataclasses import dataclass
+# custom
+import tcp_actions.codec as Codec
+
+# bytes gathered before a chunk is handed out, and characters read from a
+# file or escaped from a long string at a time
+CHUNK_SIZE = 262144
+
+
+@dataclass(slots=True)
+class FileContents:
+    """
+    stands in for the contents of a utf-8 text file in a message, so that
+    they are only read while the message is being sent
+    """
+    path: str
+
+    def chunks(self, size=CHUNK_SIZE):
+        with open(self.path, mode="r", encoding="utf-8") as source:
+            while True:
+                text = source.read(size)
+                if not text:
+                    return
+                yield text
+
+    def read(self) -> str:
+        with open(self.path, mode="r", encoding="utf-8") as source:
+            return source.read()
+
+    def read_within(self, size) -> str | None:
+        """
+        the contents if they are no longer than size characters, else None
+        """
+        with open(self.path, mode="r", encoding="utf-8") as source:
+            text = source.read(size + 1)
+        return text if len(text) <= size else None
+
+
+def check_files(value):
+    """
+    open every FileContents in a message, or in part of one, so that a file
+    which is gone or unreadable fails a push before anything is sent rather
+    than part way through. raises OSError
+    """
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, (list, tuple)):
+        if isinstance(value, FileContents):
+            with open(value.path, mode="rb"):
+                pass
+        return
+    for item in value:
+        if isinstance(item, (dict, list, tuple, FileContents)):
+            check_files(item)
+
+
+def _string(parts):
+    yield b'"'
+    for text in parts:
+        # escaping is per character, so slices escape the same as the whole
+        yield Codec.dumps(text)[1:-1]
+    yield b'"'
+
+
+def _streamed(value, chunk_size) -> bool:
+    return (isinstance(value, (dict, list, tuple, FileContents))
+            or (isinstance(value, str) and len(value) > chunk_size))
+
+
+def _pieces(value, chunk_size):
+    if isinstance(value, dict):
+        # runs of small values, small files included, are encoded in one go,
+        # which is much faster than going key by key
+        separator = b"{"
+        plain = {}
+        for key, item in value.items():
+            if isinstance(item, FileContents):
+                text = item.read_within(chunk_size)
+                if text is not None:
+                    plain[key] = text
+                    continue
+            elif not _streamed(item, chunk_size):
+                plain[key] = item
+                continue
+            if plain:
+                yield separator + Codec.dumps(plain)[1:-1]
+                separator = b","
+                plain = {}
+            yield separator + Codec.dumps(key) + b":"
+            separator = b","
+            yield from _pieces(item, chunk_size)
+        if plain:
+            yield separator + Codec.dumps(plain)[1:]
+        elif separator == b"{":
+            yield b"{}"
+        else:
+            yield b"}"
+    elif isinstance(value, (list, tuple)):
+        yield b"["
+        for index, item in enumerate(value):
+            if index > 0:
+                yield b","
+            yield from _pieces(item, chunk_size)
+        yield b"]"
+    elif isinstance(value, FileContents):
+        yield from _string(value.chunks(chunk_size))
+    elif isinstance(value, str) and len(value) > chunk_size:
+        yield from _string(
+            (value[start:start + chunk_size]
+             for start in range(0, len(value), chunk_size))
+        )
+    else:
+        yield Codec.dumps(value)
+
+
+def iter_encode(message, chunk_size=CHUNK_SIZE):
+    """
+    yield the encoded message in chunks of about chunk_size bytes. files are
+    opened as they are reached, so reading one can raise OSError part way
+    through; check_files() first to catch missing files before sending
+    """
+    buffer = bytearray()
+    for piece in _pieces(message.to_dict(), chunk_size):
+        buffer += piece
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,242 @@
+"""
+watch a folder of scripts and its subfolders for changes, using inotify
+where it is available and polling everywhere else, and turn bursts of editor
+writes into single sets of changed files
+"""
+
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+# custom
+from generate_specfile import scan_folder
+
+# the only files that ever end up in a specfile
+WATCHED_EXTENSIONS = ("lua", "xml")
+# how long the folder has to stay quiet before a burst counts as finished
+DEFAULT_DEBOUNCE = 0.15
+# a burst that never goes quiet is still pushed after this long
+DEFAULT_MAX_DELAY = 2.0
+DEFAULT_POLL_INTERVAL = 0.25
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+CREATED = "created"
+CHANGED = "changed"
+DELETED = "deleted"
+
+
+def is_watched(name) -> bool:
+    """
+    mirror the specfile generator's rule: only the last extension counts, so
+    swap files and backups like script.lua.swp or script.lua~ are ignored
+    """
+    extension = name.split(".")
+    return extension[len(extension) - 1] in WATCHED_EXTENSIONS
+
+
+def merge_changes(changes, path, kind):
+    """
+    fold one event into a set of pending changes. a file created and then
+    written during the same burst is still just created
+    """
+    previous = changes.get(path)
+    if previous == CREATED and kind == CHANGED:
+        return
+    if previous == DELETED and kind == CREATED:
+        kind = CHANGED
+    changes[path] = kind
+
+
+class InotifyWatcher:
+    """
+    linux only. raises OSError if inotify cannot be set up. every subfolder
+    gets its own watch, since inotify does not recurse by itself
+    """
+
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder)
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("no C library to find inotify in")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # watch descriptor -> the folder it watches
+        self._folders = {}
+        try:
+            self._watch_tree(self.folder)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _watch_tree(self, folder):
+        mask = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                | IN_CREATE | IN_DELETE)
+        _, dir_mtimes = scan_folder(folder)
+        for directory in dir_mtimes:
+            watch = self._libc.inotify_add_watch(
+                self._fd,
+                os.fsencode(directory),
+                mask
+            )
+            if watch < 0:
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed",
+                              directory)
+            self._folders[watch] = directory
+
+    def wait(self, timeout=None) -> dict | None:
+        """
+        block for up to timeout seconds (forever if None) and return the
+        changes seen, keyed by path. returns None if the kernel dropped
+        events and the whole folder has to be looked at again
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return {}
+        data = os.read(self._fd, 65536)
+        changes = {}
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            name = os.fsdecode(name)
+            folder = self._folders.get(watch)
+            if folder is None:
+                continue
+            if mask & IN_ISDIR:
+                if name.startswith("."):
+                    continue
+                # a folder came or went with its scripts, so watch anything
+                # new and have the whole tree looked at again
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._watch_tree(os.path.join(folder, name))
+                    except OSError as err:
+                        print("Error watching folder: ", err)
+                return None
+            if not is_watched(name):
+                continue
+            path = os.path.join(folder, name)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                merge_changes(changes, path, CREATED)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                merge_changes(changes, path, DELETED)
+            else:
+                merge_changes(changes, path, CHANGED)
+        return changes
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """
+    works anywhere, by comparing the mtimes and sizes of every script in the
+    folder tree every poll_interval seconds
+    """
+
+    def __init__(self, folder, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.folder = os.path.abspath(folder)
+        self.poll_interval = poll_interval
+        self._snapshot = self._scan()
+
+    def wait(self, timeout=None) -> dict | None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changes = {}
+            for path, stat in snapshot.items():
+                previous = self._snapshot.get(path)
+                if previous is None:
+                    changes[path] = CREATED
+                elif previous != stat:
+                    changes[path] = CHANGED
+            for path in self._snapshot:
+                if path not in snapshot:
+                    changes[path] = DELETED
+            self._snapshot = snapshot
+            if changes:
+                return changes
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return {}
+                time.sleep(min(self.poll_interval, remaining))
+            else:
+                time.sleep(self.poll_interval)
+
+    def close(self):
+        pass
+
+    def _scan(self) -> dict:
+        snapshot = {}
+        try:
+            files, _ = scan_folder(self.folder)
+            for name, path in files:
+                if is_watched(name):
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError as err:
+            print("Error scanning folder: ", err)
+        return snapshot
+
+
+def create_watcher(folder, polling=False):
+    """
+    the best watcher this platform offers for folder
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(folder)
+
+
+def debounced_changes(watcher, debounce=DEFAULT_DEBOUNCE,
+                      max_delay=DEFAULT_MAX_DELAY):
+    """
+    yield one merged set of changes per burst of writes: collection starts
+    at the first event and ends once the folder has been quiet for debounce
+    seconds, or max_delay seconds after the burst began. a yielded None
+    means the watcher lost track and everything should be rescanned
+    """
+    while True:
+        changes = watcher.wait(None)
+        if changes == {}:
+            continue
+        deadline = time.monotonic() + max_delay
+        while changes is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            more = watcher.wait(min(debounce, remaining))
+            if more is None:
+                changes = None
+            elif not more:
+                break
+            else:
+                for path, kind in more.items():
+                    merge_changes(changes, path, kind)
+        yield changes
@@ -0,0 +1,165 @@
+"""
+a thread pool backed writer stage for saving the scripts TTS sends us, so a
+large dump is written in parallel batches instead of one file at a time
+"""
+
+import os
+import stat
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+# custom
+from tcp_actions.manifest import hash_contents
+
+WRITER_THREADS = 4
+# files handed to a single pool task
+BATCH_SIZE = 32
+
+
+def encode_for_disk(contents) -> bytes:
+    """
+    encode a script exactly as writing it in text mode would
+    """
+    if os.linesep != "\n":
+        contents = contents.replace("\n", os.linesep)
+    return contents.encode("utf-8")
+
+
+def write_atomic(path, data) -> bool:
+    """
+    write data (bytes) to path by way of a temporary file and a rename, so
+    editors and watchers never see a half-written script. a file whose
+    contents are already byte-identical is left untouched.
+
+    return True if the file was written, False if it was unchanged
+    """
+    mode = None
+    try:
+        current = os.stat(path)
+        mode = stat.S_IMODE(current.st_mode)
+        if current.st_size == len(data):
+            with open(path, mode="rb") as existing:
+                if existing.read() == data:
+                    return False
+    except FileNotFoundError:
+        pass
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(
+        directory,
+        "." + name + "." + str(os.getpid()) + "."
+        + str(threading.get_ident()) + ".tmp"
+    )
+    try:
+        with open(temp_path, mode="xb") as temp_file:
+            temp_file.write(data)
+        if mode is not None:
+            os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def _write_batch(batch, index) -> dict:
+    result = {
+        "written": [],
+        "unchanged": [],
+        "kept": [],
+        "failed": [],
+        "seconds": 0.0,
+    }
+    start = time.perf_counter()
+    for path, contents in batch:
+        try:
+            data = encode_for_disk(contents)
+            if index is None:
+                if write_atomic(path, data):
+                    result["written"].append(path)
+                else:
+                    result["unchanged"].append(path)
+                continue
+            new_hash = hash_contents(data)
+            record = index.get(path)
+            if record is not None and record["hash"] == new_hash:
+                # we already wrote exactly this, so never read or rewrite it.
+                # if the file changed since, that is a local edit to keep
+                try:
+                    current = os.stat(path)
+                    if (current.st_mtime_ns == record["mtime"]
+                            and current.st_size == record["size"]):
+                        result["unchanged"].append(path)
+                    else:
+                        result["kept"].append(path)
+                    continue
+                except FileNotFoundError:
+                    # deleted since it was indexed, so write it out again
+                    pass
+            if write_atomic(path, data):
+                result["written"].append(path)
+            else:
+                result["unchanged"].append(path)
+            current = os.stat(path)
+            index[path] = {
+                "mtime": current.st_mtime_ns,
+                "size": current.st_size,
+                "hash": new_hash,
+            }
+        except OSError as err:
+            result["failed"].append((path, err))
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+class FileWriter:
+    """
+    splits a set of (path, contents) pairs into batches and writes them
+    across a pool of threads
+    """
+
+    def __init__(self, max_workers=WRITER_THREADS, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="tts-writer"
+        )
+
+    def write(self, files, index=None) -> list[dict]:
+        """
+        write every file, blocking until done. return one result per batch
+        with the paths written, left unchanged or failed, and its timing.
+
+        index, if given, maps paths to the stat and hash of what was last
+        written there. files whose received contents match their record are
+        skipped without being read, and local edits made since are kept
+        rather than overwritten. the index is updated in place
+        """
+        files = list(files)
+        batches = [
+            files[i:i + self.batch_size]
+            for i in range(0, len(files), self.batch_size)
+        ]
+        return list(self._executor.map(
+            _write_batch, batches, [index] * len(batches)
+        ))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_default_writer = None
+_default_writer_lock = threading.Lock()
+
+
+def default_writer() -> FileWriter:
+    """
+    the writer shared by everything in this process, created on first use
+    """
+    global _default_writer
+    with _default_writer_lock:
+        if _default_writer is None:
+            _default_writer = FileWriter()
+        return _default_writer
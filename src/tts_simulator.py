@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Pretends to be a running TableTop Sim instance, for trying out and
+benchmarking the other scripts without the game.
+
+It listens on localhost:39999 like TTS does and answers save and play, get
+scripts and execute code messages by sending messages back to
+localhost:39998, where dev_server.py (or the GUI) should be listening. It can
+also send a scripts dump, a storm of prints or a flood of errors on its own.
+"""
+
+import sys
+import time
+import argparse
+# custom
+from tcp_actions.simulator import SimulatedTTS, synthetic_script_states
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-n", "--objects", type=int, default=100,
+                    help="Number of scripted objects in the simulated mod, "
+                         "besides Global.")
+parser.add_argument("-s", "--script-size", type=int, default=2048,
+                    help="Size in bytes of every generated script.")
+parser.add_argument("-u", "--ui-every", type=int, default=0,
+                    help="Give every Nth object a ui as well. 0 for none.")
+parser.add_argument("--dump", action="store_true",
+                    help="Send every script once, as on loading a game.")
+parser.add_argument("--prints", type=int, default=0,
+                    help="Send this many prints as fast as possible.")
+parser.add_argument("--errors", type=int, default=0,
+                    help="Send this many errors as fast as possible.")
+parser.add_argument("-c", "--concurrency", type=int, default=1,
+                    help="Connections kept open at once for prints and "
+                         "errors.")
+parser.add_argument("-p", "--port", type=int, default=39999,
+                    help="Port to listen on, to simulate several instances.")
+parser.add_argument("--serve", action="store_true",
+                    help="Keep running and answer messages like TTS would. "
+                         "This is the default when nothing is to be sent.")
+
+args = parser.parse_args()
+
+HOST = "localhost"
+PORT = args.port
+DEVSERVER_PORT = 39998
+
+tts = SimulatedTTS(
+    synthetic_script_states(args.objects, args.script_size, args.ui_every),
+    HOST, PORT, DEVSERVER_PORT
+)
+serve = args.serve or not (args.dump or args.prints or args.errors)
+if serve:
+    try:
+        tts.start()
+    except OSError as err:
+        print("Socket error ", err)
+        sys.exit(1)
+    print("Simulated TTS listening on port", PORT)
+
+if args.dump:
+    started = time.perf_counter()
+    rd = tts.send_dump()
+    if len(rd) == 0:
+        print("Sent", len(tts.script_states), "scripts in",
+              round((time.perf_counter() - started) * 1000, 1), "ms")
+for count, flood, label in ((args.prints, tts.print_storm, "prints"),
+                            (args.errors, tts.error_flood, "errors")):
+    if count > 0:
+        result = flood(count, args.concurrency)
+        print("Sent", result["count"] - result["failed"], "of", count, label,
+              "at", round(result["per_second"], 1), "per second")
+
+if not serve:
+    tts.shutdown()
+    sys.exit(0)
+try:
+    while True:
+        time.sleep(0.5)
+except KeyboardInterrupt:
+    print("\nReceived", dict(sorted(tts.received.items())),
+          "messages by messageID")
+    tts.shutdown()
+    sys.exit(0)
@@ -0,0 +1,39 @@
+"""
+the tools are run from src, so import them from there
+"""
+
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+import tcp_actions.codec as Codec  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(("localhost", 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture
+def free_port():
+    """
+    a port nothing is listening on, so tests never meet a running TTS or
+    dev server
+    """
+    return _free_port
+
+
+@pytest.fixture(params=sorted(Codec.BACKENDS))
+def backend(request):
+    """
+    run the test once with every installed json backend
+    """
+    previous = Codec.backend
+    Codec.use_backend(request.param)
+    yield request.param
+    Codec.use_backend(previous)
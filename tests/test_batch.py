@@ -0,0 +1,91 @@
+"""
+packing many execute code snippets into a few messages
+"""
+
+from concurrent.futures import Future
+
+import pytest
+
+import tcp_actions.codec as Codec
+from tcp_actions.batch import batch_messages, build_chunks, run_batch
+from tcp_actions.evaluate import EvaluationError, Evaluator
+from tcp_actions.sender import Sender
+from tcp_actions.server import ListenServer
+from tcp_actions.simulator import BATCH_ITEM, SimulatedTTS
+
+
+class FakeEvaluator:
+    """
+    answers a batch with a result per snippet, unless it holds one that
+    does not compile, in which case the whole batch fails as it would in TTS
+    """
+
+    def __init__(self):
+        self.scripts = []
+
+    def submit(self, guid, script) -> Future:
+        self.scripts.append(script)
+        future = Future()
+        if "!!" in script:
+            future.set_exception(EvaluationError("-1", "Error:", "syntax"))
+            return future
+        future.set_result(Codec.dumps([
+            {"index": int(index), "guid": Codec.loads(guid), "ok": True,
+             "value": int(index) * 10}
+            for index, guid in BATCH_ITEM.findall(script)
+        ]).decode("utf-8"))
+        return future
+
+
+def test_chunks_keep_every_item_in_order():
+    items = [("abc123", "return " + str(index)) for index in range(1200)]
+    chunks = build_chunks(items)
+    assert [index for chunk in chunks for index in chunk] == list(range(1200))
+    assert [len(chunk) for chunk in chunks] == [500, 500, 200]
+
+
+def test_chunks_fit_the_payload_limit():
+    items = [("abc123", "x" * 1000) for _ in range(50)]
+    for message in batch_messages(items, max_bytes=8000):
+        assert len(message.script.encode("utf-8")) <= 8000
+    assert len(batch_messages(items, max_bytes=8000)) > 1
+
+
+def test_results_come_back_in_input_order():
+    evaluator = FakeEvaluator()
+    items = [("abc123", "return " + str(index)) for index in range(5)]
+    batch = run_batch(evaluator, items)
+    assert batch["messages"] == 1
+    assert [result["value"] for result in batch["results"]] == [
+        0, 10, 20, 30, 40
+    ]
+
+
+def test_a_broken_snippet_is_isolated():
+    evaluator = FakeEvaluator()
+    items = [("abc123", "return 1"), ("abc123", "return 2"),
+             ("abc123", "return 3"), ("abc123", "!!")]
+    batch = run_batch(evaluator, items)
+    assert [result["ok"] for result in batch["results"]] == [
+        True, True, True, False
+    ]
+    assert batch["failed"] == 1
+    # the four, then both halves, then the failing half split again
+    assert batch["messages"] == 5
+
+
+@pytest.mark.parametrize("guid, ok", [("abc123", True), ("def456", False)])
+def test_batch_against_a_simulated_tts(free_port, guid, ok):
+    server = ListenServer("localhost", free_port())
+    server.start_in_thread()
+    tts = SimulatedTTS([{"guid": "abc123", "name": "Board", "script": ""}],
+                       "localhost", free_port(), server.bound_port)
+    tts.start()
+    try:
+        evaluator = Evaluator(server, Sender("localhost", tts.port))
+        batch = run_batch(evaluator, [(guid, "return 1")], timeout=5)
+    finally:
+        tts.shutdown()
+        server.shutdown()
+    assert batch["results"][0]["ok"] is ok
+    assert batch["results"][0]["guid"] == guid
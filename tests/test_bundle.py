@@ -0,0 +1,82 @@
+"""
+bundling scripts with #include and require(), and splitting received ones
+back into their files
+"""
+
+import os
+
+import pytest
+
+from tcp_actions.bundle import BundleError, Bundler, unbundle
+
+
+def write(path, contents):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode="w", encoding="utf-8") as out:
+        out.write(contents)
+
+
+def test_plain_script_is_untouched(tmp_path):
+    script = "print('plain')\n"
+    write(str(tmp_path / "main.lua"), script)
+    bundled = Bundler().bundle(str(tmp_path / "main.lua"))
+    assert bundled == script
+    assert unbundle(bundled) == (script, {})
+
+
+def test_include_round_trip(tmp_path):
+    main = "#include lib/helpers\nprint(helper())\n"
+    helpers = "#include inner\nfunction helper() return inner() end\n"
+    inner = "function inner() return 1 end\n"
+    write(str(tmp_path / "main.lua"), main)
+    write(str(tmp_path / "lib" / "helpers.lua"), helpers)
+    write(str(tmp_path / "lib" / "inner.ttslua"), inner)
+    bundled = Bundler().bundle(str(tmp_path / "main.lua"))
+    assert "function inner()" in bundled
+    script, modules = unbundle(bundled)
+    assert script == main
+    assert modules == {
+        os.path.join("lib", "helpers.lua"): helpers,
+        os.path.join("lib", "inner.lua"): inner,
+    }
+
+
+def test_require_round_trip(tmp_path):
+    main = 'local util = require("shared.util")\nprint(util.name)\n'
+    util = 'local inner = require("shared.inner")\nreturn {name = inner}\n'
+    inner = 'return "inner"\n'
+    library = tmp_path / "library"
+    write(str(tmp_path / "mod" / "main.lua"), main)
+    write(str(library / "shared" / "util.lua"), util)
+    write(str(library / "shared" / "inner.lua"), inner)
+    bundler = Bundler([str(library)])
+    bundled = bundler.bundle(str(tmp_path / "mod" / "main.lua"))
+    script, modules = unbundle(bundled)
+    assert script == main
+    assert modules == {
+        os.path.join("shared", "util.lua"): util,
+        os.path.join("shared", "inner.lua"): inner,
+    }
+
+
+def test_rebundled_after_a_dependency_changes(tmp_path):
+    write(str(tmp_path / "main.lua"), "#include lib\n")
+    write(str(tmp_path / "lib.lua"), "local a = 1\n")
+    bundler = Bundler()
+    assert "local a = 1" in bundler.bundle(str(tmp_path / "main.lua"))
+    write(str(tmp_path / "lib.lua"), "local a = 22\n")
+    os.utime(str(tmp_path / "lib.lua"), ns=(1, 1))
+    assert "local a = 22" in bundler.bundle(str(tmp_path / "main.lua"))
+
+
+def test_missing_include(tmp_path):
+    write(str(tmp_path / "main.lua"), "#include nowhere\n")
+    with pytest.raises(BundleError):
+        Bundler().bundle(str(tmp_path / "main.lua"))
+
+
+def test_include_cycle(tmp_path):
+    write(str(tmp_path / "a.lua"), "#include b\n")
+    write(str(tmp_path / "b.lua"), "#include a\n")
+    with pytest.raises(BundleError):
+        Bundler().bundle(str(tmp_path / "a.lua"))
@@ -0,0 +1,98 @@
+"""
+recording TTS traffic to capture files and playing it back
+"""
+
+import socket
+import time
+
+import pytest
+
+from tcp_actions.capture import (
+    INBOUND, OUTBOUND, UNKNOWN_ID, CaptureLog, capture_files, read_capture,
+    replay, start_capture, stop_capture
+)
+from tcp_actions.server import ListenServer
+
+
+def test_frames_round_trip(tmp_path):
+    path = str(tmp_path / "tts.capture")
+    log = CaptureLog(path)
+    log.append(INBOUND, 1, b'{"messageID":1}')
+    log.append(OUTBOUND, 3, '{"messageID":3,"guid":"ü"}')
+    log.append(INBOUND, None, b"{not json")
+    log.close()
+    frames = [frame[1:] for frame in read_capture(path)]
+    assert frames == [
+        (INBOUND, 1, b'{"messageID":1}'),
+        (OUTBOUND, 3, '{"messageID":3,"guid":"ü"}'.encode("utf-8")),
+        (INBOUND, UNKNOWN_ID, b"{not json"),
+    ]
+
+
+def test_a_cut_off_capture_reads_up_to_the_cut(tmp_path):
+    path = str(tmp_path / "tts.capture")
+    log = CaptureLog(path)
+    log.append(INBOUND, 2, b"first")
+    log.append(INBOUND, 2, b"second")
+    log.close()
+    with open(path, mode="r+b") as capture:
+        capture.truncate(capture.seek(0, 2) - 3)
+    assert [frame[3] for frame in read_capture(path)] == [b"first"]
+
+
+def test_not_a_capture_file(tmp_path):
+    path = tmp_path / "spec.json"
+    path.write_bytes(b"[]")
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
+
+
+def test_rotation_keeps_the_newest_files(tmp_path):
+    path = str(tmp_path / "tts.capture")
+    log = CaptureLog(path, max_bytes=100, backups=2)
+    for index in range(6):
+        log.append(INBOUND, 2, bytes([48 + index]) * 40)
+    log.close()
+    files = capture_files(path)
+    assert files == [path + ".2", path + ".1", path]
+    payloads = [frame[3] for name in files for frame in read_capture(name)]
+    assert payloads == [bytes([48 + index]) * 40 for index in range(3, 6)]
+
+
+def test_replay_paces_and_counts():
+    frames = [(10.0, INBOUND, 2, b"a"), (10.1, INBOUND, 2, b"bb"),
+              (10.2, INBOUND, 3, b"ccc")]
+    sent = []
+
+    def send(message_id, data):
+        sent.append((message_id, data))
+        return ["failed"] if message_id == 3 else []
+    result = replay(frames, send, speed=2.0)
+    assert sent == [(2, b"a"), (2, b"bb"), (3, b"ccc")]
+    assert result["count"] == 3
+    assert result["failed"] == 1
+    assert result["bytes"] == 6
+    # 0.2 seconds of traffic at twice the speed
+    assert result["seconds"] >= 0.1
+
+
+def test_the_server_captures_what_it_receives(tmp_path, free_port):
+    path = str(tmp_path / "tts.capture")
+    outputs = []
+    server = ListenServer("127.0.0.1", free_port(),
+                          on_output=outputs.append)
+    server.start_in_thread()
+    start_capture(path)
+    try:
+        with socket.create_connection(("127.0.0.1", server.bound_port),
+                                      5) as out:
+            out.sendall(b'{"messageID": 2, "message": "hi"}')
+        deadline = time.monotonic() + 5
+        while not outputs and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        stop_capture()
+        server.shutdown()
+    assert [frame[1:] for frame in read_capture(path)] == [
+        (INBOUND, 2, b'{"messageID": 2, "message": "hi"}')
+    ]
@@ -0,0 +1,39 @@
+"""
+the json backends every message goes through
+"""
+
+import pytest
+
+import tcp_actions.codec as Codec
+
+MESSAGE = {
+    "messageID": 1,
+    "scriptStates": [{
+        "name": "Ünïcode \"quoted\" </tag>",
+        "guid": "abc123",
+        "script": "print('a\\tb')\nlocal x = 1.5\n",
+    }],
+    "value": [None, True, -3, 2.25],
+}
+
+
+def test_round_trip(backend):
+    assert Codec.loads(Codec.dumps(MESSAGE)) == MESSAGE
+
+
+def test_every_backend_writes_the_same_bytes(backend):
+    Codec.use_backend("json")
+    expected = Codec.dumps(MESSAGE)
+    Codec.use_backend(backend)
+    assert Codec.dumps(MESSAGE) == expected
+
+
+def test_loads_takes_bytes_and_bytearrays(backend):
+    data = Codec.dumps(MESSAGE)
+    assert Codec.loads(bytearray(data)) == MESSAGE
+    assert Codec.loads(data.decode("utf-8")) == MESSAGE
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        Codec.use_backend("simdjson")
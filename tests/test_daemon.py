@@ -0,0 +1,90 @@
+"""
+the daemon's control socket protocol, as the command line tools use it
+"""
+
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from tcp_actions.client import daemon_request
+from tcp_actions.control import ControlServer
+from tcp_actions.daemon import Daemon
+from tcp_actions.engine import Engine
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"),
+                                reason="needs unix domain sockets")
+
+
+@pytest.fixture
+def daemon(tmp_path, free_port):
+    """
+    a daemon whose engine sends to a port nothing listens on, and the path
+    of its control socket
+    """
+    engine = Engine("localhost", free_port(), free_port())
+    server = engine.listen(str(tmp_path), None, on_output=lambda _: None)
+    socket_path = str(tmp_path / "control.sock")
+    server.attach(ControlServer(Daemon(engine).handle, socket_path))
+    server.start_in_thread()
+    yield socket_path
+    engine.close()
+
+
+def test_ping(daemon):
+    assert daemon_request({"command": "ping"}, daemon) == {"ok": True}
+
+
+def test_no_daemon(tmp_path):
+    assert daemon_request({"command": "ping"},
+                          str(tmp_path / "nothing.sock")) is None
+
+
+def test_socket_is_private(daemon):
+    assert os.stat(daemon).st_mode & 0o077 == 0
+
+
+@pytest.mark.parametrize("request_", [
+    [{"command": "ping"}],
+    None,
+    {"command": "launch"},
+    {"command": "execute", "guid": "-1"},
+    {"command": "save_and_play", "specfile": "spec.json", "include_path": 5},
+])
+def test_bad_requests_are_answered(daemon, request_):
+    response = daemon_request(request_, daemon)
+    assert response["ok"] is False
+    # answered by the daemon, not made up by the client
+    assert "without answering" not in response["error"]
+
+
+def test_bad_json_is_answered_and_the_connection_kept(daemon):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(5)
+        client.connect(daemon)
+        with client.makefile("rb") as response:
+            client.sendall(b"{not json\n")
+            assert b'"ok":false' in response.readline()
+            client.sendall(b'{"command": "ping"}\n')
+            assert response.readline() == b'{"ok":true}\n'
+
+
+def test_daemon_already_running(daemon):
+    engine = Engine("localhost", 1, 1)
+    with pytest.raises(OSError):
+        engine.listen(port=0).attach(ControlServer(lambda _: {}, daemon))
+        engine.server.start_in_thread()
+    assert daemon_request({"command": "ping"}, daemon) == {"ok": True}
+
+
+def test_clients_import_neither_asyncio_nor_the_engine():
+    imported = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, tcp_actions.client; print(sorted(sys.modules))"],
+        cwd=os.path.join(os.path.dirname(__file__), os.pardir, "src"),
+        capture_output=True, text=True, check=True
+    ).stdout
+    assert "'asyncio'" not in imported
+    assert "'tcp_actions.engine'" not in imported
@@ -0,0 +1,47 @@
+"""
+dev_server.py run as it is from a terminal
+"""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(__file__), os.pardir, "src")
+LISTEN_PORT = 39998
+
+
+def port_taken(port) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        return probe.connect_ex(("localhost", port)) == 0
+
+
+def interrupt_default():
+    # a shell running us in the background leaves SIGINT ignored
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+
+@pytest.mark.skipif(port_taken(LISTEN_PORT),
+                    reason="a dev server is already listening")
+def test_stats_printed_on_exit(tmp_path):
+    server = subprocess.Popen(
+        [sys.executable, "-u", "dev_server.py", str(tmp_path), "--stats"],
+        cwd=SRC, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        text=True, preexec_fn=interrupt_default
+    )
+    try:
+        assert "listening" in server.stdout.readline()
+        with socket.create_connection(("localhost", LISTEN_PORT)) as tts:
+            tts.sendall(b'{"messageID": 2, "message": "hello"}')
+        # printed once it is handled
+        assert server.stdout.readline() == "hello\n"
+        server.send_signal(signal.SIGINT)
+        output, _ = server.communicate(timeout=10)
+    finally:
+        server.kill()
+    assert "Stats over " in output
+    assert "  messages [2]: 1\n" in output
+    assert "['" not in output
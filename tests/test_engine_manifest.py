@@ -0,0 +1,115 @@
+"""
+incremental pushes through the engine, against a simulated TTS
+"""
+
+import queue
+import threading
+
+import pytest
+
+from tcp_actions.engine import Engine
+from tcp_actions.messages import GameLoaded
+from tcp_actions.simulator import SimulatedTTS
+
+TIMEOUT = 10
+
+
+def write(path, contents):
+    path.write_text(contents, encoding="utf-8")
+
+
+@pytest.fixture
+def mod(tmp_path, free_port):
+    """
+    an engine listening for a simulated TTS, a folder of two objects and
+    the queue every loaded game lands in once the engine has reconciled it
+    """
+    tts_port = free_port()
+    listen_port = free_port()
+    engine = Engine("localhost", tts_port, listen_port)
+    (tmp_path / "received").mkdir()
+    engine.listen(str(tmp_path / "received"), None, on_output=lambda _: None)
+    loads = queue.Queue()
+    # handlers run in order, so this one sees a load after the engine does
+    engine.server.subscribe(GameLoaded, loads.put)
+    engine.server.start_in_thread()
+    tts = SimulatedTTS(port=tts_port, devserver_port=listen_port)
+    tts.start()
+    folder = tmp_path / "mod"
+    folder.mkdir()
+    write(folder / "aaaaaa-Board.lua", "print('board')\n")
+    write(folder / "bbbbbb-Card.lua", "print('card')\n")
+    yield engine, tts, loads, folder, str(tmp_path / "spec.json")
+    tts.shutdown()
+    engine.close()
+
+
+def push(engine, loads, folder, specfile) -> dict:
+    response = engine.save_and_play(specfile, incremental=True,
+                                    folder=str(folder), skip_empty=True)
+    assert response["ok"], response
+    if response["sent"]:
+        # TTS reloads and sends what it now holds
+        loads.get(timeout=TIMEOUT)
+    return response
+
+
+def test_only_changes_are_pushed(mod):
+    engine, tts, loads, folder, specfile = mod
+    assert push(engine, loads, folder, specfile)["sent"] == 2
+    assert tts.find_object("aaaaaa")["script"] == "print('board')\n"
+    assert push(engine, loads, folder, specfile)["sent"] == 0
+    write(folder / "aaaaaa-Board.lua", "print('board, edited')\n")
+    assert push(engine, loads, folder, specfile)["sent"] == 1
+    assert tts.find_object("aaaaaa")["script"] == "print('board, edited')\n"
+    assert tts.received == {1: 2}
+
+
+def test_manifest_survives_a_restart(mod):
+    engine, tts, loads, folder, specfile = mod
+    push(engine, loads, folder, specfile)
+    restarted = Engine("localhost", engine.send_port, engine.listen_port)
+    response = restarted.save_and_play(specfile, incremental=True,
+                                       skip_empty=True)
+    assert response == {"ok": True, "sent": 0}
+
+
+def test_in_game_edit_is_pushed_again(mod):
+    engine, tts, loads, folder, specfile = mod
+    push(engine, loads, folder, specfile)
+    tts.find_object("bbbbbb")["script"] = "print('edited in game')\n"
+    tts.send_dump()
+    loads.get(timeout=TIMEOUT)
+    assert push(engine, loads, folder, specfile)["sent"] == 1
+    assert tts.find_object("bbbbbb")["script"] == "print('card')\n"
+
+
+def test_loads_during_a_push_are_not_held_up_nor_lost(mod):
+    engine, tts, loads, folder, specfile = mod
+    push(engine, loads, folder, specfile)
+    sending = threading.Event()
+    release = threading.Event()
+    send = engine._send
+
+    def slow_send(messages, targets=None):
+        sending.set()
+        release.wait(TIMEOUT)
+        return send(messages, targets)
+    engine._send = slow_send
+    write(folder / "aaaaaa-Board.lua", "print('board, edited')\n")
+    pushing = threading.Thread(
+        target=push, args=(engine, loads, folder, specfile)
+    )
+    pushing.start()
+    assert sending.wait(TIMEOUT)
+    # a game loaded mid-push, with bbbbbb edited in game
+    tts.find_object("bbbbbb")["script"] = "print('edited in game')\n"
+    tts.send_dump()
+    loads.get(timeout=TIMEOUT)
+    release.set()
+    pushing.join(TIMEOUT)
+    engine._send = send
+    # neither object was as the new manifest has it when the game loaded
+    assert engine.manifests[specfile] == {}
+    assert push(engine, loads, folder, specfile)["sent"] == 2
+    assert tts.find_object("bbbbbb")["script"] == "print('card')\n"
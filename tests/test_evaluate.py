@@ -0,0 +1,83 @@
+"""
+pairing execute code requests with the values TTS sends back
+"""
+
+import asyncio
+
+import pytest
+
+from tcp_actions.evaluate import EvaluationError, Evaluator
+from tcp_actions.messages import ErrorMessage, ReturnValue
+from tcp_actions.sender import Sender
+from tcp_actions.server import ListenServer
+from tcp_actions.simulator import SimulatedTTS
+
+
+@pytest.fixture
+def evaluator(free_port):
+    """
+    an Evaluator talking to a simulated TTS holding one object, abc123
+    """
+    server = ListenServer("localhost", free_port())
+    server.start_in_thread()
+    tts = SimulatedTTS([{"guid": "abc123", "name": "Board", "script": ""}],
+                       "localhost", free_port(), server.bound_port)
+    tts.start()
+    yield Evaluator(server, Sender("localhost", tts.port))
+    tts.shutdown()
+    server.shutdown()
+
+
+class Unconnected:
+    """
+    stands in for both the server and the sender, so answers can be handed
+    to an Evaluator by hand in any order
+    """
+
+    def subscribe(self, message_type, handler):
+        pass
+
+    def send_message(self, message) -> list[str]:
+        return []
+
+
+def test_nothing_returned_is_none(evaluator):
+    assert evaluator.evaluate("abc123", "self.setName('x')", 5) is None
+
+
+def test_errors_are_raised(evaluator):
+    with pytest.raises(EvaluationError) as raised:
+        evaluator.evaluate("def456", "return 1", 5)
+    assert raised.value.guid == "def456"
+
+
+def test_answers_resolve_their_own_request():
+    evaluator = Evaluator(Unconnected(), Unconnected())
+    first = evaluator.submit("abc123", "return 1")
+    second = evaluator.submit("def456", "error('no')")
+    third = evaluator.submit("abc123", "return 3")
+    # the error names its guid, so it skips the older request
+    asyncio.run(evaluator._on_error(
+        ErrorMessage("no", "def456", "Error in Script: ")
+    ))
+    asyncio.run(evaluator._on_return(ReturnValue(1)))
+    asyncio.run(evaluator._on_return(ReturnValue(3)))
+    assert first.result(0) == 1
+    assert isinstance(second.exception(0), EvaluationError)
+    assert third.result(0) == 3
+
+
+def test_unanswered_code_times_out_and_is_forgotten():
+    evaluator = Evaluator(Unconnected(), Unconnected())
+    with pytest.raises(TimeoutError):
+        evaluator.evaluate("abc123", "return 1", 0.1)
+    assert len(evaluator._pending) == 0
+
+
+def test_errors_from_elsewhere_are_ignored():
+    evaluator = Evaluator(Unconnected(), Unconnected())
+    pending = evaluator.submit("abc123", "return 1")
+    asyncio.run(evaluator._on_error(
+        ErrorMessage("boom", "-1", "Error in Global Script: ")
+    ))
+    assert not pending.done()
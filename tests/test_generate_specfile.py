@@ -0,0 +1,99 @@
+"""
+generating a specfile from a folder of scripts named as TTS dumps them
+"""
+
+import json
+import os
+
+import pytest
+
+import generate_specfile
+from generate_specfile import generate_specfile_from_folder, scan_folder
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    generate_specfile._cache.clear()
+    yield
+    generate_specfile._cache.clear()
+
+
+def write(path, contents=""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode="w", encoding="utf-8") as out:
+        out.write(contents)
+
+
+def read_spec(path) -> dict:
+    with open(path, mode="r", encoding="utf-8") as source:
+        return {str(entry["guid"]): entry for entry in json.load(source)}
+
+
+def test_objects_and_global(tmp_path):
+    folder = tmp_path / "mod"
+    write(str(folder / "abc123-Board.lua"))
+    write(str(folder / "abc123-Board.xml"))
+    write(str(folder / "Global.lua"))
+    spec = str(tmp_path / "spec.json")
+    assert generate_specfile_from_folder(str(folder), spec)
+    entries = read_spec(spec)
+    assert set(entries) == {"abc123", "-1"}
+    assert entries["abc123"]["name"] == "Board"
+    assert entries["abc123"]["script"].endswith("abc123-Board.lua")
+    assert entries["abc123"]["ui"].endswith("abc123-Board.xml")
+
+
+def test_only_root_global_counts(tmp_path):
+    folder = tmp_path / "mod"
+    write(str(folder / "abc123-Board.lua"))
+    # libraries pulled in with #include or require()
+    write(str(folder / "util.lua"))
+    write(str(folder / "lib" / "Global.lua"))
+    spec = str(tmp_path / "spec.json")
+    generate_specfile_from_folder(str(folder), spec)
+    assert set(read_spec(spec)) == {"abc123"}
+
+
+def test_hidden_folders_skipped_hidden_files_kept(tmp_path):
+    folder = tmp_path / "mod"
+    write(str(folder / ".git" / "abc123-Board.lua"))
+    write(str(folder / ".luarc.lua"))
+    files, _ = scan_folder(str(folder))
+    assert [name for name, _ in files] == [".luarc.lua"]
+
+
+def test_hyphenated_libraries_are_not_objects(tmp_path):
+    folder = tmp_path / "mod"
+    write(str(folder / "abc123-Board-Game.lua"))
+    write(str(folder / "lib" / "string-utils.lua"))
+    write(str(folder / "my-helpers.lua"))
+    spec = str(tmp_path / "spec.json")
+    generate_specfile_from_folder(str(folder), spec)
+    entries = read_spec(spec)
+    assert set(entries) == {"abc123"}
+    assert entries["abc123"]["name"] == "Board-Game"
+
+
+def test_unchanged_folder_is_not_rewritten(tmp_path):
+    folder = tmp_path / "mod"
+    write(str(folder / "abc123-Board.lua"))
+    spec = str(tmp_path / "spec.json")
+    assert generate_specfile_from_folder(str(folder), spec)
+    assert not generate_specfile_from_folder(str(folder), spec)
+    write(str(folder / "def456-Card.lua"))
+    assert generate_specfile_from_folder(str(folder), spec)
+    assert set(read_spec(spec)) == {"abc123", "def456"}
+
+
+def test_switching_folders_rewrites_the_specfile(tmp_path):
+    first = tmp_path / "first"
+    second = tmp_path / "second"
+    write(str(first / "abc123-Board.lua"))
+    write(str(second / "def456-Card.lua"))
+    spec = str(tmp_path / "spec.json")
+    generate_specfile_from_folder(str(first), spec)
+    generate_specfile_from_folder(str(second), spec)
+    assert set(read_spec(spec)) == {"def456"}
+    # nothing changed in first, but the specfile no longer describes it
+    generate_specfile_from_folder(str(first), spec)
+    assert set(read_spec(spec)) == {"abc123"}
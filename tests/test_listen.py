@@ -0,0 +1,68 @@
+"""
+saving the scripts TTS sends to the download folder
+"""
+
+import os
+import socket
+import time
+
+import tcp_actions.listen as listen
+from tcp_actions.listen import save_received_files
+from tcp_actions.manifest import index_path_for, load_manifest
+from tcp_actions.server import ListenServer
+
+
+def test_unchanged_scripts_are_not_rewritten(tmp_path):
+    files = [{"guid": "abc123", "name": "Board", "script": "print(1)\n"}]
+    totals = {}
+    save_received_files(files, str(tmp_path), totals=totals)
+    save_received_files(files, str(tmp_path), totals=totals)
+    assert totals == {"written": 1, "unchanged": 1, "kept": 0, "failed": 0}
+    assert str(tmp_path / "abc123-Board.lua") in load_manifest(
+        index_path_for(str(tmp_path))
+    )
+
+
+def test_local_edits_are_kept(tmp_path):
+    files = [{"guid": "abc123", "name": "Board", "script": "print(1)\n"}]
+    save_received_files(files, str(tmp_path))
+    path = tmp_path / "abc123-Board.lua"
+    path.write_text("print(2) -- edited\n", encoding="utf-8")
+    totals = {}
+    save_received_files(files, str(tmp_path), totals=totals)
+    assert totals["kept"] == 1
+    assert path.read_text(encoding="utf-8") == "print(2) -- edited\n"
+
+
+def test_a_dump_saves_the_index_once(tmp_path, free_port, monkeypatch):
+    saved = []
+    real_save = listen.save_manifest
+
+    def counting_save(manifest, path):
+        saved.append(path)
+        real_save(manifest, path)
+    monkeypatch.setattr(listen, "save_manifest", counting_save)
+    outputs = []
+    server = ListenServer("127.0.0.1", free_port(), folder=str(tmp_path),
+                          on_output=outputs.append)
+    server.start_in_thread()
+    try:
+        with socket.create_connection(("127.0.0.1", server.bound_port),
+                                      5) as out:
+            # sent in pieces, so the first script is saved before the rest
+            out.sendall(b'{"messageID": 1, "scriptStates": ['
+                        b'{"guid": "abc123", "name": "Board", '
+                        b'"script": "print(1)"},')
+            time.sleep(0.2)
+            out.sendall(b'{"guid": "def456", "name": "Card", '
+                        b'"script": "print(2)"}]}')
+        deadline = time.monotonic() + 5
+        while not outputs and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        server.shutdown()
+    assert saved == [index_path_for(str(tmp_path))]
+    assert set(load_manifest(saved[0])) == {
+        os.path.join(str(tmp_path), "abc123-Board.lua"),
+        os.path.join(str(tmp_path), "def456-Card.lua"),
+    }
@@ -0,0 +1,98 @@
+"""
+the typed message model and the renderers that turn messages into output
+"""
+
+import pytest
+
+import tcp_actions.codec as Codec
+from tcp_actions.messages import (
+    INBOUND, OUTBOUND, ErrorMessage, ExecuteLua, GameLoaded, PrintMessage,
+    UnknownMessage, parse_message
+)
+from tcp_actions.render import (
+    DESCRIPTIONS, RENDERERS, render_html, render_json, render_text
+)
+
+
+def test_every_message_id_has_its_class():
+    assert sorted(INBOUND) == [0, 1, 2, 3, 4, 5, 6, 7]
+    assert sorted(OUTBOUND) == [0, 1, 2, 3]
+    for cls in INBOUND.values():
+        assert cls in DESCRIPTIONS
+
+
+def test_parse_and_encode_round_trip():
+    data = {"messageID": 3, "error": "boom", "guid": "abc123",
+            "errorMessagePrefix": "Error in Script: "}
+    message = parse_message(data)
+    assert message == ErrorMessage("boom", "abc123", "Error in Script: ")
+    assert Codec.loads(message.encode()) == data
+    assert parse_message({"messageID": 3, "guid": "-1",
+                          "script": "x"}, OUTBOUND) == ExecuteLua("-1", "x")
+
+
+def test_messages_are_slotted():
+    message = PrintMessage("hi")
+    with pytest.raises(AttributeError):
+        message.extra = 1
+
+
+@pytest.mark.parametrize("data", [
+    {"messageID": 99, "x": 1}, {"messageID": "2"}, {"no": "id"}
+])
+def test_unknown_messages_are_kept_whole(data):
+    message = parse_message(data)
+    assert isinstance(message, UnknownMessage)
+    assert message.to_dict() == data
+
+
+def test_bad_messages_raise():
+    with pytest.raises(KeyError):
+        parse_message({"messageID": 2})
+    with pytest.raises(ValueError):
+        parse_message([{"messageID": 2}])
+
+
+def test_text_and_html():
+    message = ErrorMessage("a < b", "-1", "Error in Global Script: ")
+    assert render_text(message) == (
+        "Error in Global Script: -> guid:-1\n\ta < b\n"
+    )
+    assert render_html(message) == (
+        "<pre><font color='#FF0000'>Error in Global Script: -&gt; guid:-1\n"
+        "\ta &lt; b\n</font></pre>"
+    )
+    assert render_html(PrintMessage("hi")) == "<pre>hi\n</pre>"
+
+
+def test_sources_and_notes_are_shown():
+    message = PrintMessage("hi").tag("seat2:39999")
+    assert render_text(message, "\tnote\n") == "[seat2:39999] hi\n\tnote\n"
+    assert Codec.loads(render_json(message, "\tnote\n")) == {
+        "messageID": 2, "message": "hi", "type": "PrintMessage",
+        "source": "seat2:39999", "notes": "\tnote\n"
+    }
+
+
+def test_json_leaves_the_scripts_out():
+    message = GameLoaded([{"name": "Board", "guid": "abc123",
+                           "script": "print(1)"}])
+    output = render_json(message)
+    assert output.endswith("\n")
+    assert Codec.loads(output)["scriptStates"] == [
+        {"name": "Board", "guid": "abc123"}
+    ]
+    # the message itself still holds them
+    assert message.script_states[0]["script"] == "print(1)"
+
+
+def test_every_renderer_handles_every_message():
+    for cls in DESCRIPTIONS:
+        if cls is UnknownMessage:
+            message = UnknownMessage(42, {"messageID": 42})
+        elif cls.KEYS == ("scriptStates",):
+            message = cls([{"name": "Board", "guid": "abc123"}])
+        else:
+            message = cls(*["x"] * len(cls.KEYS))
+        for render in RENDERERS.values():
+            assert render(message)
@@ -0,0 +1,85 @@
+"""
+the counters and timings the dev server records per messageID
+"""
+
+import socket
+import time
+
+from tcp_actions.metrics import BUCKET_BOUNDS, Metrics, format_stats
+from tcp_actions.server import ListenServer
+
+
+def test_counters_and_histograms_by_message():
+    metrics = Metrics()
+    metrics.count("messages", 2)
+    metrics.count("messages", 2)
+    metrics.count("bytes_received", 1, 500)
+    metrics.observe("parse", 0.002, 1)
+    metrics.observe("parse", 0.2, 1)
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"messages": {"2": 2},
+                                    "bytes_received": {"1": 500}}
+    parse = snapshot["histograms"]["parse"]["1"]
+    assert parse["count"] == 2
+    assert parse["min"] == 0.002
+    assert parse["max"] == 0.2
+    assert sum(parse["buckets"].values()) == 2
+    assert parse["buckets"]["0.005"] == 1
+    assert parse["buckets"]["0.5"] == 1
+    assert len(parse["buckets"]) == len(BUCKET_BOUNDS) + 1
+
+
+def test_slow_figures_overflow_into_the_last_bucket():
+    metrics = Metrics()
+    with metrics.timer("handle"):
+        pass
+    metrics.observe("handle", 60.0)
+    buckets = metrics.snapshot()["histograms"]["handle"]["None"]["buckets"]
+    assert buckets["inf"] == 1
+
+
+def test_reset():
+    metrics = Metrics()
+    metrics.count("messages", 2)
+    metrics.reset()
+    assert metrics.snapshot()["counters"] == {}
+
+
+def test_format_stats():
+    metrics = Metrics()
+    metrics.count("messages", 2, 3)
+    metrics.observe("handle", 0.004, 2)
+    output = "".join(str(entry) for entry in format_stats(
+        metrics.snapshot()
+    ))
+    assert "  messages [2]: 3\n" in output
+    assert "  handle [2]: 1 x, 4.0 ms mean, 4.0 ms max, 4.0 ms total\n" in (
+        output
+    )
+
+
+def test_the_server_records_every_stage(free_port):
+    metrics = Metrics()
+    server = ListenServer("127.0.0.1", free_port(), metrics=metrics,
+                          on_output=lambda _: None)
+    server.start_in_thread()
+    try:
+        for data in (b'{"messageID": 2, "message": "hi"}', b'{not json'):
+            with socket.create_connection(("127.0.0.1", server.bound_port),
+                                          5) as out:
+                out.sendall(data)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            snapshot = metrics.snapshot()
+            if ("malformed" in snapshot["counters"]
+                    and "handle" in snapshot["histograms"]):
+                break
+            time.sleep(0.01)
+    finally:
+        server.shutdown()
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["messages"] == {"2": 1}
+    assert snapshot["counters"]["bytes_received"] == {"2": 33}
+    assert snapshot["counters"]["malformed"] == {"None": 1}
+    for stage in ("receive", "parse", "handle"):
+        assert snapshot["histograms"][stage]["2"]["count"] == 1
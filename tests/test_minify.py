@@ -0,0 +1,74 @@
+"""
+minifying the lua and xml sent with save and play
+"""
+
+import tcp_actions.minify as minify
+from tcp_actions.manifest import hash_contents
+from tcp_actions.minify import Minifier, minify_lua, minify_xml
+
+
+def test_lua_loses_comments_and_indentation_only():
+    source = (
+        "-- a comment\n"
+        "local function add(a, b)\n"
+        "    --[[ a long\n"
+        "    comment ]]\n"
+        "    return a + b -- trailing\n"
+        "end\n"
+        "\n"
+        "print(add(1, 2) .. '  -- kept  ' .. [[\n"
+        "  long -- string ]])\n"
+    )
+    assert minify_lua(source) == (
+        "local function add(a,b)\n"
+        "return a+b\n"
+        "end\n"
+        "print(add(1,2).."
+        "'  -- kept  '..[[\n"
+        "  long -- string ]])\n"
+    )
+
+
+def test_lua_keeps_tokens_apart():
+    assert minify_lua("local x = 1 .. 2\nx = a - -b\n") == (
+        "local x=1 ..2\nx=a- -b\n"
+    )
+
+
+def test_lua_keeps_bundle_markers_on_their_own_lines():
+    source = "----#include lib\nlocal a = 1\n----#include lib\n"
+    assert minify_lua(source) == (
+        "----#include lib\nlocal a=1\n----#include lib\n"
+    )
+
+
+def test_xml_keeps_text_between_inline_tags():
+    source = (
+        "<Panel>\n"
+        "    <!-- a comment -->\n"
+        "    <Text>Hello <b>big</b> <i>world</i></Text>\n"
+        "    <Text><![CDATA[ <a>\n  </a> ]]></Text>\n"
+        "</Panel>\n"
+    )
+    assert minify_xml(source) == (
+        "<Panel><Text>Hello <b>big</b> <i>world</i></Text>"
+        "<Text><![CDATA[ <a>\n  </a> ]]></Text></Panel>"
+    )
+
+
+def test_apply_notes_what_tts_will_hold():
+    script = "print( 1 )  -- one\n"
+    manifest = {"abc123": {"script": {"hash": hash_contents(script)}}}
+    minifier = Minifier()
+    sent = minifier.apply([{"guid": "abc123", "script": script}], manifest)
+    assert sent == [{"guid": "abc123", "script": "print(1)\n"}]
+    assert manifest["abc123"]["script"]["sent"] == hash_contents("print(1)\n")
+    assert minifier.report()[0] == "Minified "
+
+
+def test_memo_is_bounded(monkeypatch):
+    monkeypatch.setattr(minify, "MINIFY_CACHE_SIZE", 4)
+    minifier = Minifier()
+    for index in range(10):
+        minifier.minify("script", "local a = " + str(index) + "\n")
+    assert len(minifier._memo) == 4
@@ -0,0 +1,148 @@
+"""
+sending to TTS: retries, timeouts and fanning one message out to several
+instances
+"""
+
+import socket
+import threading
+import time
+
+from tcp_actions.messages import SendCustomMessage
+from tcp_actions.sender import Sender, fan_out
+
+
+class Receiver:
+    """
+    a TTS that reads every message sent to it, or with read=False one that
+    accepts connections and then never reads
+    """
+
+    def __init__(self, read=True, port=0):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("localhost", port))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+        self.messages = []
+        self.received = threading.Event()
+        self._read = read
+        self._connections = []
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.listener.close()
+        for connection in self._connections:
+            connection.close()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            self._connections.append(connection)
+            if not self._read:
+                continue
+            message = bytearray()
+            with connection:
+                while True:
+                    chunk = connection.recv(1 << 16)
+                    if not chunk:
+                        break
+                    message += chunk
+            self.messages.append(bytes(message))
+            self.received.set()
+
+
+def chunks(count, size=1 << 18):
+    for index in range(count):
+        yield bytes([index % 256]) * size
+
+
+def test_send_bytes():
+    receiver = Receiver()
+    try:
+        assert Sender("localhost", receiver.port).send(b"x" * 1000000) == []
+        assert receiver.received.wait(5)
+        assert receiver.messages == [b"x" * 1000000]
+    finally:
+        receiver.close()
+
+
+def test_stalled_target_is_dropped_without_holding_up_the_rest():
+    healthy = Receiver()
+    stalled = Receiver(read=False)
+    senders = [
+        Sender("localhost", healthy.port, send_timeout=0.5),
+        Sender("localhost", stalled.port, send_timeout=0.5),
+    ]
+    try:
+        started = time.perf_counter()
+        results = fan_out(senders, chunks(128))
+        assert time.perf_counter() - started < 10
+        assert results[senders[0].name] == []
+        assert results[senders[1].name] != []
+        assert healthy.received.wait(5)
+        assert healthy.messages == [b"".join(chunks(128))]
+    finally:
+        healthy.close()
+        stalled.close()
+
+
+def test_fan_out_bytes_to_every_target():
+    receivers = [Receiver(), Receiver()]
+    senders = [Sender("localhost", receiver.port) for receiver in receivers]
+    try:
+        results = fan_out(senders, b"hello")
+        assert results == {sender.name: [] for sender in senders}
+        for receiver in receivers:
+            assert receiver.received.wait(5)
+            assert receiver.messages == [b"hello"]
+    finally:
+        for receiver in receivers:
+            receiver.close()
+
+
+def test_connecting_is_retried_until_tts_listens(free_port):
+    port = free_port()
+    receivers = []
+    starting = threading.Timer(0.2, lambda: receivers.append(Receiver(
+        port=port
+    )))
+    starting.start()
+    try:
+        sender = Sender("localhost", port, retries=6, backoff=0.05)
+        assert sender.send(b"hello") == []
+        assert receivers[0].received.wait(5)
+        assert receivers[0].messages == [b"hello"]
+    finally:
+        starting.join()
+        for receiver in receivers:
+            receiver.close()
+
+
+def test_connecting_gives_up_after_the_retries(free_port):
+    sender = Sender("localhost", free_port(), retries=2, backoff=0.01)
+    started = time.perf_counter()
+    assert sender.send(b"hello") != []
+    # waited 0.01 then 0.02 seconds between the three attempts
+    assert time.perf_counter() - started < 2
+
+
+def test_queued_messages_go_out_in_order():
+    receiver = Receiver()
+    sender = Sender("localhost", receiver.port)
+    try:
+        futures = [sender.queue_message(SendCustomMessage({"n": index}))
+                   for index in range(5)]
+        sender.flush()
+        assert [future.result() for future in futures] == [[]] * 5
+        assert sender.metrics()[2]["count"] == 5
+        deadline = time.monotonic() + 5
+        while len(receiver.messages) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert receiver.messages == [SendCustomMessage({"n": index}).encode()
+                                     for index in range(5)]
+    finally:
+        sender.close()
+        receiver.close()
@@ -0,0 +1,104 @@
+"""
+the asyncio listen server dev_server.py and the gui share
+"""
+
+import queue
+import socket
+import threading
+
+import pytest
+
+from tcp_actions.messages import GameLoaded, PrintMessage
+from tcp_actions.server import ListenServer
+
+
+@pytest.fixture
+def listen(free_port):
+    """
+    start a listen server on 127.0.0.1 and return it along with a queue of
+    the messages it handled
+    """
+    servers = []
+
+    def start(**kwargs):
+        server = ListenServer("127.0.0.1", free_port(),
+                              on_output=lambda _: None, **kwargs)
+        handled = queue.Queue()
+
+        async def collect(message):
+            handled.put(message)
+        server.subscribe(None, collect)
+        server.start_in_thread()
+        servers.append(server)
+        return server, handled
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def send(server, data):
+    with socket.create_connection(("127.0.0.1", server.bound_port), 5) as out:
+        out.sendall(data)
+
+
+def test_a_dump_arriving_does_not_hold_up_prints(listen):
+    server, handled = listen()
+    with socket.create_connection(("127.0.0.1", server.bound_port),
+                                  5) as dump:
+        dump.sendall(b'{"messageID": 1, "scriptStates": [')
+        send(server, b'{"messageID": 2, "message": "hi"}')
+        message = handled.get(timeout=5)
+        assert isinstance(message, PrintMessage)
+        dump.sendall(b']}')
+    assert isinstance(handled.get(timeout=5), GameLoaded)
+
+
+def test_a_port_in_use_fails_to_start(listen):
+    server, _ = listen()
+    with pytest.raises(OSError):
+        ListenServer("127.0.0.1", server.bound_port).start_in_thread()
+
+
+def test_shutdown_finishes_messages_already_arriving(listen):
+    server, handled = listen()
+    with socket.create_connection(("127.0.0.1", server.bound_port),
+                                  5) as late:
+        late.sendall(b'{"messageID": 2, ')
+        # once a later connection is handled, this one was accepted too
+        send(server, b'{"messageID": 2, "message": "in time"}')
+        assert handled.get(timeout=5).message == "in time"
+        stopping = threading.Thread(target=server.shutdown)
+        stopping.start()
+        # no new connections once shutdown is asked for
+        while True:
+            try:
+                send(server, b'{"messageID": 2, "message": "too late"}')
+            except ConnectionRefusedError:
+                break
+        late.sendall(b'"message": "made it"}')
+    stopping.join(5)
+    assert not stopping.is_alive()
+    # whatever got in before shutdown was asked for is handled as well
+    assert "made it" in [message.message for message in handled.queue]
+
+
+def test_messages_are_tagged_with_their_target(listen):
+    server, handled = listen(sources=[("127.0.0.1", 39999),
+                                      ("10.255.255.1", 39999)])
+    send(server, b'{"messageID": 2, "message": "hi"}')
+    assert handled.get(timeout=5).source == "127.0.0.1:39999"
+
+
+def test_targets_sharing_a_host_tag_the_host(listen):
+    server, handled = listen(sources=[("127.0.0.1", 39999),
+                                      ("127.0.0.1", 39990)])
+    send(server, b'{"messageID": 2, "message": "hi"}')
+    # TTS connects from a new port each time, so there is no telling which
+    assert handled.get(timeout=5).source == "127.0.0.1"
+
+
+def test_a_single_target_is_not_tagged(listen):
+    server, handled = listen(sources=[("127.0.0.1", 39999)])
+    send(server, b'{"messageID": 2, "message": "hi"}')
+    assert handled.get(timeout=5).source is None
@@ -0,0 +1,50 @@
+"""
+saving the gui's user settings off the ui thread
+"""
+
+import threading
+
+import pytest
+
+from settings_store import SETTINGS_FIELDS, SettingsStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SettingsStore(str(tmp_path / "settings.json"))
+    yield store
+    store.close()
+
+
+def test_only_changes_are_saved(store):
+    assert store.update({"editor": "vim"})
+    assert not store.update({"editor": "vim"})
+    store.flush()
+    loaded = SettingsStore(store.path)
+    assert loaded.load()
+    assert loaded.values["editor"] == "vim"
+    assert set(loaded.values) == set(SETTINGS_FIELDS)
+    loaded.close()
+
+
+def test_saves_run_off_the_calling_thread_in_order(store, monkeypatch):
+    threads = []
+    real_save = SettingsStore._save
+
+    def recording_save(self, snapshot):
+        threads.append(threading.current_thread())
+        real_save(self, snapshot)
+    monkeypatch.setattr(SettingsStore, "_save", recording_save)
+    for index in range(20):
+        store.update({"guid": str(index)})
+    store.flush()
+    assert threading.current_thread() not in threads
+    loaded = SettingsStore(store.path)
+    loaded.load()
+    assert loaded.values["guid"] == "19"
+    loaded.close()
+
+
+def test_a_missing_file_fails_to_load(store):
+    assert not store.load()
+    assert store.values == dict.fromkeys(SETTINGS_FIELDS)
@@ -0,0 +1,88 @@
+"""
+the simulated TTS the other tests and the benchmarks run against
+"""
+
+import queue
+import time
+
+import pytest
+
+from tcp_actions.messages import GameLoaded, GetScripts, SaveAndPlay
+from tcp_actions.metrics import Metrics
+from tcp_actions.sender import Sender
+from tcp_actions.server import ListenServer
+from tcp_actions.simulator import SimulatedTTS, synthetic_script_states
+
+
+@pytest.fixture
+def simulated(free_port):
+    """
+    a simulated TTS holding Global and two objects, the listen server it
+    answers, and a queue of the dumps that server received
+    """
+    metrics = Metrics()
+    server = ListenServer("localhost", free_port(), metrics=metrics)
+    dumps = queue.Queue()
+
+    async def on_dump(message):
+        dumps.put(message)
+    server.subscribe(GameLoaded, on_dump)
+    server.start_in_thread()
+    tts = SimulatedTTS(synthetic_script_states(2, script_size=64),
+                       "localhost", free_port(), server.bound_port)
+    tts.start()
+    yield tts, server, dumps
+    tts.shutdown()
+    server.shutdown()
+
+
+def received_prints(server) -> int:
+    counters = server.metrics.snapshot()["counters"]
+    return counters.get("messages", {}).get("2", 0)
+
+
+def test_synthetic_mods():
+    script_states = synthetic_script_states(20, script_size=1000, ui_every=5)
+    assert len(script_states) == 21
+    assert script_states[0]["guid"] == "-1"
+    assert len({entry["guid"] for entry in script_states}) == 21
+    assert sum("ui" in entry for entry in script_states) == 1 + 4
+    for entry in script_states:
+        assert 1000 <= len(entry["script"]) < 1100
+
+
+def test_get_scripts_answers_with_a_dump(simulated):
+    tts, _, dumps = simulated
+    assert Sender("localhost", tts.port).send_message(GetScripts()) == []
+    dump = dumps.get(timeout=5)
+    assert dump.script_states == tts.script_states
+    assert tts.received == {0: 1}
+
+
+def test_save_and_play_only_touches_the_objects_sent(simulated):
+    tts, _, dumps = simulated
+    pushed = [
+        {"guid": "000001", "name": "Object 0", "script": "print(1)\n"},
+        {"guid": "000002", "name": "Object 1"},
+        {"guid": "abcdef", "name": "New", "script": "print(2)\n"},
+    ]
+    sender = Sender("localhost", tts.port)
+    assert sender.send_message(SaveAndPlay(pushed)) == []
+    dump = dumps.get(timeout=5)
+    by_guid = {entry["guid"]: entry for entry in dump.script_states}
+    assert by_guid["000001"]["script"] == "print(1)\n"
+    # no script sent means none kept
+    assert "script" not in by_guid["000002"]
+    assert by_guid["abcdef"]["script"] == "print(2)\n"
+    assert by_guid["-1"] == tts.find_object("-1")
+
+
+def test_print_storms_reach_the_server(simulated):
+    tts, server, _ = simulated
+    storm = tts.print_storm(50, concurrency=4)
+    assert storm["count"] == 50
+    assert storm["failed"] == 0
+    deadline = time.monotonic() + 5
+    while received_prints(server) < 50 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert received_prints(server) == 50
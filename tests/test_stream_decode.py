@@ -0,0 +1,54 @@
+"""
+decoding the scriptStates of a dump while the rest of it is still arriving
+"""
+
+import tcp_actions.codec as Codec
+from tcp_actions.stream_decode import ScriptStateStream
+
+
+def script_states(count=5) -> list:
+    return [{
+        "name": "Object " + str(index),
+        "guid": format(index, "06x"),
+        "script": 'print("ü \\"quoted\\" ' + "x" * index * 37 + '")\n',
+        "ui": "<Panel/>" if index % 2 else "",
+    } for index in range(count)]
+
+
+def decode_in_pieces(data, cuts) -> tuple:
+    stream = ScriptStateStream()
+    entries = []
+    start = 0
+    for end in cuts + [len(data)]:
+        stream.feed(data[start:end])
+        entries.extend(stream.ready_entries())
+        start = end
+    return stream.finish(), stream.message_id, entries
+
+
+def test_stream_decode_split_anywhere(backend):
+    # string values that look like the keys we look out for
+    message = {
+        "label": "messageID",
+        "note": "scriptStates",
+        "messageID": 1,
+        "scriptStates": script_states(3),
+        "after": ["]}", {"x": 1}],
+    }
+    data = Codec.dumps(message)
+    for cut in range(len(data) + 1):
+        decoded, message_id, entries = decode_in_pieces(data, [cut])
+        assert decoded == message
+        assert message_id == 1
+        assert entries == message["scriptStates"]
+
+
+def test_stream_decode_in_many_pieces(backend):
+    message = {"messageID": 0, "scriptStates": script_states(200)}
+    data = Codec.dumps(message)
+    decoded, message_id, entries = decode_in_pieces(
+        data, list(range(0, len(data), 97))
+    )
+    assert decoded == message
+    assert message_id == 0
+    assert entries == message["scriptStates"]
@@ -0,0 +1,44 @@
+"""
+encoding save and play pushes piece by piece with iter_encode
+"""
+
+import pytest
+
+from tcp_actions.messages import SaveAndPlay
+from tcp_actions.stream_encode import FileContents, check_files, iter_encode
+
+
+def script_states(count=5) -> list:
+    return [{
+        "name": "Object " + str(index),
+        "guid": format(index, "06x"),
+        "script": 'print("ü \\"quoted\\" ' + "x" * index * 37 + '")\n',
+        "ui": "<Panel/>" if index % 2 else "",
+    } for index in range(count)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 262144])
+def test_iter_encode_matches_encode(backend, chunk_size):
+    message = SaveAndPlay(script_states())
+    streamed = b"".join(iter_encode(message, chunk_size))
+    assert streamed == message.encode()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 262144])
+def test_iter_encode_reads_files(backend, tmp_path, chunk_size):
+    states = script_states()
+    with_files = []
+    for entry in states:
+        path = tmp_path / (entry["guid"] + ".lua")
+        path.write_text(entry["script"], encoding="utf-8")
+        with_files.append(dict(entry, script=FileContents(str(path))))
+    streamed = b"".join(iter_encode(SaveAndPlay(with_files), chunk_size))
+    assert streamed == SaveAndPlay(states).encode()
+
+
+def test_check_files_catches_a_missing_file(tmp_path):
+    present = tmp_path / "present.lua"
+    present.write_text("", encoding="utf-8")
+    check_files([{"script": FileContents(str(present))}])
+    with pytest.raises(OSError):
+        check_files([{"script": FileContents(str(tmp_path / "gone.lua"))}])
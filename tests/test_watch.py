@@ -0,0 +1,85 @@
+"""
+watching a work folder and coalescing bursts of saves into one push
+"""
+
+import pytest
+
+from tcp_actions.watch import (
+    CHANGED, CREATED, DELETED, InotifyWatcher, PollingWatcher,
+    debounced_changes, is_watched, merge_changes
+)
+
+
+class ScriptedWatcher:
+    """
+    hands out the given wait() results one after another, then nothing
+    """
+
+    def __init__(self, *results):
+        self.results = list(results)
+
+    def wait(self, timeout=None) -> dict | None:
+        if self.results:
+            return self.results.pop(0)
+        if timeout is None:
+            raise AssertionError("waited forever")
+        return {}
+
+
+def test_swap_files_and_backups_are_ignored():
+    assert is_watched("abc123-Board.lua")
+    assert is_watched("Global.xml")
+    assert not is_watched("abc123-Board.lua.swp")
+    assert not is_watched("abc123-Board.lua~")
+
+
+def test_merging_a_burst():
+    changes = {}
+    merge_changes(changes, "a.lua", CREATED)
+    merge_changes(changes, "a.lua", CHANGED)
+    merge_changes(changes, "b.lua", DELETED)
+    merge_changes(changes, "b.lua", CREATED)
+    # editors that save by replacing the file delete it first
+    assert changes == {"a.lua": CREATED, "b.lua": CHANGED}
+
+
+def test_a_burst_is_pushed_once():
+    watcher = ScriptedWatcher({"a.lua": CREATED}, {"a.lua": CHANGED},
+                              {"b.lua": CHANGED})
+    changes = next(debounced_changes(watcher, debounce=0.01))
+    assert changes == {"a.lua": CREATED, "b.lua": CHANGED}
+    assert watcher.results == []
+
+
+def test_a_long_burst_is_cut_off_at_max_delay():
+    watcher = ScriptedWatcher({"a.lua": CHANGED}, {"b.lua": CHANGED})
+    changes = next(debounced_changes(watcher, debounce=0.01, max_delay=0))
+    assert changes == {"a.lua": CHANGED}
+
+
+def test_lost_events_ask_for_a_rescan():
+    watcher = ScriptedWatcher({"a.lua": CHANGED}, None, {"b.lua": CHANGED})
+    assert next(debounced_changes(watcher, debounce=0.01)) is None
+
+
+def inotify_watcher(folder):
+    try:
+        return InotifyWatcher(folder)
+    except (OSError, AttributeError):
+        pytest.skip("inotify is not available")
+
+
+@pytest.mark.parametrize("create", [
+    lambda folder: PollingWatcher(folder, poll_interval=0.01),
+    inotify_watcher,
+])
+def test_watchers_see_scripts_saved(tmp_path, create):
+    (tmp_path / "lib").mkdir()
+    watcher = create(str(tmp_path))
+    try:
+        (tmp_path / "lib" / "util.lua").write_text("return {}\n")
+        (tmp_path / "notes.txt").write_text("not a script\n")
+        changes = watcher.wait(5)
+        assert changes == {str(tmp_path / "lib" / "util.lua"): CREATED}
+    finally:
+        watcher.close()
@@ -0,0 +1,53 @@
+"""
+writing received scripts in parallel batches
+"""
+
+import os
+
+import pytest
+
+from tcp_actions.writer import FileWriter, encode_for_disk, write_atomic
+
+
+@pytest.fixture
+def writer():
+    writer = FileWriter(max_workers=3, batch_size=4)
+    yield writer
+    writer.shutdown()
+
+
+def test_every_file_is_written_in_batches(tmp_path, writer):
+    files = [(str(tmp_path / (str(index) + ".lua")),
+              "print(" + str(index) + ")\n") for index in range(10)]
+    batches = writer.write(files)
+    assert [len(batch["written"]) for batch in batches] == [4, 4, 2]
+    for path, contents in files:
+        with open(path, mode="rb") as written:
+            assert written.read() == encode_for_disk(contents)
+    # no temporary files left behind
+    assert len(os.listdir(tmp_path)) == 10
+
+
+def test_identical_files_are_not_rewritten(tmp_path):
+    path = str(tmp_path / "a.lua")
+    assert write_atomic(path, b"print(1)\n")
+    modified = os.stat(path).st_mtime_ns
+    assert not write_atomic(path, b"print(1)\n")
+    assert os.stat(path).st_mtime_ns == modified
+
+
+def test_failures_are_reported_per_file(tmp_path, writer):
+    files = [(str(tmp_path / "missing" / "a.lua"), "print(1)\n"),
+             (str(tmp_path / "b.lua"), "print(2)\n")]
+    batch, = writer.write(files)
+    assert batch["written"] == [files[1][0]]
+    assert [path for path, _ in batch["failed"]] == [files[0][0]]
+
+
+def test_the_index_skips_what_was_written(tmp_path, writer):
+    files = [(str(tmp_path / "a.lua"), "print(1)\n")]
+    index = {}
+    writer.write(files, index)
+    assert set(index) == {files[0][0]}
+    batch, = writer.write(files, index)
+    assert batch["unchanged"] == [files[0][0]]